@@ -1,56 +1,65 @@
 #!/usr/bin/env python3
 """
-Detailed analysis of serial 3135455511 showing raw data and calculations
+Detailed analysis of one serial showing raw data and calculations
+(defaults to serial 3135455511 on Fixtrade)
 """
 
-import mysql.connector
 import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment
 from openpyxl.utils import get_column_letter
-from datetime import datetime
+from datetime import date, datetime
 from collections import OrderedDict, defaultdict
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-
-if not DB_USER or not DB_PASSWORD:
-    raise ValueError("DB_USER and DB_PASSWORD must be set in .env file")
-
-def analyze_serial():
-    # Query Fixtrade for serial 3135455511
-    conn = mysql.connector.connect(
-        host='172.20.251.127',
-        port=3306,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        database='nscbms2'
-    )
-
-    cursor = conn.cursor()
-    cursor.execute('''
-    SELECT
-        mrd.reading_date,
-        crme.createdtime as reading_date_time,
-        mrd.total
-    FROM bms_machines ma
-    LEFT JOIN vtiger_crmentity crm on crm.crmid = ma.machinesid
-    LEFT JOIN bms_meterreading mrd on mrd.asset = ma.machinesid
-    LEFT JOIN vtiger_crmentity crme on crme.crmid = mrd.meterreadingid
-    WHERE ma.serialnumber = "3135455511"
-        AND crm.deleted <> 1
-        AND ma.machinestatus = 1
-        AND YEAR(mrd.reading_date) = 2025
-        AND MONTH(mrd.reading_date) IN (3,4,5,6,7,8,9,10,11)
-    ORDER BY mrd.reading_date, crme.createdtime
-    ''')
-
-    raw_data = cursor.fetchall()
-    cursor.close()
-    conn.close()
+from pathlib import Path
+from serial_keys import canonical_serial
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+
+def analyze_serial(serial: str = "3135455511", schema: str = "nscbms2", host: str = "172.20.251.127", year: int = 2025):
+    from dotenv import load_dotenv
+    from readings_source import readings_source, query_webapp_serial
+
+    load_dotenv()
+    if readings_source() == 'webapp':
+        raw_data = query_webapp_serial(serial, date(year, 3, 1), date(year, 11, 30))
+    else:
+        from fake_bms import bms_connector
+
+        db_user = os.getenv("DB_USER")
+        db_password = os.getenv("DB_PASSWORD")
+        if not db_user or not db_password:
+            raise ValueError("DB_USER and DB_PASSWORD must be set in .env file")
+
+        conn = bms_connector().connect(
+            host=host,
+            port=3306,
+            user=db_user,
+            password=db_password,
+            database=schema
+        )
+
+        cursor = conn.cursor()
+        cursor.execute('''
+        SELECT
+            mrd.reading_date,
+            crme.createdtime as reading_date_time,
+            mrd.total
+        FROM bms_machines ma
+        LEFT JOIN vtiger_crmentity crm on crm.crmid = ma.machinesid
+        LEFT JOIN bms_meterreading mrd on mrd.asset = ma.machinesid
+        LEFT JOIN vtiger_crmentity crme on crme.crmid = mrd.meterreadingid
+        WHERE ma.serialnumber = %s
+            AND crm.deleted <> 1
+            AND ma.machinestatus = 1
+            AND YEAR(mrd.reading_date) = %s
+            AND MONTH(mrd.reading_date) IN (3,4,5,6,7,8,9,10,11)
+        ORDER BY mrd.reading_date, crme.createdtime
+        ''', (serial, year))
+
+        raw_data = cursor.fetchall()
+        cursor.close()
+        conn.close()
 
     # Process data using Qlik logic
     by_date = defaultdict(list)
@@ -78,12 +87,15 @@ def analyze_serial():
             monthly_max[month_year] = daily_max[date_str]
 
     # Load Excel data
-    wb_excel = openpyxl.load_workbook('/Users/alwynkotze/Documents/JDW/jetline-machines-automation/Volumes from Xerox.xlsx')
+    wb_excel = openpyxl.load_workbook(PROJECT_ROOT / 'Volumes from Xerox.xlsx')
     ws_excel = wb_excel.active
     xerox_data = {}
-    for row in ws_excel.iter_rows(min_row=3, values_only=True):
-        customer, model, serial, month_year, volume = row
-        if serial == '3135455511' and month_year and month_year != 'Total':
+    target = canonical_serial(serial)
+    # Customer Name, Model, Serial Number, MonthYear, per-meter volumes..., Total
+    for row in ws_excel.iter_rows(min_row=2, values_only=True):
+        customer, model, row_serial, month_year = row[:4]
+        volume = row[-1]
+        if canonical_serial(row_serial) == target and month_year and month_year != 'Total':
             xerox_data[month_year] = volume
 
     # Create analysis Excel
@@ -99,7 +111,7 @@ def analyze_serial():
     yellow_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
 
     # Summary sheet
-    ws_summary.append(["Analysis: Serial 3135455511 (Xerox Iridesse - Fixtrade)"])
+    ws_summary.append([f"Analysis: Serial {serial} ({schema})"])
     ws_summary.append([])
     ws_summary['A1'].font = Font(bold=True, size=14)
 
@@ -115,7 +127,7 @@ def analyze_serial():
     prev_last = 0
     prev_max = 0
 
-    months = ['Mar-2025', 'Apr-2025', 'May-2025', 'Jun-2025', 'Jul-2025', 'Aug-2025', 'Sep-2025', 'Oct-2025', 'Nov-2025']
+    months = [datetime(year, m, 1).strftime('%b-%Y') for m in range(3, 12)]
 
     for month in months:
         if month not in monthly_last:
@@ -190,7 +202,7 @@ def analyze_serial():
                     pass
             ws.column_dimensions[column_letter].width = min(max_length + 2, 50)
 
-    output_path = "/Users/alwynkotze/Documents/JDW/jetline-machines-automation/Serial_3135455511_Analysis.xlsx"
+    output_path = PROJECT_ROOT / f"Serial_{serial}_Analysis.xlsx"
     wb.save(output_path)
     print(f"✓ Analysis saved: {output_path}")
 
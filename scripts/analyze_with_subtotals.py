@@ -4,7 +4,7 @@ Analysis including all meter subtotals (a3, black, colour, large, extralarge)
 to see if Xerox is calculating differently
 """
 
-import mysql.connector
+from fake_bms import bms_connector
 import openpyxl
 from openpyxl.styles import Font, PatternFill
 from openpyxl.utils import get_column_letter
@@ -22,7 +22,7 @@ if not DB_USER or not DB_PASSWORD:
     raise ValueError("DB_USER and DB_PASSWORD must be set in .env file")
 
 def analyze_with_subtotals():
-    conn = mysql.connector.connect(
+    conn = bms_connector().connect(
         host='172.20.251.127',
         port=3306,
         user=DB_USER,
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Nearest-date BMS balance matching for the Xerox balance reconciliation
+
+Builds per-serial sorted date arrays from the raw BMS rows once, then uses
+binary search to pick the BMS reading that lines up with the Xerox reading date.
+
+Match modes:
+- latest:  latest BMS reading, whatever its date (original Balance Recon behaviour)
+- nearest: BMS reading with the smallest date gap to the Xerox date
+- bracket: the balance linearly interpolated between the readings on/before and
+           on/after the Xerox date (needs interpolate=True)
+
+Model and company are those of the BMS reading matched (the nearer one when
+interpolating), so a machine that moved store is shown where it was then.
+"""
+
+from bisect import bisect_left
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+from serial_keys import canonical_serial
+
+MATCH_MODES = ('latest', 'nearest', 'bracket')
+
+
+def to_ordinal(value) -> Optional[int]:
+    """Convert a date/datetime/'YYYY-MM-DD' string to a day ordinal"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    try:
+        return datetime.strptime(str(value)[:10], "%Y-%m-%d").toordinal()
+    except ValueError:
+        return None
+
+
+def build_balance_index(raw_results: List[Tuple]) -> Dict:
+    """Build {serial: {ordinals, balances, models, companies}} with ordinals sorted ascending
+
+    raw_results: (serial, model, status, date, category, install_date, datetime, total, a3, black, large, colour, xl, meterreadingid, meterreading_no, company)
+    Keeps the last row seen per serial+date - rows arrive ordered by createdtime,
+    so that is the latest reading of the day.
+    """
+    by_serial = {}
+    for row in raw_results:
+        serial = canonical_serial(row[0])
+        ordinal = to_ordinal(row[3])
+        if not serial or ordinal is None:
+            continue
+        by_serial.setdefault(serial, {})[ordinal] = (row[7] or 0, row[1], row[15])
+
+    index = {}
+    for serial, days in by_serial.items():
+        ordinals = sorted(days)
+        index[serial] = {
+            'ordinals': ordinals,
+            'balances': [days[o][0] for o in ordinals],
+            'models': [days[o][1] for o in ordinals],
+            'companies': [days[o][2] for o in ordinals]
+        }
+    return index
+
+
+def match_balance(entry: Dict, xerox_date, mode: str = 'latest', interpolate: bool = False) -> Optional[Dict]:
+    """Pick the BMS balance to compare against a Xerox reading taken on xerox_date
+
+    Returns {date, balance, gap_days, method, model, company} or None if the serial
+    has no readings. gap_days is the signed number of days from the Xerox date to the
+    BMS date used (0 for exact and interpolated matches).
+    """
+    if mode == 'bracket' and not interpolate:
+        raise ValueError("bracket matching interpolates - pass interpolate=True or use nearest")
+
+    ordinals = entry['ordinals']
+    if not ordinals:
+        return None
+
+    target = to_ordinal(xerox_date)
+    if mode == 'latest' or target is None:
+        return build_match(entry, len(ordinals) - 1, target, 'LATEST')
+
+    pos = bisect_left(ordinals, target)
+    if pos < len(ordinals) and ordinals[pos] == target:
+        return build_match(entry, pos, target, 'EXACT')
+
+    before = pos - 1 if pos > 0 else None
+    after = pos if pos < len(ordinals) else None
+
+    if before is None:
+        return build_match(entry, after, target, 'AFTER ONLY')
+    if after is None:
+        return build_match(entry, before, target, 'BEFORE ONLY')
+
+    # Closest side wins, ties go to the earlier reading
+    nearer = before if target - ordinals[before] <= ordinals[after] - target else after
+
+    if mode == 'bracket':
+        balances = entry['balances']
+        span = ordinals[after] - ordinals[before]
+        weight = (target - ordinals[before]) / span
+        balance = balances[before] + (balances[after] - balances[before]) * weight
+        result = build_match(entry, nearer, target, 'INTERPOLATED')
+        result.update(date=date.fromordinal(target), balance=round(balance), gap_days=0,
+                      bracket=(date.fromordinal(ordinals[before]), date.fromordinal(ordinals[after])))
+        return result
+
+    return build_match(entry, nearer, target, 'NEAREST')
+
+
+def build_match(entry: Dict, pos: int, target: Optional[int], method: str) -> Dict:
+    """Package the reading at pos with its signed day gap to the target date"""
+    ordinal = entry['ordinals'][pos]
+    return {
+        'date': date.fromordinal(ordinal),
+        'balance': entry['balances'][pos],
+        'gap_days': ordinal - target if target is not None else None,
+        'method': method,
+        'model': entry['models'][pos],
+        'company': entry['companies'][pos]
+    }
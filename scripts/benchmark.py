@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Benchmark the reporting pipeline on synthetic fleets
+
+Generates a deterministic fleet per size (synthetic_fleet.py), writes the
+matching Xerox workbooks to a temporary directory and times each stage:
+- calculate_incremental_volumes   BMS readings -> monthly volumes
+- load_device_meters              Device Current Meters workbook
+- load_excel_data                 Volumes from Xerox workbook
+- create_excel_report             comparison workbook
+- build_cube                      monthly cube from the volumes workbook
+- create_performance_report       YTD performance workbook
+Seconds are the best of --repeat runs; peak memory comes from one extra
+tracemalloc run (skip with --no-memory). Each run is appended to
+Benchmark_Results.json and compared with the previous run of the same size.
+
+    python3 scripts/benchmark.py [--sizes small,medium] [--repeat 3] [--stages build_cube]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from synthetic_fleet import fleet_spec, generate_fleet, write_device_meters_workbook, write_volumes_workbook
+
+SCRIPT_DIR = Path(__file__).parent
+RESULTS_FILE = SCRIPT_DIR.parent / "Benchmark_Results.json"
+
+SIZES = {
+    'small': {'companies': 5, 'serials': 200, 'months': 12},
+    'medium': {'companies': 20, 'serials': 2000, 'months': 24},
+    'large': {'companies': 64, 'serials': 10000, 'months': 36},
+}
+
+STAGES = ['calculate_incremental_volumes', 'load_device_meters', 'load_excel_data',
+          'create_excel_report', 'build_cube', 'create_performance_report']
+
+# Change vs the previous run reported as a regression/improvement beyond this
+CHANGE_THRESHOLD_PCT = 10.0
+
+
+def measure(fn: Callable, repeat: int, memory: bool) -> Dict:
+    """Best-of-repeat seconds and (optionally) peak traced memory of fn()"""
+    best = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn()
+            seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                fn()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+    return {'seconds': round(best, 4), 'peak_mb': round(peak_mb, 1) if peak_mb is not None else None}
+
+
+def stage_functions(fleet: Dict, workdir: Path) -> Dict[str, Callable]:
+    """Each stage as a zero-argument callable over the fleet's data and workbooks
+
+    Inputs a stage needs from an earlier one are computed once up front, so
+    every stage is timed on its own.
+    """
+    import export_comparison_excel as export
+    import xerox_performance_report as performance
+    from machine_store import MachineStore, machine_rows
+    from monthly_cube import build_cube, resolve_period
+
+    volumes_path = workdir / "Volumes from Xerox.xlsx"
+    meters_path = workdir / "Device Current Meters based on last Reading Date.xlsx"
+    write_volumes_workbook(fleet, volumes_path)
+    write_device_meters_workbook(fleet, meters_path)
+
+    raw_results = fleet['readings']
+    with contextlib.redirect_stdout(io.StringIO()):
+        db_data = export.calculate_incremental_volumes(raw_results)
+        excel_data = export.load_excel_data(volumes_path)
+        device_meters = export.load_device_meters(meters_path)
+        store = MachineStore(workdir / "bms_machine_info.db")
+        store.upsert(machine_rows(raw_results))
+        cube = build_cube(volumes_path, store)
+        balances = performance.load_device_meters(meters_path)
+        period = resolve_period('ytd', cube, None)
+
+    return {
+        'calculate_incremental_volumes': lambda: export.calculate_incremental_volumes(raw_results),
+        'load_device_meters': lambda: export.load_device_meters(meters_path),
+        'load_excel_data': lambda: export.load_excel_data(volumes_path),
+        'create_excel_report': lambda: export.create_excel_report(
+            excel_data, db_data, raw_results, device_meters, workdir / "Comparison.xlsx"),
+        'build_cube': lambda: build_cube(volumes_path, store),
+        'create_performance_report': lambda: performance.create_performance_report(
+            cube, balances, {}, {}, period, workdir / "Performance.xlsx"),
+    }
+
+
+def run_size(name: str, params: Dict, stages: List[str], repeat: int, memory: bool, seed: int) -> Dict:
+    """Generate one fleet size and measure the selected stages"""
+    spec = fleet_spec(seed=seed, **params)
+    start = time.perf_counter()
+    fleet = generate_fleet(spec)
+    print(f"\n{name}: {len(fleet['machines']):,} machines, {len(fleet['readings']):,} readings "
+          f"(generated in {time.perf_counter() - start:.1f}s)")
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="jetline_bench_") as tmp:
+        functions = stage_functions(fleet, Path(tmp))
+        for stage in stages:
+            results[stage] = measure(functions[stage], repeat, memory)
+            peak = f"{results[stage]['peak_mb']:>8.1f} MB" if memory else ""
+            print(f"  {stage:<32} {results[stage]['seconds']:>9.3f}s {peak}")
+
+    return {'spec': spec, 'readings': len(fleet['readings']), 'stages': results}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def load_results(path: Path) -> List[Dict]:
+    if not Path(path).exists():
+        return []
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def previous_size_result(history: List[Dict], size: str, spec: Dict) -> Dict:
+    """Latest earlier run of the same size with the same fleet spec"""
+    for run in reversed(history):
+        result = run['sizes'].get(size)
+        if result and result['spec'] == spec:
+            return dict(result, revision=run['revision'])
+    return None
+
+
+def print_changes(history: List[Dict], run: Dict):
+    """Time changes beyond CHANGE_THRESHOLD_PCT against the previous comparable run"""
+    print("\n" + "=" * 80)
+    print("CHANGE VS PREVIOUS RUN")
+    print("=" * 80)
+    for size, result in run['sizes'].items():
+        previous = previous_size_result(history, size, result['spec'])
+        if not previous:
+            print(f"\n{size}: no previous run with this fleet")
+            continue
+        print(f"\n{size} (vs {previous['revision']}):")
+        for stage, now in result['stages'].items():
+            before = previous['stages'].get(stage)
+            if not before or not before['seconds']:
+                continue
+            change = (now['seconds'] - before['seconds']) / before['seconds'] * 100
+            label = ("REGRESSION" if change > CHANGE_THRESHOLD_PCT
+                     else "improved" if change < -CHANGE_THRESHOLD_PCT else "")
+            print(f"  {stage:<32} {before['seconds']:>9.3f}s → {now['seconds']:>9.3f}s {change:>+7.1f}% {label}")
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the reporting stages on synthetic fleets")
+    parser.add_argument("--sizes", default="small,medium", help=f"Comma separated: {', '.join(SIZES)}")
+    parser.add_argument("--stages", help="Comma separated stages (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage, best kept (default: 3)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc peak memory run")
+    parser.add_argument("--seed", type=int, default=42, help="Fleet seed (default: 42)")
+    parser.add_argument("--output", default=str(RESULTS_FILE), help="Results history file")
+    args = parser.parse_args(argv)
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    stages = [s.strip() for s in args.stages.split(",")] if args.stages else STAGES
+    unknown = [s for s in sizes if s not in SIZES] + [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown sizes/stages: {', '.join(unknown)}")
+
+    run = {
+        'at': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'repeat': args.repeat,
+        'sizes': {},
+    }
+    for size in sizes:
+        run['sizes'][size] = run_size(size, SIZES[size], stages, args.repeat, not args.no_memory, args.seed)
+
+    history = load_results(args.output)
+    print_changes(history, run)
+    history.append(run)
+    with open(args.output, 'w') as f:
+        json.dump(history, f, indent=1, default=str)
+    print(f"\n✓ Results appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
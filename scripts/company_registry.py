@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Shared BMS company registry
+
+One list of company schemas for every extraction script, loaded once per process
+from bms_companies.json (default) or from the webapp's bms_connections table
+(COMPANY_REGISTRY=webapp, needs DATABASE_URL and psycopg2). Companies are grouped
+by host so one connection can serve every schema on that server, and each run
+records per-company row counts and query times in Company_Stats.json so the
+next run can schedule the largest companies first.
+
+    python3 scripts/company_registry.py            # companies grouped by host with stats
+    python3 scripts/company_registry.py --source webapp
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from statistics import median
+from typing import Dict, List, Optional, Tuple
+
+SCRIPT_DIR = Path(__file__).parent
+REGISTRY_FILE = SCRIPT_DIR / "bms_companies.json"
+
+# Runs kept per company in the stats file
+STATS_HISTORY = 10
+
+_companies_cache = {}
+
+
+def load_from_file(path: Path = REGISTRY_FILE) -> List[Dict]:
+    """Company configs from the local registry file"""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return [
+        {
+            'schema': c['schema'],
+            'name': c['name'],
+            'host': c['host'],
+            'port': int(c.get('port', 3306)),
+            'active': c.get('active', True)
+        }
+        for c in data['companies']
+    ]
+
+
+def load_from_webapp(database_url: str) -> List[Dict]:
+    """Company configs from the webapp's bms_connections table (named from companies)"""
+    import psycopg2
+
+    conn = psycopg2.connect(database_url)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT bc.schema, COALESCE(c.name, bc.schema), bc.host, bc.port, bc.is_active
+            FROM bms_connections bc
+            LEFT JOIN companies c ON c.bms_schema = bc.schema
+            ORDER BY bc.schema
+        """)
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+
+    return [
+        {'schema': schema, 'name': name, 'host': host, 'port': port or 3306, 'active': bool(active)}
+        for schema, name, host, port, active in rows
+    ]
+
+
+def load_companies(source: str = None, include_inactive: bool = False) -> List[Dict]:
+    """Configured companies, loaded once per process
+
+    source: 'file' (bms_companies.json) or 'webapp' (bms_connections) - defaults to
+    COMPANY_REGISTRY, then 'file'.
+    """
+    source = (source or os.getenv("COMPANY_REGISTRY", "file")).lower()
+    if source not in _companies_cache:
+        if source == 'webapp':
+            database_url = os.getenv("DATABASE_URL")
+            if not database_url:
+                raise ValueError("DATABASE_URL must be set to load companies from the webapp")
+            _companies_cache[source] = load_from_webapp(database_url)
+        elif source == 'file':
+            _companies_cache[source] = load_from_file()
+        else:
+            raise ValueError("COMPANY_REGISTRY must be 'file' or 'webapp'")
+
+    companies = _companies_cache[source]
+    return [dict(c) for c in companies if include_inactive or c['active']]
+
+
+def find_company(schema: str) -> Optional[Dict]:
+    """Company config by schema (active or not)"""
+    return next((c for c in load_companies(include_inactive=True) if c['schema'] == schema), None)
+
+
+def group_by_host(companies: List[Dict]) -> "OrderedDict[Tuple[str, int], List[Dict]]":
+    """{(host, port): [companies]} in first-seen order, so one connection can serve each host"""
+    groups = OrderedDict()
+    for company in companies:
+        groups.setdefault((company['host'], company['port']), []).append(company)
+    return groups
+
+
+def load_stats(path: Path) -> Dict:
+    """Per-company run history: {schema: [{'at', 'rows', 'seconds', 'error'}]}"""
+    if not Path(path).exists():
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_stats(stats: Dict, path: Path):
+    with open(path, 'w') as f:
+        json.dump(stats, f, indent=1)
+
+
+def record_run(stats: Dict, schema: str, rows: int, seconds: float, error: str = None):
+    """Append one company query to the history (keeps the last STATS_HISTORY runs)"""
+    history = stats.setdefault(schema, [])
+    history.append({
+        'at': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'rows': rows,
+        'seconds': round(seconds, 2),
+        'error': error[:200] if error else None
+    })
+    del history[:-STATS_HISTORY]
+
+
+def expected_cost(stats: Dict, schema: str) -> Optional[Dict]:
+    """Median rows and seconds over the company's successful runs (None if never measured)"""
+    runs = [r for r in stats.get(schema, []) if not r['error']]
+    if not runs:
+        return None
+    return {'rows': median(r['rows'] for r in runs), 'seconds': median(r['seconds'] for r in runs)}
+
+
+def schedule(companies: List[Dict], stats: Dict, size_hints: Dict[str, int] = None) -> List[Dict]:
+    """Largest (slowest) companies first
+
+    Never-measured companies go first so they get measured, largest first by
+    size_hints ({schema: estimated rows}, e.g. from the pre-flight probe).
+    """
+    size_hints = size_hints or {}
+
+    def cost(company):
+        measured = expected_cost(stats, company['schema'])
+        if measured is None:
+            return (1, size_hints.get(company['schema']) or 0)
+        return (0, measured['seconds'])
+    return sorted(companies, key=cost, reverse=True)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Show the BMS company registry grouped by host")
+    parser.add_argument("--source", choices=["file", "webapp"], help="Registry source (default: COMPANY_REGISTRY or file)")
+    parser.add_argument("--stats", default=str(SCRIPT_DIR.parent / "Company_Stats.json"), help="Company stats file")
+    parser.add_argument("--all", action="store_true", help="Include inactive companies")
+    args = parser.parse_args(argv)
+
+    companies = load_companies(args.source, include_inactive=args.all)
+    stats = load_stats(args.stats)
+
+    for (host, port), group in group_by_host(schedule(companies, stats)).items():
+        print(f"\n{host}:{port} ({len(group)} schemas)")
+        for company in group:
+            measured = expected_cost(stats, company['schema'])
+            detail = f"{measured['rows']:>10,.0f} rows {measured['seconds']:>7.1f}s" if measured else "    not measured yet"
+            flag = "" if company['active'] else "  (inactive)"
+            print(f"  {company['schema']:<28} {company['name']:<22} {detail}{flag}")
+
+
+if __name__ == "__main__":
+    main()
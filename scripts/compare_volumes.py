@@ -4,84 +4,18 @@ Compare database query results with Volumes from Xerox.xlsx
 Serial numbers are unique per printer - use them as the key for comparison
 """
 
-import mysql.connector
 import openpyxl
 from datetime import datetime
 from typing import Dict, List, Tuple
 from collections import defaultdict
+from pathlib import Path
+from serial_keys import canonical_serial, build_serial_index, rekey_to_target, write_unmatched_report
+from company_registry import load_companies
 
 # Database credentials
 DB_USER = "fortyone"
 DB_PASSWORD = "fo123@!"
 
-# Companies list from lib/companies.ts
-COMPANIES = [
-    {"schema": "corporateprintbms2", "name": "Jetline Corporate", "host": "172.20.251.127", "port": 3306},
-    {"schema": "burlingtonbms2", "name": "Burlington", "host": "172.20.251.127", "port": 3306},
-    {"schema": "typoprintingbms2", "name": "Typo", "host": "172.20.251.127", "port": 3306},
-    {"schema": "anglobms2", "name": "Anglo", "host": "172.20.251.127", "port": 3306},
-    {"schema": "formattsolutionsbms2", "name": "Formatt", "host": "172.20.251.127", "port": 3306},
-    {"schema": "landkbms2", "name": "L and K", "host": "172.20.251.127", "port": 3306},
-    {"schema": "marinsbms2", "name": "Marins", "host": "172.20.251.127", "port": 3306},
-    {"schema": "25amcpsbms2", "name": "Corporate Print 25AM", "host": "172.20.251.127", "port": 3306},
-    {"schema": "masterskillbms2", "name": "Masterskill", "host": "172.20.251.127", "port": 3306},
-    {"schema": "nscbms2", "name": "Fixtrade", "host": "172.20.251.127", "port": 3306},
-    {"schema": "pocketmediabms2", "name": "Pocket Media", "host": "172.20.251.127", "port": 3306},
-    {"schema": "raptorbms2", "name": "Raptor", "host": "172.20.251.127", "port": 3306},
-    {"schema": "systemprintbms2", "name": "SystemPrint", "host": "172.20.251.127", "port": 3306},
-    {"schema": "firstlabelsbms2", "name": "First Labels", "host": "172.20.251.127", "port": 3306},
-    {"schema": "welkombms2", "name": "Welkom", "host": "172.20.251.127", "port": 3306},
-    {"schema": "witbankbms2", "name": "Witbank", "host": "172.20.251.127", "port": 3306},
-    {"schema": "gardensbms2", "name": "Gardens", "host": "wizardzgardens.jetlinestores.co.za", "port": 3306},
-    {"schema": "printoutsolutionsbms2", "name": "PrintOut", "host": "172.20.251.127", "port": 3306},
-    {"schema": "waterfrontbms2", "name": "Waterfront", "host": "wizardzwaterfront.jetlinestores.co.za", "port": 3306},
-    {"schema": "centurycitybms2", "name": "Century City", "host": "centurycity.jetlinestores.co.za", "port": 3306},
-    {"schema": "albertonbms2", "name": "Alberton", "host": "alberton.jetlinestores.co.za", "port": 3306},
-    {"schema": "bedfordviewbms2", "name": "Bedfordview", "host": "bedfordview.jetlinestores.co.za", "port": 3306},
-    {"schema": "blackheathbms2", "name": "Blackheath", "host": "blackheath.jetlinestores.co.za", "port": 3306},
-    {"schema": "boksburgbms2", "name": "Boksburg", "host": "boksburg.jetlinestores.co.za", "port": 3306},
-    {"schema": "benonibms2", "name": "Benoni", "host": "benoni.jetlinestores.co.za", "port": 3306},
-    {"schema": "braamfonteinbms2", "name": "Braamfontein", "host": "braamfontein.jetlinestores.co.za", "port": 3306},
-    {"schema": "bryanstonbms2", "name": "Bryanston", "host": "bryanston.jetlinestores.co.za", "port": 3306},
-    {"schema": "durbanbms2", "name": "Durban", "host": "durban.jetlinestores.co.za", "port": 3306},
-    {"schema": "foxstreetbms2", "name": "Foxstreet", "host": "foxstreet.jetlinestores.co.za", "port": 3306},
-    {"schema": "parktowncorporateprintbms2", "name": "Hillcrestcps", "host": "parktown.jetlinestores.co.za", "port": 3306},
-    {"schema": "hillcrestbms2", "name": "Hillcrest", "host": "hillcrest.jetlinestores.co.za", "port": 3306},
-    {"schema": "kyalamibms2", "name": "Kyalami", "host": "kyalami.jetlinestores.co.za", "port": 3306},
-    {"schema": "melrosebms2", "name": "Melrose", "host": "melrose.jetlinestores.co.za", "port": 3306},
-    {"schema": "menlynbms2", "name": "Menlyn", "host": "menlyn.jetlinestores.co.za", "port": 3306},
-    {"schema": "parktownbms2", "name": "Parktown", "host": "parktown.jetlinestores.co.za", "port": 3306},
-    {"schema": "pietermaritzburgbms2", "name": "Pietermaritzburg", "host": "pietermaritzburg.jetlinestores.co.za", "port": 3306},
-    {"schema": "sunninghillbms2", "name": "Sunninghill", "host": "sunninghill.jetlinestores.co.za", "port": 3306},
-    {"schema": "polokwanebms2", "name": "Polokwane", "host": "polokwane.jetlinestores.co.za", "port": 3306},
-    {"schema": "rivoniabms2", "name": "Rivonia", "host": "rivonia.jetlinestores.co.za", "port": 3306},
-    {"schema": "rosebankbms2", "name": "Rosebank", "host": "rosebank.jetlinestores.co.za", "port": 3306},
-    {"schema": "rustenburgbms2", "name": "Rustenburg", "host": "rustenburg.jetlinestores.co.za", "port": 3306},
-    {"schema": "sandownbms2", "name": "Sandown", "host": "sandown.jetlinestores.co.za", "port": 3306},
-    {"schema": "illovobms2", "name": "Illovo", "host": "illovo.jetlinestores.co.za", "port": 3306},
-    {"schema": "montanabms2", "name": "Montana", "host": "montana.jetlinestores.co.za", "port": 3306},
-    {"schema": "brooklynbms2", "name": "Brooklyn", "host": "brooklyn.jetlinestores.co.za", "port": 3306},
-    {"schema": "potchbms2", "name": "Potchefstroom", "host": "potchefstroom.jetlinestores.co.za", "port": 3306},
-    {"schema": "woodmeadbms2", "name": "Woodmead", "host": "woodmead.jetlinestores.co.za", "port": 3306},
-    {"schema": "georgebms2", "name": "George", "host": "george.jetlinestores.co.za", "port": 3306},
-    {"schema": "modderfonteinbms2", "name": "Modderfontein", "host": "modderfontein.jetlinestores.co.za", "port": 3306},
-    {"schema": "vaalreefsbms2", "name": "Vaalreefs", "host": "vaalreefs.jetlinestores.co.za", "port": 3306},
-    {"schema": "klerksdorpbms2", "name": "Klerksdorp", "host": "klerksdorp.jetlinestores.co.za", "port": 3306},
-    {"schema": "greenpointbms2", "name": "Greenpoint", "host": "greenpoint.jetlinestores.co.za", "port": 3306},
-    {"schema": "randburgbms2", "name": "Randburg", "host": "randburg.jetlinestores.co.za", "port": 3306},
-    {"schema": "hydeparkbms2", "name": "Hydepark", "host": "hydepark.jetlinestores.co.za", "port": 3306},
-    {"schema": "fourwaysbms2", "name": "Fourways", "host": "fourways.jetlinestores.co.za", "port": 3306},
-    {"schema": "centurionbms2", "name": "Centurion", "host": "centurion.jetlinestores.co.za", "port": 3306},
-    {"schema": "nelspruitbms2", "name": "Nelspruit", "host": "nelspruit.jetlinestores.co.za", "port": 3306},
-    {"schema": "witsbms2", "name": "Wits", "host": "wits.jetlinestores.co.za", "port": 3306},
-    {"schema": "constantiabms2", "name": "Constantia", "host": "constantia.jetlinestores.co.za", "port": 3306},
-    {"schema": "stellenboschbms2", "name": "Stellenbosch", "host": "stellenbosch.jetlinestores.co.za", "port": 3306},
-    {"schema": "tygervalleybms2", "name": "Tygervalley", "host": "tygervalley.jetlinestores.co.za", "port": 3306},
-    {"schema": "midrandbms2", "name": "Midrand", "host": "midrand.jetlinestores.co.za", "port": 3306},
-    {"schema": "mmabathobms2", "name": "Mmabatho", "host": "mmabatho.jetlinestores.co.za", "port": 3306},
-    {"schema": "ballitobms2", "name": "Ballito", "host": "ballito.jetlinestores.co.za", "port": 3306}
-]
-
 QUERY = """
 SELECT
     ma.serialnumber,
@@ -113,22 +47,27 @@ def load_excel_data(filepath: str) -> Dict:
         customer, model, serial, month_year, volume = row
 
         # Skip aggregate rows (where serial is None or "Total")
+        serial = canonical_serial(serial)
         if serial and serial != "Total" and month_year and month_year != "Total":
-            data[str(serial)][month_year] = volume
+            data[serial][month_year] = volume
 
     return data
 
 
 def query_all_databases() -> Dict:
     """Query all company databases and return combined results by serial"""
+    from fake_bms import bms_connector
+
+    companies = load_companies()
+
     # Structure: {serial: {month: {volume, model, schema}}}
     all_data = defaultdict(lambda: defaultdict(dict))
 
-    for i, company in enumerate(COMPANIES, 1):
-        print(f"[{i}/{len(COMPANIES)}] Querying {company['name']} ({company['schema']})...")
+    for i, company in enumerate(companies, 1):
+        print(f"[{i}/{len(companies)}] Querying {company['name']} ({company['schema']})...")
 
         try:
-            conn = mysql.connector.connect(
+            conn = bms_connector().connect(
                 host=company["host"],
                 port=company["port"],
                 user=DB_USER,
@@ -146,7 +85,7 @@ def query_all_databases() -> Dict:
                 if serial and reading_date and total:
                     try:
                         month_year = reading_date.strftime("%b-%Y")
-                        all_data[str(serial)][month_year] = {
+                        all_data[canonical_serial(serial)][month_year] = {
                             'volume': total,
                             'model': model,
                             'schema': company['schema'],
@@ -258,6 +197,12 @@ def main():
     db_data = query_all_databases()
     print(f"\n✓ Loaded {len(db_data)} unique serials from databases\n")
 
+    print("Matching serials...")
+    serial_matches = rekey_to_target(excel_data, build_serial_index(db_data.keys()), "Xerox Volumes")
+    output_dir = Path(excel_path).parent
+    written = write_unmatched_report({"Xerox Volumes": serial_matches}, output_dir / "Unmatched_Serials.csv")
+    print(f"✓ {written} near/unmatched serials saved: {output_dir / 'Unmatched_Serials.csv'}\n")
+
     compare_data(excel_data, db_data)
 
 
@@ -4,83 +4,24 @@ Compare database query results with Volumes from Xerox.xlsx
 FIXED: Calculate incremental volumes from cumulative DB readings
 """
 
-import mysql.connector
 import openpyxl
 from datetime import datetime
 from typing import Dict, List, Tuple
 from collections import defaultdict
+from pathlib import Path
+import os
+from serial_keys import canonical_serial, build_serial_index, rekey_to_target, write_unmatched_report
+from company_registry import load_companies
+from schema_fingerprint import choose_query, refresh_fingerprints
+from volume_comparison import (
+    DEFAULT_ABS_TOLERANCE, DEFAULT_REL_TOLERANCE,
+    align_volumes, evaluate, print_summary, save_aligned, write_mismatches
+)
 
 # Database credentials
 DB_USER = "fortyone"
 DB_PASSWORD = "fo123@!"
 
-# Companies list from lib/companies.ts (excluding braamfonteinbms2)
-COMPANIES = [
-    {"schema": "corporateprintbms2", "name": "Jetline Corporate", "host": "172.20.251.127", "port": 3306},
-    {"schema": "burlingtonbms2", "name": "Burlington", "host": "172.20.251.127", "port": 3306},
-    {"schema": "typoprintingbms2", "name": "Typo", "host": "172.20.251.127", "port": 3306},
-    {"schema": "anglobms2", "name": "Anglo", "host": "172.20.251.127", "port": 3306},
-    {"schema": "formattsolutionsbms2", "name": "Formatt", "host": "172.20.251.127", "port": 3306},
-    {"schema": "landkbms2", "name": "L and K", "host": "172.20.251.127", "port": 3306},
-    {"schema": "marinsbms2", "name": "Marins", "host": "172.20.251.127", "port": 3306},
-    {"schema": "25amcpsbms2", "name": "Corporate Print 25AM", "host": "172.20.251.127", "port": 3306},
-    {"schema": "masterskillbms2", "name": "Masterskill", "host": "172.20.251.127", "port": 3306},
-    {"schema": "nscbms2", "name": "Fixtrade", "host": "172.20.251.127", "port": 3306},
-    {"schema": "pocketmediabms2", "name": "Pocket Media", "host": "172.20.251.127", "port": 3306},
-    {"schema": "raptorbms2", "name": "Raptor", "host": "172.20.251.127", "port": 3306},
-    {"schema": "systemprintbms2", "name": "SystemPrint", "host": "172.20.251.127", "port": 3306},
-    {"schema": "firstlabelsbms2", "name": "First Labels", "host": "172.20.251.127", "port": 3306},
-    {"schema": "welkombms2", "name": "Welkom", "host": "172.20.251.127", "port": 3306},
-    {"schema": "witbankbms2", "name": "Witbank", "host": "172.20.251.127", "port": 3306},
-    {"schema": "gardensbms2", "name": "Gardens", "host": "wizardzgardens.jetlinestores.co.za", "port": 3306},
-    {"schema": "printoutsolutionsbms2", "name": "PrintOut", "host": "172.20.251.127", "port": 3306},
-    {"schema": "waterfrontbms2", "name": "Waterfront", "host": "wizardzwaterfront.jetlinestores.co.za", "port": 3306},
-    {"schema": "centurycitybms2", "name": "Century City", "host": "centurycity.jetlinestores.co.za", "port": 3306},
-    {"schema": "albertonbms2", "name": "Alberton", "host": "alberton.jetlinestores.co.za", "port": 3306},
-    {"schema": "bedfordviewbms2", "name": "Bedfordview", "host": "bedfordview.jetlinestores.co.za", "port": 3306},
-    {"schema": "blackheathbms2", "name": "Blackheath", "host": "blackheath.jetlinestores.co.za", "port": 3306},
-    {"schema": "boksburgbms2", "name": "Boksburg", "host": "boksburg.jetlinestores.co.za", "port": 3306},
-    {"schema": "benonibms2", "name": "Benoni", "host": "benoni.jetlinestores.co.za", "port": 3306},
-    {"schema": "bryanstonbms2", "name": "Bryanston", "host": "bryanston.jetlinestores.co.za", "port": 3306},
-    {"schema": "durbanbms2", "name": "Durban", "host": "durban.jetlinestores.co.za", "port": 3306},
-    {"schema": "foxstreetbms2", "name": "Foxstreet", "host": "foxstreet.jetlinestores.co.za", "port": 3306},
-    {"schema": "parktowncorporateprintbms2", "name": "Hillcrestcps", "host": "parktown.jetlinestores.co.za", "port": 3306},
-    {"schema": "hillcrestbms2", "name": "Hillcrest", "host": "hillcrest.jetlinestores.co.za", "port": 3306},
-    {"schema": "kyalamibms2", "name": "Kyalami", "host": "kyalami.jetlinestores.co.za", "port": 3306},
-    {"schema": "melrosebms2", "name": "Melrose", "host": "melrose.jetlinestores.co.za", "port": 3306},
-    {"schema": "menlynbms2", "name": "Menlyn", "host": "menlyn.jetlinestores.co.za", "port": 3306},
-    {"schema": "parktownbms2", "name": "Parktown", "host": "parktown.jetlinestores.co.za", "port": 3306},
-    {"schema": "pietermaritzburgbms2", "name": "Pietermaritzburg", "host": "pietermaritzburg.jetlinestores.co.za", "port": 3306},
-    {"schema": "sunninghillbms2", "name": "Sunninghill", "host": "sunninghill.jetlinestores.co.za", "port": 3306},
-    {"schema": "polokwanebms2", "name": "Polokwane", "host": "polokwane.jetlinestores.co.za", "port": 3306},
-    {"schema": "rivoniabms2", "name": "Rivonia", "host": "rivonia.jetlinestores.co.za", "port": 3306},
-    {"schema": "rosebankbms2", "name": "Rosebank", "host": "rosebank.jetlinestores.co.za", "port": 3306},
-    {"schema": "rustenburgbms2", "name": "Rustenburg", "host": "rustenburg.jetlinestores.co.za", "port": 3306},
-    {"schema": "sandownbms2", "name": "Sandown", "host": "sandown.jetlinestores.co.za", "port": 3306},
-    {"schema": "illovobms2", "name": "Illovo", "host": "illovo.jetlinestores.co.za", "port": 3306},
-    {"schema": "montanabms2", "name": "Montana", "host": "montana.jetlinestores.co.za", "port": 3306},
-    {"schema": "brooklynbms2", "name": "Brooklyn", "host": "brooklyn.jetlinestores.co.za", "port": 3306},
-    {"schema": "potchbms2", "name": "Potchefstroom", "host": "potchefstroom.jetlinestores.co.za", "port": 3306},
-    {"schema": "woodmeadbms2", "name": "Woodmead", "host": "woodmead.jetlinestores.co.za", "port": 3306},
-    {"schema": "georgebms2", "name": "George", "host": "george.jetlinestores.co.za", "port": 3306},
-    {"schema": "modderfonteinbms2", "name": "Modderfontein", "host": "modderfontein.jetlinestores.co.za", "port": 3306},
-    {"schema": "vaalreefsbms2", "name": "Vaalreefs", "host": "vaalreefs.jetlinestores.co.za", "port": 3306},
-    {"schema": "klerksdorpbms2", "name": "Klerksdorp", "host": "klerksdorp.jetlinestores.co.za", "port": 3306},
-    {"schema": "greenpointbms2", "name": "Greenpoint", "host": "greenpoint.jetlinestores.co.za", "port": 3306},
-    {"schema": "randburgbms2", "name": "Randburg", "host": "randburg.jetlinestores.co.za", "port": 3306},
-    {"schema": "hydeparkbms2", "name": "Hydepark", "host": "hydepark.jetlinestores.co.za", "port": 3306},
-    {"schema": "fourwaysbms2", "name": "Fourways", "host": "fourways.jetlinestores.co.za", "port": 3306},
-    {"schema": "centurionbms2", "name": "Centurion", "host": "centurion.jetlinestores.co.za", "port": 3306},
-    {"schema": "nelspruitbms2", "name": "Nelspruit", "host": "nelspruit.jetlinestores.co.za", "port": 3306},
-    {"schema": "witsbms2", "name": "Wits", "host": "wits.jetlinestores.co.za", "port": 3306},
-    {"schema": "constantiabms2", "name": "Constantia", "host": "constantia.jetlinestores.co.za", "port": 3306},
-    {"schema": "stellenboschbms2", "name": "Stellenbosch", "host": "stellenbosch.jetlinestores.co.za", "port": 3306},
-    {"schema": "tygervalleybms2", "name": "Tygervalley", "host": "tygervalley.jetlinestores.co.za", "port": 3306},
-    {"schema": "midrandbms2", "name": "Midrand", "host": "midrand.jetlinestores.co.za", "port": 3306},
-    {"schema": "mmabathobms2", "name": "Mmabatho", "host": "mmabatho.jetlinestores.co.za", "port": 3306},
-    {"schema": "ballitobms2", "name": "Ballito", "host": "ballito.jetlinestores.co.za", "port": 3306}
-]
-
 QUERY = """
 SELECT
     ma.serialnumber,
@@ -111,8 +52,9 @@ def load_excel_data(filepath: str) -> Dict:
     for row in ws.iter_rows(min_row=3, values_only=True):
         customer, model, serial, month_year, volume = row
 
+        serial = canonical_serial(serial)
         if serial and serial != "Total" and month_year and month_year != "Total":
-            data[str(serial)][month_year] = volume
+            data[serial][month_year] = volume
 
     return data
 
@@ -127,7 +69,7 @@ def calculate_incremental_volumes(raw_data: List[Tuple]) -> Dict:
     by_serial = defaultdict(list)
     for serial, model, date, total, company in raw_data:
         if serial and date and total is not None:
-            by_serial[str(serial)].append((date, total, model, company))
+            by_serial[canonical_serial(serial)].append((date, total, model, company))
 
     # Calculate incremental for each serial
     result = defaultdict(lambda: defaultdict(dict))
@@ -164,13 +106,21 @@ def calculate_incremental_volumes(raw_data: List[Tuple]) -> Dict:
 
 def query_all_databases() -> List[Tuple]:
     """Query all company databases and return raw results"""
+    from fake_bms import bms_connector
+
+    companies = load_companies()
     all_results = []
 
-    for i, company in enumerate(COMPANIES, 1):
-        print(f"[{i}/{len(COMPANIES)}] Querying {company['name']} ({company['schema']})...")
+    # Pick the query per schema from its cached capabilities (only changed schemas are re-inspected)
+    settings = {'user': DB_USER, 'password': DB_PASSWORD, 'use_ssh_tunnel': False, 'ssh_tunnel_port': None}
+    fingerprints, _ = refresh_fingerprints(settings, companies)
+
+    for i, company in enumerate(companies, 1):
+        variant, query = choose_query(fingerprints.get(company['schema']), QUERY)
+        print(f"[{i}/{len(companies)}] Querying {company['name']} ({company['schema']}, {variant})...")
 
         try:
-            conn = mysql.connector.connect(
+            conn = bms_connector().connect(
                 host=company["host"],
                 port=company["port"],
                 user=DB_USER,
@@ -179,7 +129,7 @@ def query_all_databases() -> List[Tuple]:
                 connect_timeout=10
             )
             cursor = conn.cursor()
-            cursor.execute(QUERY)
+            cursor.execute(query)
             results = cursor.fetchall()
             cursor.close()
             conn.close()
@@ -196,124 +146,35 @@ def query_all_databases() -> List[Tuple]:
     return all_results
 
 
-def compare_data(excel_data: Dict, db_data: Dict):
-    """Compare Excel and database incremental volumes"""
+def compare_data(excel_data: Dict, db_data: Dict, abs_tol: float = DEFAULT_ABS_TOLERANCE,
+                 rel_tol: float = DEFAULT_REL_TOLERANCE, mismatch_path: str = None,
+                 aligned_path: str = None) -> Dict:
+    """Compare Excel and database incremental volumes
+
+    Returns the aligned (serial, month) columns so callers can re-evaluate
+    with other tolerances without another pass over the source data.
+    """
     print("\n" + "="*80)
     print("COMPARISON RESULTS (Incremental Volumes)")
-    print("="*80 + "\n")
-
-    all_serials = set(excel_data.keys()) | set(db_data.keys())
-
-    total_matches = 0
-    total_mismatches = 0
-    total_db_only = 0
-    total_excel_only = 0
-    serials_in_both = 0
-    serials_db_only = 0
-    serials_excel_only = 0
-
-    mismatch_details = []
-
-    for serial in sorted(all_serials):
-        excel_months = excel_data.get(serial, {})
-        db_months = db_data.get(serial, {})
-
-        all_months = set(excel_months.keys()) | set(db_months.keys())
-
-        if excel_months and db_months:
-            serials_in_both += 1
-        elif db_months:
-            serials_db_only += 1
-            continue
-        elif excel_months:
-            serials_excel_only += 1
-            continue
-
-        # Compare month by month
-        matches = 0
-        mismatches = 0
-        db_only = 0
-        excel_only = 0
-
-        serial_mismatches = []
-
-        for month in sorted(all_months):
-            db_info = db_months.get(month, {})
-            db_vol = db_info.get('volume')
-            excel_vol = excel_months.get(month)
-
-            if db_vol is not None and excel_vol is not None:
-                diff = abs(db_vol - excel_vol)
-                pct_diff = (diff / excel_vol * 100) if excel_vol > 0 else 0
-
-                # Consider match if within 5% or absolute difference < 100
-                if diff < 100 or pct_diff < 5:
-                    matches += 1
-                else:
-                    mismatches += 1
-                    serial_mismatches.append({
-                        'month': month,
-                        'db': db_vol,
-                        'excel': excel_vol,
-                        'diff': diff,
-                        'pct': pct_diff
-                    })
-            elif db_vol is not None:
-                db_only += 1
-            elif excel_vol is not None:
-                excel_only += 1
-
-        if matches > 0:
-            company = list(db_months.values())[0]['company']
-            model = list(db_months.values())[0]['model']
-            if mismatches == 0:
-                print(f"✓ Serial {serial} ({model} - {company}): All {matches} months match")
-            else:
-                mismatch_details.append({
-                    'serial': serial,
-                    'model': model,
-                    'company': company,
-                    'matches': matches,
-                    'mismatches': mismatches,
-                    'details': serial_mismatches
-                })
-
-        total_matches += matches
-        total_mismatches += mismatches
-        total_db_only += db_only
-        total_excel_only += excel_only
-
-    # Print mismatches
-    if mismatch_details:
-        print(f"\n{'='*80}")
-        print(f"SERIALS WITH MISMATCHES ({len(mismatch_details)})")
-        print(f"{'='*80}\n")
-        for item in mismatch_details[:10]:  # Show first 10
-            print(f"\n❌ Serial {item['serial']} ({item['model']} - {item['company']}):")
-            print(f"   Matches: {item['matches']} | Mismatches: {item['mismatches']}")
-            for detail in item['details'][:5]:  # Show first 5 months
-                print(f"   {detail['month']}: DB={detail['db']:,.0f} vs Excel={detail['excel']:,.0f} (diff={detail['diff']:,.0f}, {detail['pct']:.1f}%)")
-
-    # Print summary
-    print("\n" + "="*80)
-    print("SUMMARY")
     print("="*80)
-    print(f"Serials in both:     {serials_in_both}")
-    print(f"Serials DB only:     {serials_db_only}")
-    print(f"Serials Excel only:  {serials_excel_only}")
-    print(f"\nMonth-by-month comparison (incremental volumes):")
-    print(f"  Matches:           {total_matches}")
-    print(f"  Mismatches:        {total_mismatches}")
-    print(f"  DB only:           {total_db_only}")
-    print(f"  Excel only:        {total_excel_only}")
 
-    if total_matches + total_mismatches > 0:
-        accuracy = (total_matches / (total_matches + total_mismatches)) * 100
-        print(f"\nAccuracy: {accuracy:.1f}%")
+    aligned = align_volumes(excel_data, db_data)
+    matches = evaluate(aligned, abs_tol, rel_tol)
+    print_summary(aligned, matches, abs_tol, rel_tol)
+
+    if mismatch_path:
+        written = write_mismatches(aligned, matches, mismatch_path)
+        print(f"\n✓ {written} mismatches saved: {mismatch_path}")
 
+    if aligned_path:
+        save_aligned(aligned, aligned_path)
+        print(f"✓ Aligned volumes saved: {aligned_path} (re-evaluate with volume_comparison.py)")
 
-def main():
-    excel_path = "/Users/alwynkotze/Documents/JDW/jetline-machines-automation/Volumes from Xerox.xlsx"
+    return aligned
+
+
+def main(excel_path: str = None):
+    excel_path = excel_path or Path(__file__).parent.parent / "Volumes from Xerox.xlsx"
 
     print("Loading Excel data...")
     excel_data = load_excel_data(excel_path)
@@ -327,7 +188,16 @@ def main():
     db_data = calculate_incremental_volumes(raw_results)
     print(f"✓ Processed {len(db_data)} unique serials\n")
 
-    compare_data(excel_data, db_data)
+    print("Matching serials...")
+    serial_matches = rekey_to_target(excel_data, build_serial_index(db_data.keys()), "Xerox Volumes")
+    output_dir = Path(excel_path).parent
+    written = write_unmatched_report({"Xerox Volumes": serial_matches}, output_dir / "Unmatched_Serials.csv")
+    print(f"✓ {written} near/unmatched serials saved: {output_dir / 'Unmatched_Serials.csv'}\n")
+
+    abs_tol = float(os.getenv("COMPARE_ABS_TOL", DEFAULT_ABS_TOLERANCE))
+    rel_tol = float(os.getenv("COMPARE_REL_TOL", DEFAULT_REL_TOLERANCE))
+    compare_data(excel_data, db_data, abs_tol, rel_tol,
+                 output_dir / "Volume_Mismatches.csv", output_dir / "Volume_Alignment.json")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Coverage-period reconciliation - BMS movement over each Xerox billing line's coverage interval
+
+Instead of shifting BMS months forward by one to approximate the Xerox calendar,
+each billing line is joined to the BMS readings of its serial on the line's actual
+Coverage From / Coverage To dates:
+- opening reading = last BMS reading on or before Coverage From
+- closing reading = last BMS reading on or before Coverage To
+- BMS volume      = closing - opening on the counter the line bills (Charge Item)
+
+The join is a sort-merge per serial: billing line boundaries and BMS readings are
+both sorted by date and walked once together.
+"""
+
+import openpyxl
+from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils import get_column_letter
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List, Tuple
+from balance_matching import to_ordinal
+from serial_keys import canonical_serial
+
+COUNTERS = ('total', 'a3', 'black', 'large', 'colour', 'extralarge')
+
+# Xerox Charge Item → BMS counter (same mapping as the webapp recon)
+LINE_DESC_TO_BMS = {
+    'black impressions': 'black',
+    'black large impressions': 'a3',
+    'color impressions': 'colour',
+    'color large impressions': 'large',
+    'extra long impressions': 'extralarge',
+    'metera - total sq metres': 'total',
+    'total impressions': 'total',
+}
+
+
+def billing_month_from_invoice(invoice_month: str) -> str:
+    """Xerox bills in arrears: usage month = invoice month - 1 (YYYY-MM)"""
+    year, month = (int(p) for p in invoice_month.split('-'))
+    if month == 1:
+        return f"{year - 1}-12"
+    return f"{year}-{month - 1:02d}"
+
+
+def load_billing_lines(filepath: str) -> List[Dict]:
+    """Load Xerox billing lines from the billing export workbook (one sheet per invoice month)
+
+    Uses the same columns as the webapp billing import: Serial Number, Print Type,
+    Charge Item, Invoice Month/Number, Coverage From/To, Previous/Current Reading, Total Clicks.
+    """
+    wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    lines = []
+
+    for ws in wb.worksheets:
+        # Skip legend/helper sheets
+        if ws.title.lower().startswith('sheet'):
+            continue
+
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header:
+            continue
+        col = {str(name).strip(): i for i, name in enumerate(header) if name}
+        if 'Serial Number' not in col:
+            continue
+
+        def value(row, name):
+            i = col.get(name)
+            return row[i] if i is not None and i < len(row) else None
+
+        line_counters = defaultdict(int)
+
+        for row in rows:
+            serial = canonical_serial(value(row, 'Serial Number'))
+            if not serial:
+                continue
+
+            invoice_month = str(value(row, 'Invoice Month') or '').strip()
+            billing_month = billing_month_from_invoice(invoice_month) if len(invoice_month) == 7 else None
+            print_type = str(value(row, 'Print Type') or '').strip()
+            charge_item = value(row, 'Charge Item')
+
+            # Distinguish duplicate print types for the same serial (e.g. two A3 Color rows)
+            counter_key = (serial, billing_month, print_type)
+            line_index = line_counters[counter_key]
+            line_counters[counter_key] += 1
+
+            lines.append({
+                'serial': serial,
+                'customer': value(row, 'Customer'),
+                'product': value(row, 'Product'),
+                'invoice_number': value(row, 'Invoice Number'),
+                'invoice_month': invoice_month,
+                'billing_month': billing_month,
+                'print_type': print_type,
+                'line_description': str(charge_item).strip() if charge_item else None,
+                'line_index': line_index,
+                'coverage_from': value(row, 'Coverage From'),
+                'coverage_to': value(row, 'Coverage To'),
+                'previous_reading': value(row, 'Previous Reading'),
+                'current_reading': value(row, 'Current Reading'),
+                'total_clicks': value(row, 'Total Clicks'),
+            })
+
+    return lines
+
+
+def build_counter_index(raw_results: List[Tuple]) -> Dict:
+    """Build {serial: {ordinals, total, a3, black, large, colour, extralarge}} sorted by date
+
+    raw_results: (serial, model, status, date, category, install_date, datetime, total, a3, black, large, colour, xl, meterreadingid, meterreading_no, company)
+    Last row per serial+date wins (rows arrive ordered by createdtime).
+    """
+    by_serial = defaultdict(dict)
+    for row in raw_results:
+        serial = canonical_serial(row[0])
+        ordinal = to_ordinal(row[3])
+        if not serial or ordinal is None or row[7] is None:
+            continue
+        by_serial[serial][ordinal] = (row[7], row[8] or 0, row[9] or 0, row[10] or 0, row[11] or 0, row[12] or 0)
+
+    index = {}
+    for serial, days in by_serial.items():
+        ordinals = sorted(days)
+        entry = {'ordinals': ordinals}
+        for i, counter in enumerate(COUNTERS):
+            entry[counter] = [days[o][i] for o in ordinals]
+        index[serial] = entry
+    return index
+
+
+def resolve_counter(line: Dict, entry: Dict) -> str:
+    """BMS counter billed by a line - Charge Item first, Print Type as fallback"""
+    counter = None
+    if line['line_description']:
+        counter = LINE_DESC_TO_BMS.get(line['line_description'].lower())
+
+    if not counter and line['print_type']:
+        pt = line['print_type'].lower()
+        if 'a4' in pt and 'mono' in pt:
+            counter = 'black'
+        elif 'a3' in pt and 'mono' in pt:
+            counter = 'a3'
+        elif 'a4' in pt and ('col' in pt or 'clr' in pt):
+            counter = 'colour'
+        elif 'a3' in pt and ('col' in pt or 'clr' in pt):
+            counter = 'large'
+
+    # B&W machines store everything in `total` and `black` stays 0
+    if counter == 'black' and not any(entry['black']):
+        counter = 'total'
+    return counter
+
+
+def join_readings_on_or_before(ordinals: List[int], targets: List[int]) -> Dict[int, int]:
+    """Sort-merge: map each target ordinal to the position of the last reading on or before it (-1 if none)"""
+    positions = {}
+    pos = -1
+    for target in sorted(set(targets)):
+        while pos + 1 < len(ordinals) and ordinals[pos + 1] <= target:
+            pos += 1
+        positions[target] = pos
+    return positions
+
+
+def reconcile_coverage(lines: List[Dict], index: Dict) -> List[Dict]:
+    """Compute BMS movement over each billing line's coverage interval and the per-line variance"""
+    lines_by_serial = defaultdict(list)
+    for line in lines:
+        # Charge-only rows (rental/fixed) carry no print type and no volume
+        if line['print_type']:
+            lines_by_serial[line['serial']].append(line)
+
+    results = []
+    for serial in sorted(lines_by_serial):
+        serial_lines = lines_by_serial[serial]
+        entry = index.get(serial)
+
+        bounds = []
+        for line in serial_lines:
+            bounds.extend(o for o in (to_ordinal(line['coverage_from']), to_ordinal(line['coverage_to'])) if o is not None)
+        positions = join_readings_on_or_before(entry['ordinals'], bounds) if entry else {}
+
+        for line in serial_lines:
+            results.append(reconcile_line(line, entry, positions))
+
+    return results
+
+
+def reconcile_line(line: Dict, entry: Dict, positions: Dict[int, int]) -> Dict:
+    """Reconcile one billing line against the joined opening/closing BMS readings"""
+    xerox_volume = line['total_clicks']
+    if xerox_volume is None and line['current_reading'] is not None and line['previous_reading'] is not None:
+        xerox_volume = line['current_reading'] - line['previous_reading']
+
+    result = dict(line)
+    result.update({
+        'counter': None, 'opening_date': None, 'closing_date': None,
+        'opening_gap': None, 'closing_gap': None,
+        'bms_opening': None, 'bms_closing': None, 'bms_volume': None,
+        'xerox_volume': xerox_volume, 'variance': None
+    })
+
+    from_ord = to_ordinal(line['coverage_from'])
+    to_ord = to_ordinal(line['coverage_to'])
+
+    if not entry:
+        result['status'] = 'NOT IN BMS'
+        return result
+    if from_ord is None or to_ord is None:
+        result['status'] = 'NO COVERAGE'
+        return result
+
+    counter = resolve_counter(line, entry)
+    result['counter'] = counter
+    if not counter:
+        result['status'] = 'UNMAPPED'
+        return result
+
+    open_pos = positions.get(from_ord, -1)
+    close_pos = positions.get(to_ord, -1)
+    if open_pos < 0 or close_pos < 0:
+        result['status'] = 'NO BMS READING'
+        return result
+
+    ordinals = entry['ordinals']
+    values = entry[counter]
+    result.update({
+        'opening_date': date.fromordinal(ordinals[open_pos]),
+        'closing_date': date.fromordinal(ordinals[close_pos]),
+        'opening_gap': from_ord - ordinals[open_pos],
+        'closing_gap': to_ord - ordinals[close_pos],
+        'bms_opening': values[open_pos],
+        'bms_closing': values[close_pos],
+        'bms_volume': values[close_pos] - values[open_pos],
+    })
+
+    if xerox_volume is None:
+        result['status'] = 'NO XEROX VOLUME'
+    else:
+        result['variance'] = result['bms_volume'] - xerox_volume
+        result['status'] = 'MATCH' if result['variance'] == 0 else 'VARIANCE'
+    return result
+
+
+def create_coverage_recon_report(results: List[Dict], output_path: str):
+    """Write one row per Xerox billing line with the BMS movement over its coverage period"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Coverage Recon"
+
+    # Styles
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF")
+    green_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
+    red_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+    orange_fill = PatternFill(start_color="FFC000", end_color="FFC000", fill_type="solid")
+
+    headers = [
+        "Serial", "Xerox Customer", "Product", "Invoice Number", "Billing Month",
+        "Print Type", "Charge Item", "Line", "BMS Counter",
+        "Coverage From", "Coverage To", "BMS Opening Date", "BMS Closing Date",
+        "Opening Gap (Days)", "Closing Gap (Days)",
+        "",  # Spacer
+        "BMS Opening", "BMS Closing", "BMS Volume", "Xerox Volume", "Variance", "Status"
+    ]
+    ws.append(headers)
+
+    for cell in ws[1]:
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal='center', wrap_text=True)
+
+    def fmt(value):
+        return value.strftime("%Y-%m-%d") if hasattr(value, 'strftime') else value
+
+    for r in results:
+        ws.append([
+            r['serial'], r['customer'], r['product'], r['invoice_number'], r['billing_month'],
+            r['print_type'], r['line_description'], r['line_index'], r['counter'],
+            fmt(r['coverage_from']), fmt(r['coverage_to']), fmt(r['opening_date']), fmt(r['closing_date']),
+            r['opening_gap'], r['closing_gap'],
+            "",  # Spacer
+            r['bms_opening'], r['bms_closing'], r['bms_volume'], r['xerox_volume'], r['variance'], r['status']
+        ])
+
+        status_cell = ws.cell(ws.max_row, 22)
+        if r['status'] == 'MATCH':
+            status_cell.fill = green_fill
+        elif r['status'] == 'VARIANCE':
+            status_cell.fill = red_fill
+        else:
+            status_cell.fill = orange_fill
+
+    # Auto-size columns
+    for column in ws.columns:
+        max_length = 0
+        column_letter = get_column_letter(column[0].column)
+        for cell in column:
+            if cell.value is not None:
+                max_length = max(max_length, len(str(cell.value)))
+        ws.column_dimensions[column_letter].width = min(max_length + 2, 50)
+
+    ws.freeze_panes = 'A2'
+
+    wb.save(output_path)
+    matched = sum(1 for r in results if r['status'] == 'MATCH')
+    variances = sum(1 for r in results if r['status'] == 'VARIANCE')
+    print(f"✓ Coverage recon saved: {output_path}")
+    print(f"  Billing lines: {len(results)} (match: {matched}, variance: {variances})")
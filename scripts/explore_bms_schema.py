@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 """
 Explore BMS database schema - get full table structures and sample data
+
+Inspects one store database in depth. For versions, columns and indexes of
+every schema (and the query variant each gets) see schema_fingerprint.py.
 """
-import mysql.connector
+from fake_bms import bms_connector
 import json
 import os
 from dotenv import load_dotenv
@@ -37,7 +40,7 @@ def get_sample_data(cursor, query, limit=5):
 
 def main():
     print("Connecting to BMS database...")
-    conn = mysql.connector.connect(**DB_CONFIG)
+    conn = bms_connector().connect(**DB_CONFIG)
     cursor = conn.cursor()
 
     output = {
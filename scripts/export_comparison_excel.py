@@ -3,109 +3,83 @@
 Export comparison results to Excel with multiple sheets
 """
 
-import mysql.connector
 import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment
 from openpyxl.utils import get_column_letter
 from datetime import datetime
-from typing import Dict, List, Tuple
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Tuple
 from collections import defaultdict
 import os
 from pathlib import Path
-from dotenv import load_dotenv
+from balance_matching import MATCH_MODES, build_balance_index, match_balance
+from coverage_recon import load_billing_lines, build_counter_index, reconcile_coverage, create_coverage_recon_report
+from serial_keys import canonical_serial, build_serial_index, match_serials, rekey_to_target, write_unmatched_report
+from run_delta import snapshot_rows, create_delta_report
+from machine_store import MachineStore, machine_rows
+from volume_comparison import DEFAULT_ABS_TOLERANCE, DEFAULT_REL_TOLERANCE
+from company_registry import load_companies, group_by_host, load_stats, save_stats, record_run, expected_cost, schedule
+from host_concurrency import ConcurrencyController, concurrency_settings
+from preflight import run_preflight, print_preflight
+from run_manifest import RunManifest
+from webapp_publish import publish_enabled, publish_readings, writeback_enabled
+from utilization_materialize import materialize as materialize_utilization
+from meter_anomalies import rescore as rescore_anomalies
+from readings_source import readings_source, query_webapp_readings
+from xerox_ingest import billing_source, load_billing_lines_from_webapp
+
+
+def db_settings() -> Dict:
+    """Database credentials and SSH tunnel mode from .env
+
+    Read when a command actually connects, so importing this module (or running
+    report-only commands) needs neither credentials nor the MySQL connector.
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    settings = {
+        'user': os.getenv("DB_USER"),
+        'password': os.getenv("DB_PASSWORD"),
+        # SSH Tunnel Mode: Check environment variable
+        'use_ssh_tunnel': os.getenv("USE_SSH_TUNNEL", "false").lower() == "true",
+        'ssh_tunnel_port': int(os.getenv("SSH_TUNNEL_PORT", "3307")),
+    }
+
+    # Reading from the webapp mirror needs DATABASE_URL instead (see readings_source.py)
+    if readings_source() == 'bms' and (not settings['user'] or not settings['password']):
+        raise ValueError("DB_USER and DB_PASSWORD must be set in .env file")
+
+    if settings['use_ssh_tunnel']:
+        print(f"✓ SSH Tunnel mode enabled (localhost:{settings['ssh_tunnel_port']})\n")
 
-load_dotenv()
+    return settings
 
-# Database credentials
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
 
-if not DB_USER or not DB_PASSWORD:
-    raise ValueError("DB_USER and DB_PASSWORD must be set in .env file")
+def balance_match_settings() -> Tuple[str, bool]:
+    """Balance Recon matching: latest (default), nearest or bracket BMS reading vs Xerox last_date"""
+    mode = os.getenv("BALANCE_MATCH_MODE", "latest").lower()
+    interpolate = os.getenv("BALANCE_INTERPOLATE", "false").lower() == "true"
 
-# SSH Tunnel Mode: Check environment variable
-USE_SSH_TUNNEL = os.getenv("USE_SSH_TUNNEL", "false").lower() == "true"
-SSH_TUNNEL_PORT = int(os.getenv("SSH_TUNNEL_PORT", "3307"))
+    if mode not in MATCH_MODES:
+        raise ValueError(f"BALANCE_MATCH_MODE must be one of {', '.join(MATCH_MODES)}")
+    if mode == 'bracket' and not interpolate:
+        raise ValueError("BALANCE_MATCH_MODE=bracket needs BALANCE_INTERPOLATE=true (or use nearest)")
+    return mode, interpolate
 
-if USE_SSH_TUNNEL:
-    print(f"✓ SSH Tunnel mode enabled (localhost:{SSH_TUNNEL_PORT})\n")
 
 # Helper function to get connection host/port
-def get_connection(host, port=3306):
+def get_connection(host, port, settings):
     """Return connection details - localhost if SSH tunnel mode, otherwise original"""
-    if USE_SSH_TUNNEL:
+    if settings['use_ssh_tunnel']:
         # In SSH tunnel mode, ALL connections go through the tunnel to localhost
         # The jump server (172.20.246.163) can reach all database servers
-        return ("localhost", SSH_TUNNEL_PORT)
+        return ("localhost", settings['ssh_tunnel_port'])
     return (host, port)
 
-# Companies list (excluding braamfonteinbms2)
-COMPANIES = [
-    {"schema": "corporateprintbms2", "name": "Jetline Corporate", "host": get_connection("172.20.251.127")[0], "port": get_connection("172.20.251.127")[1]},
-    {"schema": "burlingtonbms2", "name": "Burlington", "host": get_connection("172.20.251.127")[0], "port": get_connection("172.20.251.127")[1]},
-    {"schema": "typoprintingbms2", "name": "Typo", "host": get_connection("172.20.251.127")[0], "port": get_connection("172.20.251.127")[1]},
-    {"schema": "anglobms2", "name": "Anglo", "host": get_connection("172.20.251.127")[0], "port": get_connection("172.20.251.127")[1]},
-    {"schema": "formattsolutionsbms2", "name": "Formatt", "host": get_connection("172.20.251.127")[0], "port": get_connection("172.20.251.127")[1]},
-    {"schema": "landkbms2", "name": "L and K", "host": get_connection("172.20.251.127")[0], "port": get_connection("172.20.251.127")[1]},
-    {"schema": "marinsbms2", "name": "Marins", "host": get_connection("172.20.251.127")[0], "port": get_connection("172.20.251.127")[1]},
-    {"schema": "25amcpsbms2", "name": "Corporate Print 25AM", "host": get_connection("172.20.251.127")[0], "port": get_connection("172.20.251.127")[1]},
-    {"schema": "masterskillbms2", "name": "Masterskill", "host": get_connection("172.20.251.127")[0], "port": get_connection("172.20.251.127")[1]},
-    {"schema": "nscbms2", "name": "Fixtrade", "host": get_connection("172.20.251.127")[0], "port": get_connection("172.20.251.127")[1]},
-    {"schema": "pocketmediabms2", "name": "Pocket Media", "host": get_connection("172.20.251.127")[0], "port": get_connection("172.20.251.127")[1]},
-    {"schema": "raptorbms2", "name": "Raptor", "host": get_connection("172.20.251.127")[0], "port": get_connection("172.20.251.127")[1]},
-    {"schema": "systemprintbms2", "name": "SystemPrint", "host": get_connection("172.20.251.127")[0], "port": get_connection("172.20.251.127")[1]},
-    {"schema": "firstlabelsbms2", "name": "First Labels", "host": get_connection("172.20.251.127")[0], "port": get_connection("172.20.251.127")[1]},
-    {"schema": "welkombms2", "name": "Welkom", "host": get_connection("172.20.251.127")[0], "port": get_connection("172.20.251.127")[1]},
-    {"schema": "witbankbms2", "name": "Witbank", "host": get_connection("172.20.251.127")[0], "port": get_connection("172.20.251.127")[1]},
-    {"schema": "gardensbms2", "name": "Gardens", "host": get_connection("wizardzgardens.jetlinestores.co.za")[0], "port": get_connection("wizardzgardens.jetlinestores.co.za")[1]},
-    {"schema": "printoutsolutionsbms2", "name": "PrintOut", "host": get_connection("172.20.251.127")[0], "port": get_connection("172.20.251.127")[1]},
-    {"schema": "waterfrontbms2", "name": "Waterfront", "host": get_connection("wizardzwaterfront.jetlinestores.co.za")[0], "port": get_connection("wizardzwaterfront.jetlinestores.co.za")[1]},
-    {"schema": "centurycitybms2", "name": "Century City", "host": get_connection("centurycity.jetlinestores.co.za")[0], "port": get_connection("centurycity.jetlinestores.co.za")[1]},
-    {"schema": "albertonbms2", "name": "Alberton", "host": get_connection("alberton.jetlinestores.co.za")[0], "port": get_connection("alberton.jetlinestores.co.za")[1]},
-    {"schema": "bedfordviewbms2", "name": "Bedfordview", "host": get_connection("bedfordview.jetlinestores.co.za")[0], "port": get_connection("bedfordview.jetlinestores.co.za")[1]},
-    {"schema": "blackheathbms2", "name": "Blackheath", "host": get_connection("blackheath.jetlinestores.co.za")[0], "port": get_connection("blackheath.jetlinestores.co.za")[1]},
-    {"schema": "boksburgbms2", "name": "Boksburg", "host": get_connection("boksburg.jetlinestores.co.za")[0], "port": get_connection("boksburg.jetlinestores.co.za")[1]},
-    {"schema": "benonibms2", "name": "Benoni", "host": get_connection("benoni.jetlinestores.co.za")[0], "port": get_connection("benoni.jetlinestores.co.za")[1]},
-    {"schema": "bryanstonbms2", "name": "Bryanston", "host": get_connection("bryanston.jetlinestores.co.za")[0], "port": get_connection("bryanston.jetlinestores.co.za")[1]},
-    {"schema": "durbanbms2", "name": "Durban", "host": get_connection("durban.jetlinestores.co.za")[0], "port": get_connection("durban.jetlinestores.co.za")[1]},
-    {"schema": "foxstreetbms2", "name": "Foxstreet", "host": get_connection("foxstreet.jetlinestores.co.za")[0], "port": get_connection("foxstreet.jetlinestores.co.za")[1]},
-    {"schema": "parktowncorporateprintbms2", "name": "Hillcrestcps", "host": get_connection("parktown.jetlinestores.co.za")[0], "port": get_connection("parktown.jetlinestores.co.za")[1]},
-    {"schema": "hillcrestbms2", "name": "Hillcrest", "host": get_connection("hillcrest.jetlinestores.co.za")[0], "port": get_connection("hillcrest.jetlinestores.co.za")[1]},
-    {"schema": "kyalamibms2", "name": "Kyalami", "host": get_connection("kyalami.jetlinestores.co.za")[0], "port": get_connection("kyalami.jetlinestores.co.za")[1]},
-    {"schema": "melrosebms2", "name": "Melrose", "host": get_connection("melrose.jetlinestores.co.za")[0], "port": get_connection("melrose.jetlinestores.co.za")[1]},
-    {"schema": "menlynbms2", "name": "Menlyn", "host": get_connection("menlyn.jetlinestores.co.za")[0], "port": get_connection("menlyn.jetlinestores.co.za")[1]},
-    {"schema": "parktownbms2", "name": "Parktown", "host": get_connection("parktown.jetlinestores.co.za")[0], "port": get_connection("parktown.jetlinestores.co.za")[1]},
-    {"schema": "pietermaritzburgbms2", "name": "Pietermaritzburg", "host": get_connection("pietermaritzburg.jetlinestores.co.za")[0], "port": get_connection("pietermaritzburg.jetlinestores.co.za")[1]},
-    {"schema": "sunninghillbms2", "name": "Sunninghill", "host": get_connection("sunninghill.jetlinestores.co.za")[0], "port": get_connection("sunninghill.jetlinestores.co.za")[1]},
-    {"schema": "polokwanebms2", "name": "Polokwane", "host": get_connection("polokwane.jetlinestores.co.za")[0], "port": get_connection("polokwane.jetlinestores.co.za")[1]},
-    {"schema": "rivoniabms2", "name": "Rivonia", "host": get_connection("rivonia.jetlinestores.co.za")[0], "port": get_connection("rivonia.jetlinestores.co.za")[1]},
-    {"schema": "rosebankbms2", "name": "Rosebank", "host": get_connection("rosebank.jetlinestores.co.za")[0], "port": get_connection("rosebank.jetlinestores.co.za")[1]},
-    {"schema": "rustenburgbms2", "name": "Rustenburg", "host": get_connection("rustenburg.jetlinestores.co.za")[0], "port": get_connection("rustenburg.jetlinestores.co.za")[1]},
-    {"schema": "sandownbms2", "name": "Sandown", "host": get_connection("sandown.jetlinestores.co.za")[0], "port": get_connection("sandown.jetlinestores.co.za")[1]},
-    {"schema": "illovobms2", "name": "Illovo", "host": get_connection("illovo.jetlinestores.co.za")[0], "port": get_connection("illovo.jetlinestores.co.za")[1]},
-    {"schema": "montanabms2", "name": "Montana", "host": get_connection("montana.jetlinestores.co.za")[0], "port": get_connection("montana.jetlinestores.co.za")[1]},
-    {"schema": "brooklynbms2", "name": "Brooklyn", "host": get_connection("brooklyn.jetlinestores.co.za")[0], "port": get_connection("brooklyn.jetlinestores.co.za")[1]},
-    {"schema": "potchbms2", "name": "Potchefstroom", "host": get_connection("potchefstroom.jetlinestores.co.za")[0], "port": get_connection("potchefstroom.jetlinestores.co.za")[1]},
-    {"schema": "woodmeadbms2", "name": "Woodmead", "host": get_connection("woodmead.jetlinestores.co.za")[0], "port": get_connection("woodmead.jetlinestores.co.za")[1]},
-    {"schema": "georgebms2", "name": "George", "host": get_connection("george.jetlinestores.co.za")[0], "port": get_connection("george.jetlinestores.co.za")[1]},
-    {"schema": "modderfonteinbms2", "name": "Modderfontein", "host": get_connection("modderfontein.jetlinestores.co.za")[0], "port": get_connection("modderfontein.jetlinestores.co.za")[1]},
-    {"schema": "vaalreefsbms2", "name": "Vaalreefs", "host": get_connection("vaalreefs.jetlinestores.co.za")[0], "port": get_connection("vaalreefs.jetlinestores.co.za")[1]},
-    {"schema": "klerksdorpbms2", "name": "Klerksdorp", "host": get_connection("klerksdorp.jetlinestores.co.za")[0], "port": get_connection("klerksdorp.jetlinestores.co.za")[1]},
-    {"schema": "greenpointbms2", "name": "Greenpoint", "host": get_connection("greenpoint.jetlinestores.co.za")[0], "port": get_connection("greenpoint.jetlinestores.co.za")[1]},
-    {"schema": "randburgbms2", "name": "Randburg", "host": get_connection("randburg.jetlinestores.co.za")[0], "port": get_connection("randburg.jetlinestores.co.za")[1]},
-    {"schema": "hydeparkbms2", "name": "Hydepark", "host": get_connection("hydepark.jetlinestores.co.za")[0], "port": get_connection("hydepark.jetlinestores.co.za")[1]},
-    {"schema": "fourwaysbms2", "name": "Fourways", "host": get_connection("fourways.jetlinestores.co.za")[0], "port": get_connection("fourways.jetlinestores.co.za")[1]},
-    {"schema": "centurionbms2", "name": "Centurion", "host": get_connection("centurion.jetlinestores.co.za")[0], "port": get_connection("centurion.jetlinestores.co.za")[1]},
-    {"schema": "nelspruitbms2", "name": "Nelspruit", "host": get_connection("nelspruit.jetlinestores.co.za")[0], "port": get_connection("nelspruit.jetlinestores.co.za")[1]},
-    {"schema": "witsbms2", "name": "Wits", "host": get_connection("wits.jetlinestores.co.za")[0], "port": get_connection("wits.jetlinestores.co.za")[1]},
-    {"schema": "constantiabms2", "name": "Constantia", "host": get_connection("constantia.jetlinestores.co.za")[0], "port": get_connection("constantia.jetlinestores.co.za")[1]},
-    {"schema": "stellenboschbms2", "name": "Stellenbosch", "host": get_connection("stellenbosch.jetlinestores.co.za")[0], "port": get_connection("stellenbosch.jetlinestores.co.za")[1]},
-    {"schema": "tygervalleybms2", "name": "Tygervalley", "host": get_connection("tygervalley.jetlinestores.co.za")[0], "port": get_connection("tygervalley.jetlinestores.co.za")[1]},
-    {"schema": "midrandbms2", "name": "Midrand", "host": get_connection("midrand.jetlinestores.co.za")[0], "port": get_connection("midrand.jetlinestores.co.za")[1]},
-    {"schema": "mmabathobms2", "name": "Mmabatho", "host": get_connection("mmabatho.jetlinestores.co.za")[0], "port": get_connection("mmabatho.jetlinestores.co.za")[1]},
-    {"schema": "ballitobms2", "name": "Ballito", "host": get_connection("ballito.jetlinestores.co.za")[0], "port": get_connection("ballito.jetlinestores.co.za")[1]}
-]
-
 QUERY = """
 SELECT
     ma.serialnumber,
@@ -161,7 +135,7 @@ def load_device_meters(filepath: str) -> Dict:
     for row_num in range(2, ws.max_row + 1):
         company = ws.cell(row_num, 1).value
         product = ws.cell(row_num, 2).value
-        serial = str(ws.cell(row_num, 3).value).strip() if ws.cell(row_num, 3).value else None
+        serial = canonical_serial(ws.cell(row_num, 3).value)
         meter_desc = ws.cell(row_num, 4).value
         reading = ws.cell(row_num, 5).value
         last_date = ws.cell(row_num, 6).value
@@ -221,8 +195,9 @@ def load_excel_data(filepath: str) -> Dict:
 
     for row in ws.iter_rows(min_row=2, values_only=True):
         customer, model, serial, month_year, a3_mono, a4_mono, a3_color, a4_color, total = row
+        serial = canonical_serial(serial)
         if serial and month_year in allowed_months:
-            data[str(serial)][month_year] = {
+            data[serial][month_year] = {
                 'customer': customer,
                 'a3_mono': a3_mono or 0,
                 'a4_mono': a4_mono or 0,
@@ -234,157 +209,474 @@ def load_excel_data(filepath: str) -> Dict:
     return data
 
 
-def calculate_incremental_volumes(raw_data: List[Tuple]) -> Dict:
-    """
-    Convert cumulative to incremental with sub-meters - matches Qlik logic
-    Takes last reading per date (FirstSortedValue), then calculates monthly movement
-    Process ALL historical data but only return 2025 months for reporting
-    """
-    from collections import OrderedDict
-
-    # Only report these months (but calculate from beginning of time)
-    report_months = {'Mar-2025', 'Apr-2025', 'May-2025', 'Jun-2025',
-                     'Jul-2025', 'Aug-2025', 'Sep-2025', 'Nov-2025'}
+def volume_sort_budget_mb() -> float:
+    """External-sort memory budget for the volume calculation (VOLUME_SORT_BUDGET_MB, unset: in memory)"""
+    budget = os.getenv("VOLUME_SORT_BUDGET_MB")
+    return float(budget) if budget else None
+
+
+def daily_reading(latest: Tuple) -> Dict:
+    """Reading dict from (date_time, total, a3, black, large, colour, extralarge, model, company, meterreading_id)"""
+    return {
+        'total': latest[1],
+        'a3': latest[2],
+        'black': latest[3],
+        'large': latest[4],
+        'colour': latest[5],
+        'extralarge': latest[6],
+        'model': latest[7],
+        'company': latest[8],
+        'meterreading_id': latest[9]
+    }
 
-    # Step 1: Group by serial+date, take LAST reading per date (by createdtime)
-    by_serial_date = defaultdict(lambda: defaultdict(list))
 
+def reading_entries(raw_data: Iterable[Tuple]) -> Iterator[Tuple[str, str, Tuple]]:
+    """(canonical serial, YYYY-MM-DD, reading) for every usable raw row, in input order"""
     # raw_data structure: (serial, model, status, date, category, install_date, date_time, total, a3, black, large, colour, extralarge, meterreading_id, meterreading_no, company)
     for serial, model, status, date, category, install_date, date_time, total, a3, black, large, colour, extralarge, meterreading_id, meterreading_no, company in raw_data:
         if serial and date and total is not None:
-            date_key = date.strftime("%Y-%m-%d")
-            by_serial_date[str(serial)][date_key].append((
+            yield canonical_serial(serial), date.strftime("%Y-%m-%d"), (
                 date_time, total, a3 or 0, black or 0, large or 0, colour or 0, extralarge or 0, model, company, meterreading_id
-            ))
+            )
+
+
+def memory_daily_readings(raw_data: Iterable[Tuple]) -> Iterator[Tuple[str, List[Tuple[str, Dict]]]]:
+    """(serial, [(date, reading)] oldest first), grouping every reading in memory"""
+    # Step 1: Group by serial+date, take LAST reading per date (by createdtime)
+    by_serial_date = defaultdict(lambda: defaultdict(list))
+    for serial, date_key, entry in reading_entries(raw_data):
+        by_serial_date[serial][date_key].append(entry)
 
     # Step 2: Get latest reading per date
-    daily_readings = defaultdict(dict)
     for serial, dates in by_serial_date.items():
+        daily = []
         for date_key, readings in dates.items():
             # Sort by datetime desc, take first (latest)
             readings.sort(key=lambda x: x[0] if x[0] else datetime.min, reverse=True)
-            latest = readings[0]
-            daily_readings[serial][date_key] = {
-                'total': latest[1],
-                'a3': latest[2],
-                'black': latest[3],
-                'large': latest[4],
-                'colour': latest[5],
-                'extralarge': latest[6],
-                'model': latest[7],
-                'company': latest[8],
-                'meterreading_id': latest[9]
-            }
+            daily.append((date_key, daily_reading(readings[0])))
+        daily.sort(key=lambda x: x[0])
+        yield serial, daily
+
+
+def external_daily_readings(raw_data: Iterable[Tuple], budget_mb: float) -> Iterator[Tuple[str, List[Tuple[str, Dict]]]]:
+    """Same as memory_daily_readings, holding at most budget_mb of readings at a time
+
+    Readings are sorted by (serial, date, createdtime) through temporary files
+    (external_sort.py) and reduced in one streaming pass: only one serial's
+    days are in memory. Equal createdtimes keep the first reading in input
+    order, as the in-memory sort does.
+    """
+    from itertools import groupby
+    from external_sort import external_sorted, rows_for_budget
+
+    records = ((serial, date_key, entry[0] or datetime.min, -seq, entry)
+               for seq, (serial, date_key, entry) in enumerate(reading_entries(raw_data)))
+    merged = external_sorted(records, rows_for_budget(budget_mb))
+    for serial, serial_records in groupby(merged, key=lambda r: r[0]):
+        daily = []
+        for date_key, day_records in groupby(serial_records, key=lambda r: r[1]):
+            for latest in day_records:
+                pass
+            daily.append((date_key, daily_reading(latest[4])))
+        yield serial, daily
+
+
+def serial_monthly_volumes(daily: List[Tuple[str, Dict]], report_months: set) -> Dict[str, Dict]:
+    """{report month: volumes} for one serial from its daily readings (oldest first)"""
+    from collections import OrderedDict
 
     # Step 3: Group by month, take last day's reading of month
+    monthly_readings = OrderedDict()
+    for date_str, reading in daily:
+        date_obj = datetime.strptime(date_str, "%Y-%m-%d")
+        month_year = date_obj.strftime("%b-%Y")
+        # Take latest day in month
+        monthly_readings[month_year] = reading
+
+    # Step 4: Calculate incremental movement from ALL history, but only store 2025 months
+    # Get list of months to iterate with next month lookup
+    month_list = list(monthly_readings.keys())
+    volumes = {}
+
+    for i, month_year in enumerate(month_list):
+        reading = monthly_readings[month_year]
+
+        # Get previous month's reading for baseline
+        if i > 0:
+            prev_reading = monthly_readings[month_list[i-1]]
+            prev_total = prev_reading['total']
+            prev_a3 = prev_reading['a3']
+            prev_black = prev_reading['black']
+            prev_large = prev_reading['large']
+            prev_colour = prev_reading['colour']
+            prev_extralarge = prev_reading['extralarge']
+        else:
+            prev_total = 0
+            prev_a3 = 0
+            prev_black = 0
+            prev_large = 0
+            prev_colour = 0
+            prev_extralarge = 0
+
+        cumulative = reading['total']
+        incremental = cumulative - prev_total
+
+        incr_a3 = reading['a3'] - prev_a3
+        incr_black = reading['black'] - prev_black
+        incr_large = reading['large'] - prev_large
+        incr_colour = reading['colour'] - prev_colour
+        incr_extralarge = reading['extralarge'] - prev_extralarge
+
+        # Calculate total from sum of sub-meters
+        incr_total_from_subs = incr_a3 + incr_black + incr_large + incr_colour + incr_extralarge
+
+        # Shift to next month to match Xerox reporting (they report on first day of next month)
+        # Get next month for reporting
+        if i + 1 < len(month_list):
+            report_as_month = month_list[i + 1]
+        else:
+            report_as_month = None
+
+        # Only store if the NEXT month is in our report range
+        if incremental >= 0 and report_as_month and report_as_month in report_months:
+            volumes[report_as_month] = {
+                'volume': incr_total_from_subs,  # Use sum of sub-meters
+                'a3': incr_a3,
+                'black': incr_black,
+                'large': incr_large,
+                'colour': incr_colour,
+                'extralarge': incr_extralarge,
+                'model': reading['model'],
+                'company': reading['company'],
+                'cumulative': cumulative,
+                'meterreading_id': reading.get('meterreading_id')
+            }
+
+    return volumes
+
+
+def volume_workers() -> int:
+    """Worker processes for the volume calculation (VOLUME_WORKERS, default 1: in this process)"""
+    return max(1, int(os.getenv("VOLUME_WORKERS", "1")))
+
+
+def serial_shard(serial: str, shards: int) -> int:
+    """Stable shard for a serial (crc32 of its canonical form - hash() differs per process)"""
+    return zlib.crc32(canonical_serial(serial).encode()) % shards if serial else 0
+
+
+def _volume_shard(path: str, budget_mb: float) -> Dict[str, Dict]:
+    """Worker: volumes for the raw rows in one shard file, as plain dicts (the nested defaultdicts don't pickle)"""
+    from external_sort import read_run
+
+    volumes = calculate_incremental_volumes(read_run(path), budget_mb, workers=1)
+    return {serial: dict(months) for serial, months in volumes.items()}
+
+
+def sharded_incremental_volumes(raw_data: Iterable[Tuple], workers: int, budget_mb: float = None) -> Dict:
+    """calculate_incremental_volumes across worker processes, sharded by serial
+
+    Every reading of a serial lands in the same shard, so shards never
+    overlap and the merge is a union. Rows are streamed to one temporary file
+    per shard, BATCH_ROWS at a time, and each worker reads its own file - the
+    parent holds neither the shards nor pickles them to the workers. Serials
+    come back in the order they first appear in raw_data, as they do from the
+    in-process calculation. A memory budget is split between the workers.
+    """
+    import pickle
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+    from external_sort import BATCH_ROWS
+
+    first_seen = {}
+    shard_budget = budget_mb / workers if budget_mb else None
+    with tempfile.TemporaryDirectory(prefix="jetline_shards_") as directory:
+        paths = [os.path.join(directory, f"shard_{i}.pickle") for i in range(workers)]
+        batches = [[] for _ in range(workers)]
+        files = [open(path, 'wb') for path in paths]
+        try:
+            for row in raw_data:
+                # Rows reading_entries() would skip don't order the output
+                if row[0] and row[3] and row[7] is not None:
+                    first_seen.setdefault(canonical_serial(row[0]), len(first_seen))
+                shard = serial_shard(row[0], workers)
+                batches[shard].append(row)
+                if len(batches[shard]) >= BATCH_ROWS:
+                    pickle.dump(batches[shard], files[shard], protocol=pickle.HIGHEST_PROTOCOL)
+                    batches[shard] = []
+            for f, batch in zip(files, batches):
+                if batch:
+                    pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            for f in files:
+                f.close()
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            shard_results = list(pool.map(_volume_shard, paths, [shard_budget] * workers))
+
+    merged = {}
+    for shard_result in shard_results:
+        merged.update(shard_result)
     result = defaultdict(lambda: defaultdict(dict))
+    for serial in sorted(merged, key=first_seen.__getitem__):
+        result[serial].update(merged[serial])
+    return result
 
-    for serial, dates in daily_readings.items():
-        sorted_dates = sorted(dates.items(), key=lambda x: x[0])
-        monthly_readings = OrderedDict()
-
-        for date_str, reading in sorted_dates:
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-            month_year = date_obj.strftime("%b-%Y")
-            # Take latest day in month
-            monthly_readings[month_year] = reading
-
-        # Step 4: Calculate incremental movement from ALL history, but only store 2025 months
-        # Get list of months to iterate with next month lookup
-        month_list = list(monthly_readings.keys())
-
-        for i, month_year in enumerate(month_list):
-            reading = monthly_readings[month_year]
-
-            # Get previous month's reading for baseline
-            if i > 0:
-                prev_reading = monthly_readings[month_list[i-1]]
-                prev_total = prev_reading['total']
-                prev_a3 = prev_reading['a3']
-                prev_black = prev_reading['black']
-                prev_large = prev_reading['large']
-                prev_colour = prev_reading['colour']
-                prev_extralarge = prev_reading['extralarge']
-            else:
-                prev_total = 0
-                prev_a3 = 0
-                prev_black = 0
-                prev_large = 0
-                prev_colour = 0
-                prev_extralarge = 0
-
-            cumulative = reading['total']
-            incremental = cumulative - prev_total
-
-            incr_a3 = reading['a3'] - prev_a3
-            incr_black = reading['black'] - prev_black
-            incr_large = reading['large'] - prev_large
-            incr_colour = reading['colour'] - prev_colour
-            incr_extralarge = reading['extralarge'] - prev_extralarge
-
-            # Calculate total from sum of sub-meters
-            incr_total_from_subs = incr_a3 + incr_black + incr_large + incr_colour + incr_extralarge
-
-            # Shift to next month to match Xerox reporting (they report on first day of next month)
-            # Get next month for reporting
-            if i + 1 < len(month_list):
-                report_as_month = month_list[i + 1]
-            else:
-                report_as_month = None
-
-            # Only store if the NEXT month is in our report range
-            if incremental >= 0 and report_as_month and report_as_month in report_months:
-                result[serial][report_as_month] = {
-                    'volume': incr_total_from_subs,  # Use sum of sub-meters
-                    'a3': incr_a3,
-                    'black': incr_black,
-                    'large': incr_large,
-                    'colour': incr_colour,
-                    'extralarge': incr_extralarge,
-                    'model': reading['model'],
-                    'company': reading['company'],
-                    'cumulative': cumulative,
-                    'meterreading_id': reading.get('meterreading_id')
-                }
+
+def calculate_incremental_volumes(raw_data: Iterable[Tuple], budget_mb: float = None, workers: int = None) -> Dict:
+    """
+    Convert cumulative to incremental with sub-meters - matches Qlik logic
+    Takes last reading per date (FirstSortedValue), then calculates monthly movement
+    Process ALL historical data but only return 2025 months for reporting
+
+    With a memory budget (budget_mb, else VOLUME_SORT_BUDGET_MB) readings are
+    grouped through an external sort instead of in memory - same result, for
+    histories too long for the jump server. With more than one worker (workers,
+    else VOLUME_WORKERS) serials are sharded across processes.
+    """
+    # Only report these months (but calculate from beginning of time)
+    report_months = {'Mar-2025', 'Apr-2025', 'May-2025', 'Jun-2025',
+                     'Jul-2025', 'Aug-2025', 'Sep-2025', 'Nov-2025'}
+
+    budget_mb = budget_mb if budget_mb is not None else volume_sort_budget_mb()
+    workers = workers or volume_workers()
+    if workers > 1:
+        return sharded_incremental_volumes(raw_data, workers, budget_mb)
+    if budget_mb:
+        daily_readings = external_daily_readings(raw_data, budget_mb)
+    else:
+        daily_readings = memory_daily_readings(raw_data)
+
+    result = defaultdict(lambda: defaultdict(dict))
+    for serial, daily in daily_readings:
+        volumes = serial_monthly_volumes(daily, report_months)
+        if volumes:
+            result[serial].update(volumes)
 
     return result
 
 
-def query_all_databases() -> List[Tuple]:
-    """Query all databases"""
-    all_results = []
-    print("Querying databases...")
+def session_bytes_sent(cursor) -> int:
+    """Bytes the server has sent on this connection so far"""
+    cursor.execute("SHOW SESSION STATUS LIKE 'Bytes_sent'")
+    return int(cursor.fetchone()[1])
+
+
+def query_all_databases(settings: Dict = None, stats_path: Path = None, preflight: Dict = None,
+                        manifest: RunManifest = None) -> List[Tuple]:
+    """Query all databases
+
+    Companies are queried concurrently, largest first (by previous runs in
+    stats_path), with the number of in-flight queries per host adapted to how
+    the host is coping (see host_concurrency.py). Connections are pooled per
+    host and switch schema instead of reconnecting. Results are returned in
+    registry order regardless of the query order.
 
-    for i, company in enumerate(COMPANIES, 1):
-        print(f"[{i}/{len(COMPANIES)}] {company['name']}...", end=" ")
+    With pre-flight probe results, schemas that were down are skipped and
+    never-measured companies are ordered by their estimated size. With a run
+    manifest, each company's time, rows and bytes received are recorded.
+    """
+    from fake_bms import bms_connector
+
+    settings = settings or db_settings()
+    companies = load_companies()
+    stats = load_stats(stats_path) if stats_path else {}
+    size_hints = {}
+    if preflight:
+        down = [c for c in companies if preflight.get(c['schema'], {}).get('status') == 'DOWN']
+        for company in down:
+            print(f"  Skipping {company['name']} ({company['schema']}) - down in pre-flight")
+        companies = [c for c in companies if c not in down]
+        size_hints = {schema: probe['est_rows'] for schema, probe in preflight.items()}
+    controller = ConcurrencyController()
+    hosts = group_by_host(companies)
+
+    results_by_schema = {}
+    idle_connections = defaultdict(list)  # {(host, port): [connection]}
+    lock = threading.Lock()
+    done = [0]
+    print(f"Querying databases ({len(hosts)} hosts, up to {controller.settings['max_per_host']} queries per host)...")
+
+    def query_company(company):
+        key = (company['host'], company['port'])
+        limiter = controller.limiter(company['host'])
+        expected = expected_cost(stats, company['schema'])
+        limiter.acquire()
+        start = time.time()
+        conn = None
+        error = None
+        results = []
+        bytes_received = None
         try:
-            conn = mysql.connector.connect(
-                host=company["host"],
-                port=company["port"],
-                user=DB_USER,
-                password=DB_PASSWORD,
-                database=company["schema"],
-                connect_timeout=10,
-                charset='utf8mb4',
-                collation='utf8mb4_general_ci'  # Use older collation compatible with all MySQL versions
-            )
+            with lock:
+                conn = idle_connections[key].pop() if idle_connections[key] else None
+            if conn is None or not conn.is_connected():
+                host, port = get_connection(company['host'], company['port'], settings)
+                conn = bms_connector().connect(
+                    host=host,
+                    port=port,
+                    user=settings['user'],
+                    password=settings['password'],
+                    database=company["schema"],
+                    connect_timeout=10,
+                    charset='utf8mb4',
+                    collation='utf8mb4_general_ci'  # Use older collation compatible with all MySQL versions
+                )
+            else:
+                conn.database = company["schema"]
             cursor = conn.cursor()
+            sent_before = session_bytes_sent(cursor) if manifest else None
             cursor.execute(QUERY)
             results = cursor.fetchall()
+            if manifest:
+                bytes_received = session_bytes_sent(cursor) - sent_before
             cursor.close()
+            with lock:
+                idle_connections[key].append(conn)
+        except Exception as e:
+            error = str(e)
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        seconds = time.time() - start
+        limiter.release(seconds, expected['seconds'] if expected else None, error is None)
+
+        with lock:
+            done[0] += 1
+            record_run(stats, company['schema'], len(results), seconds, error)
+            if manifest:
+                manifest.company(company['schema'], company['name'], company['host'],
+                                 len(results), seconds, bytes_received, error)
+            if error:
+                print(f"[{done[0]}/{len(companies)}] {company['name']}... ✗ {error[:50]}")
+            else:
+                # Canonical serial up front so every downstream join uses the same key
+                results_by_schema[company['schema']] = [
+                    (canonical_serial(row[0]), *row[1:], company['name']) for row in results
+                ]
+                print(f"[{done[0]}/{len(companies)}] {company['name']}... ✓ {len(results)} rows "
+                      f"({seconds:.1f}s, {company['host']} limit {int(limiter.limit)})")
+
+    with ThreadPoolExecutor(max_workers=controller.max_workers(len(hosts), len(companies))) as executor:
+        list(executor.map(query_company, schedule(companies, stats, size_hints)))
+
+    for connections in idle_connections.values():
+        for conn in connections:
             conn.close()
 
-            for row in results:
-                all_results.append((*row, company['name']))
-            print(f"✓ {len(results)} rows")
-        except Exception as e:
-            print(f"✗ {str(e)[:50]}")
+    print("\nHost concurrency:")
+    controller.print_summary()
 
+    if stats_path:
+        save_stats(stats, stats_path)
+
+    all_results = []
+    for company in companies:
+        all_results.extend(results_by_schema.get(company['schema'], []))
     return all_results
 
 
-def create_excel_report(excel_data: Dict, db_data: Dict, raw_results: List[Tuple], device_meters: Dict, output_path: str):
-    """Create Excel report - only serials in both systems"""
+VOLUME_COMPARISON_HEADERS = [
+    "Serial", "Model", "BMS Company", "Xerox Customer", "Month",
+    "", # Spacer
+    "BMS A3", "BMS Black", "BMS Large", "BMS Colour", "BMS XL", "BMS Total",
+    "", # Spacer
+    "Xerox A3 Mono", "Xerox A4 Mono", "Xerox A3 Color", "Xerox A4 Color", "Xerox Total",
+    "", # Spacer
+    "Difference", "BMS Balance"
+]
+
+BALANCE_RECON_HEADERS = [
+    "Serial", "Xerox Company", "Xerox Product", "BMS Company", "BMS Model",
+    "Xerox Date", "BMS Date", "Gap (Days)", "Match Method",
+    "",  # Spacer
+    "Xerox Total", "BMS Balance", "Difference",
+    "Calc Method", "Status"
+]
+
+
+def build_balance_recon_rows(device_meters: Dict, raw_results: List[Tuple]) -> List[List]:
+    """Build Balance Recon rows - Xerox Total vs BMS Balance field
+
+    The BMS reading compared is chosen by BALANCE_MATCH_MODE: the latest reading,
+    or the reading nearest to the Xerox last_date, or interpolated between the readings bracketing it.
+    Only serials that exist in BMS are included.
+    """
+    match_mode, interpolate = balance_match_settings()
+    bms_index = build_balance_index(raw_results)
+    rows = []
+
+    for serial in sorted(device_meters.keys()):
+        if serial not in bms_index:
+            continue
+
+        xerox_info = device_meters[serial]
+        xerox_date = xerox_info['last_date']
+
+        if not xerox_date:
+            continue
+
+        xerox_date_str = xerox_date.strftime("%Y-%m-%d") if hasattr(xerox_date, 'strftime') else str(xerox_date)[:10]
+
+        match = match_balance(bms_index[serial], xerox_date, match_mode, interpolate)
+        if not match:
+            continue
+
+        if 'bracket' in match:
+            before, after = match['bracket']
+            bms_date_used = f"{before:%Y-%m-%d} / {after:%Y-%m-%d}"
+        else:
+            bms_date_used = match['date'].strftime("%Y-%m-%d")
+
+        xerox_total = xerox_info.get('total', 0) or 0
+        bms_balance = match['balance'] or 0
+        calc_method = xerox_info.get('calc_method', 'Unknown')
+
+        difference = xerox_total - bms_balance
+
+        if calc_method == 'NO DATA':
+            status = "NO XEROX DATA"
+        elif difference == 0:
+            status = "BALANCED"
+        else:
+            status = "VARIANCE"
+
+        rows.append([
+            serial, xerox_info.get('company', 'N/A'), xerox_info.get('product', 'N/A'),
+            match['company'], match['model'],
+            xerox_date_str, bms_date_used, match['gap_days'], match['method'],
+            "",  # Spacer
+            xerox_total, bms_balance, difference,
+            calc_method, status
+        ])
+
+    return rows
+
+
+def style_balance_recon_row(ws, row_num: int, green_fill: PatternFill, red_fill: PatternFill):
+    """Highlight the Difference and Status cells of a Balance Recon row"""
+    diff_cell = ws.cell(row_num, 13)
+    if diff_cell.value and diff_cell.value != 0:
+        diff_cell.fill = red_fill
+    elif diff_cell.value == 0:
+        diff_cell.fill = green_fill
+
+    status_cell = ws.cell(row_num, 15)
+    if status_cell.value == "BALANCED":
+        status_cell.fill = green_fill
+    elif status_cell.value == "VARIANCE":
+        status_cell.fill = red_fill
+    elif status_cell.value == "NO XEROX DATA":
+        status_cell.fill = PatternFill(start_color="FFC000", end_color="FFC000", fill_type="solid")  # Orange
+
+
+def create_excel_report(excel_data: Dict, db_data: Dict, raw_results: List[Tuple], device_meters: Dict, output_path: str) -> List[List]:
+    """Create Excel report - only serials in both systems
+
+    Returns the Volume Comparison rows (VOLUME_COMPARISON_HEADERS order) for the run delta.
+    """
     wb = openpyxl.Workbook()
     wb.remove(wb.active)
 
@@ -405,16 +697,7 @@ def create_excel_report(excel_data: Dict, db_data: Dict, raw_results: List[Tuple
     total_header_fill = PatternFill(start_color="F4B084", end_color="F4B084", fill_type="solid")
     total_header_font = Font(bold=True, color="FFFFFF")
 
-    headers = [
-        "Serial", "Model", "BMS Company", "Xerox Customer", "Month",
-        "", # Spacer
-        "BMS A3", "BMS Black", "BMS Large", "BMS Colour", "BMS XL", "BMS Total",
-        "", # Spacer
-        "Xerox A3 Mono", "Xerox A4 Mono", "Xerox A3 Color", "Xerox A4 Color", "Xerox Total",
-        "", # Spacer
-        "Difference", "BMS Balance"
-    ]
-    ws.append(headers)
+    ws.append(VOLUME_COMPARISON_HEADERS)
 
     for idx, cell in enumerate(ws[1], 1):
         if cell.value in ["BMS Total", "Xerox Total"]:
@@ -424,6 +707,8 @@ def create_excel_report(excel_data: Dict, db_data: Dict, raw_results: List[Tuple
             cell.fill = header_fill
             cell.font = header_font
 
+    comparison_rows = []
+
     # Month order for sorting
     month_order = {'Mar-2025': 1, 'Apr-2025': 2, 'May-2025': 3, 'Jun-2025': 4,
                    'Jul-2025': 5, 'Aug-2025': 6, 'Sep-2025': 7, 'Nov-2025': 8}
@@ -486,6 +771,7 @@ def create_excel_report(excel_data: Dict, db_data: Dict, raw_results: List[Tuple
                 difference, bms_balance
             ]
             ws.append(row)
+            comparison_rows.append(row)
 
             # Highlight total columns
             row_num = ws.max_row
@@ -578,113 +864,15 @@ def create_excel_report(excel_data: Dict, db_data: Dict, raw_results: List[Tuple
     # This handles both color printers (sub-meters) and B&W printers (Balance only)
     ws_recon = wb.create_sheet("Balance Recon", 3)
 
-    recon_headers = [
-        "Serial", "Xerox Company", "Xerox Product", "BMS Company", "BMS Model",
-        "Xerox Date", "BMS Date",
-        "",  # Spacer
-        "Xerox Total", "BMS Balance", "Difference",
-        "Calc Method", "Status"
-    ]
-    ws_recon.append(recon_headers)
+    ws_recon.append(BALANCE_RECON_HEADERS)
 
     for cell in ws_recon[1]:
         cell.fill = header_fill
         cell.font = header_font
 
-    # Build BMS readings lookup by serial -> date -> readings
-    # raw_results: (serial, model, status, date, category, install_date, datetime, total, a3, black, large, colour, xl, meterreadingid, meterreading_no, company)
-    bms_by_serial_date = defaultdict(dict)
-    for row in raw_results:
-        serial = str(row[0]).strip() if row[0] else None
-        if not serial:
-            continue
-        reading_date = row[3]
-        if reading_date:
-            date_key = reading_date.strftime("%Y-%m-%d") if hasattr(reading_date, 'strftime') else str(reading_date)[:10]
-            # Store the reading - later ones overwrite earlier (we want latest reading per day)
-            # Use the 'total' field from database (row[7]) - this is the Balance field
-            bms_by_serial_date[serial][date_key] = {
-                'model': row[1],
-                'company': row[15],
-                'balance': row[7] or 0,  # This is the Balance/total field from BMS
-                'date': reading_date
-            }
-
-    # Process each serial in device_meters - ONLY include serials that exist in BMS
-    for serial in sorted(device_meters.keys()):
-        # Skip if serial not in BMS at all
-        if serial not in bms_by_serial_date:
-            continue
-
-        xerox_info = device_meters[serial]
-        xerox_date = xerox_info['last_date']
-
-        if not xerox_date:
-            continue
-
-        xerox_date_str = xerox_date.strftime("%Y-%m-%d") if hasattr(xerox_date, 'strftime') else str(xerox_date)[:10]
-
-        # Get the LATEST BMS reading (not matching Xerox date)
-        bms_dates = bms_by_serial_date[serial]
-        sorted_dates = sorted(bms_dates.keys())
-
-        if not sorted_dates:
-            continue
-
-        # Use the latest BMS date
-        bms_date_used = sorted_dates[-1]
-        bms_info = bms_dates[bms_date_used]
-
-        # Get Xerox total (sum of all sub-meters from Device Meters file)
-        xerox_total = xerox_info.get('total', 0) or 0
-
-        # Get BMS Balance (the total/balance field from database)
-        bms_balance = bms_info.get('balance', 0) or 0
-        bms_company = bms_info.get('company', 'N/A')
-        bms_model = bms_info.get('model', 'N/A')
-
-        # Get calc method
-        calc_method = xerox_info.get('calc_method', 'Unknown')
-
-        # Calculate difference
-        difference = xerox_total - bms_balance
-
-        # Determine status
-        if calc_method == 'NO DATA':
-            status = "NO XEROX DATA"
-        elif difference == 0:
-            status = "BALANCED"
-        else:
-            status = "VARIANCE"
-
-        row = [
-            serial, xerox_info.get('company', 'N/A'), xerox_info.get('product', 'N/A'),
-            bms_company, bms_model,
-            xerox_date_str, bms_date_used,
-            "",  # Spacer
-            xerox_total, bms_balance, difference,
-            calc_method, status
-        ]
+    for row in build_balance_recon_rows(device_meters, raw_results):
         ws_recon.append(row)
-
-        # Apply formatting
-        row_num = ws_recon.max_row
-
-        # Highlight difference column
-        diff_cell = ws_recon.cell(row_num, 11)
-        if diff_cell.value and diff_cell.value != 0:
-            diff_cell.fill = red_fill
-        elif diff_cell.value == 0:
-            diff_cell.fill = green_fill
-
-        # Highlight status
-        status_cell = ws_recon.cell(row_num, 13)
-        if status == "BALANCED":
-            status_cell.fill = green_fill
-        elif status == "VARIANCE":
-            status_cell.fill = red_fill
-        elif status == "NO XEROX DATA":
-            status_cell.fill = PatternFill(start_color="FFC000", end_color="FFC000", fill_type="solid")  # Orange
+        style_balance_recon_row(ws_recon, ws_recon.max_row, green_fill, red_fill)
 
     # Auto-size columns for all sheets
     for sheet in wb:
@@ -707,9 +895,11 @@ def create_excel_report(excel_data: Dict, db_data: Dict, raw_results: List[Tuple
     total_rows = ws.max_row - 1  # Exclude header
     print(f"  Total comparisons: {total_rows}")
 
+    return comparison_rows
+
 
-def create_balance_report(device_meters: Dict, raw_results: List[Tuple], output_path: str):
-    """Create standalone Xerox vs BMS balance comparison report"""
+def create_balance_report(device_meters: Dict, raw_results: List[Tuple], output_path: str) -> List[List]:
+    """Create standalone Xerox vs BMS balance comparison report, returns the recon rows"""
     wb = openpyxl.Workbook()
     ws = wb.active
     ws.title = "Balance Comparison"
@@ -719,103 +909,17 @@ def create_balance_report(device_meters: Dict, raw_results: List[Tuple], output_
     header_font = Font(bold=True, color="FFFFFF")
     green_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
     red_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-    orange_fill = PatternFill(start_color="FFC000", end_color="FFC000", fill_type="solid")
-
-    headers = [
-        "Serial", "Xerox Company", "Xerox Product", "BMS Company", "BMS Model",
-        "Xerox Date", "BMS Date",
-        "",  # Spacer
-        "Xerox Total", "BMS Balance", "Difference",
-        "Calc Method", "Status"
-    ]
-    ws.append(headers)
+
+    ws.append(BALANCE_RECON_HEADERS)
 
     for cell in ws[1]:
         cell.fill = header_fill
         cell.font = header_font
 
-    # Build BMS readings lookup by serial -> date -> readings
-    # raw_results: (serial, model, status, date, category, install_date, datetime, total, a3, black, large, colour, xl, meterreadingid, meterreading_no, company)
-    bms_by_serial_date = defaultdict(dict)
-    for row in raw_results:
-        serial = str(row[0]).strip() if row[0] else None
-        if not serial:
-            continue
-        reading_date = row[3]
-        if reading_date:
-            date_key = reading_date.strftime("%Y-%m-%d") if hasattr(reading_date, 'strftime') else str(reading_date)[:10]
-            bms_by_serial_date[serial][date_key] = {
-                'model': row[1],
-                'company': row[15],
-                'balance': row[7] or 0,
-                'date': reading_date
-            }
-
-    # Process each serial in device_meters - ONLY include serials that exist in BMS
-    for serial in sorted(device_meters.keys()):
-        if serial not in bms_by_serial_date:
-            continue
-
-        xerox_info = device_meters[serial]
-        xerox_date = xerox_info['last_date']
-
-        if not xerox_date:
-            continue
-
-        xerox_date_str = xerox_date.strftime("%Y-%m-%d") if hasattr(xerox_date, 'strftime') else str(xerox_date)[:10]
-
-        # Get the LATEST BMS reading
-        bms_dates = bms_by_serial_date[serial]
-        sorted_dates = sorted(bms_dates.keys())
-
-        if not sorted_dates:
-            continue
-
-        bms_date_used = sorted_dates[-1]
-        bms_info = bms_dates[bms_date_used]
-
-        xerox_total = xerox_info.get('total', 0) or 0
-        bms_balance = bms_info.get('balance', 0) or 0
-        bms_company = bms_info.get('company', 'N/A')
-        bms_model = bms_info.get('model', 'N/A')
-        calc_method = xerox_info.get('calc_method', 'Unknown')
-
-        difference = xerox_total - bms_balance
-
-        if calc_method == 'NO DATA':
-            status = "NO XEROX DATA"
-        elif difference == 0:
-            status = "BALANCED"
-        else:
-            status = "VARIANCE"
-
-        row = [
-            serial, xerox_info.get('company', 'N/A'), xerox_info.get('product', 'N/A'),
-            bms_company, bms_model,
-            xerox_date_str, bms_date_used,
-            "",
-            xerox_total, bms_balance, difference,
-            calc_method, status
-        ]
+    recon_rows = build_balance_recon_rows(device_meters, raw_results)
+    for row in recon_rows:
         ws.append(row)
-
-        row_num = ws.max_row
-
-        # Highlight difference column
-        diff_cell = ws.cell(row_num, 11)
-        if diff_cell.value and diff_cell.value != 0:
-            diff_cell.fill = red_fill
-        elif diff_cell.value == 0:
-            diff_cell.fill = green_fill
-
-        # Highlight status
-        status_cell = ws.cell(row_num, 13)
-        if status == "BALANCED":
-            status_cell.fill = green_fill
-        elif status == "VARIANCE":
-            status_cell.fill = red_fill
-        elif status == "NO XEROX DATA":
-            status_cell.fill = orange_fill
+        style_balance_recon_row(ws, ws.max_row, green_fill, red_fill)
 
     # Auto-size columns
     for column in ws.columns:
@@ -833,39 +937,15 @@ def create_balance_report(device_meters: Dict, raw_results: List[Tuple], output_
     print(f"✓ Balance report saved: {output_path}")
     print(f"  Serials compared: {ws.max_row - 1}")
 
+    return recon_rows
 
-def export_bms_machine_info(raw_results: List[Tuple]) -> Dict:
-    """Extract unique machine info (category, install_date, company) by serial number
 
-    raw_results structure (updated):
-    (serial, model, status, date, category, install_date, datetime, total, a3, black, large, colour, xl, meterreadingid, meterreading_no, company)
-    """
-    machine_info = {}
-
-    for row in raw_results:
-        serial = str(row[0]).strip() if row[0] else None
-        if not serial:
-            continue
-
-        # Only store first occurrence (or overwrite with newer data)
-        if serial not in machine_info:
-            category = row[4]
-            install_date = row[5]
-            company = row[15]  # company name is appended at the end
-
-            # Convert install_date to string if it's a datetime
-            if install_date:
-                install_date_str = install_date.strftime("%Y-%m-%d") if hasattr(install_date, 'strftime') else str(install_date)[:10]
-            else:
-                install_date_str = None
-
-            machine_info[serial] = {
-                'category': category,
-                'install_date': install_date_str,
-                'bms_company': company
-            }
-
-    return machine_info
+def is_volume_variance(record: Dict) -> bool:
+    """Volume Comparison row outside the default comparison tolerance"""
+    xerox_total = record["Xerox Total"] or 0
+    diff = abs(record["Difference"] or 0)
+    pct = diff / xerox_total * 100 if xerox_total > 0 else 0
+    return not (diff < DEFAULT_ABS_TOLERANCE or pct < DEFAULT_REL_TOLERANCE)
 
 
 def main():
@@ -876,51 +956,240 @@ def main():
     if excel_in_script_dir.exists():
         excel_path = excel_in_script_dir
         device_meters_path = script_dir / "Device Current Meters based on last Reading Date.xlsx"
+        billing_path = script_dir / "Xerox Billing.xlsx"
         output_path = script_dir / "Volume_Comparison_Report.xlsx"
         balance_output_path = script_dir / "Xerox_vs_BMS_Balances.xlsx"
+        coverage_output_path = script_dir / "Coverage_Recon_Report.xlsx"
     else:
         # Local execution - files in project root
         project_root = script_dir.parent
         excel_path = project_root / "Volumes from Xerox.xlsx"
         device_meters_path = project_root / "Device Current Meters based on last Reading Date.xlsx"
+        billing_path = project_root / "Xerox Billing.xlsx"
         output_path = project_root / "Volume_Comparison_Report.xlsx"
         balance_output_path = project_root / "Xerox_vs_BMS_Balances.xlsx"
-
+        coverage_output_path = project_root / "Coverage_Recon_Report.xlsx"
+
+    # Check settings before spending time on the spreadsheets and databases
+    settings = db_settings()
+    balance_match_settings()
+    concurrency_settings()
+
+    # Per-stage timings, row counts and memory, written even if the run fails
+    manifest = RunManifest("export", output_path.parent)
+    try:
+        run_export(manifest, settings, excel_path, device_meters_path, billing_path,
+                   output_path, balance_output_path, coverage_output_path)
+    except BaseException as e:
+        manifest.finish(e)
+        raise
+    finally:
+        manifest_path = manifest.write()
+        print(f"\n✓ Run manifest saved: {manifest_path}")
+
+
+def run_export(manifest: RunManifest, settings: Dict, excel_path: Path, device_meters_path: Path, billing_path: Path,
+               output_path: Path, balance_output_path: Path, coverage_output_path: Path):
+    """The full export, one manifest stage per loader, transform and report"""
     print("Loading Excel data...")
-    excel_data = load_excel_data(excel_path)
+    with manifest.stage("load_excel_data") as stage:
+        excel_data = load_excel_data(excel_path)
+        stage['rows_out'] = len(excel_data)
     print(f"✓ Loaded {len(excel_data)} serials from Excel\n")
 
     print("Loading Device Meters data...")
     device_meters = {}
     if device_meters_path.exists():
-        device_meters = load_device_meters(device_meters_path)
+        with manifest.stage("load_device_meters") as stage:
+            device_meters = load_device_meters(device_meters_path)
+            stage['rows_out'] = len(device_meters)
         print(f"✓ Loaded {len(device_meters)} serials from Device Meters\n")
     else:
         print("⚠ Device Meters file not found - skipping balance recon\n")
 
-    raw_results = query_all_databases()
+    print("Loading Xerox billing lines...")
+    billing_lines = []
+    if billing_source() == 'webapp':
+        # Ingested once by xerox_ingest.py, read back by index instead of re-parsing the workbook
+        with manifest.stage("load_billing_lines") as stage:
+            billing_lines = load_billing_lines_from_webapp()
+            stage['rows_out'] = len(billing_lines)
+        print(f"✓ Loaded {len(billing_lines)} billing lines from the webapp\n")
+    elif billing_path.exists():
+        with manifest.stage("load_billing_lines") as stage:
+            billing_lines = load_billing_lines(billing_path)
+            stage['rows_out'] = len(billing_lines)
+        print(f"✓ Loaded {len(billing_lines)} billing lines\n")
+    else:
+        print("⚠ Xerox Billing file not found - skipping coverage recon\n")
+
+    preflight = None
+    source = readings_source()
+    if source == 'bms' and os.getenv("EXTRACT_PREFLIGHT", "false").lower() == "true":
+        print("Pre-flight check...")
+        with manifest.stage("preflight") as stage:
+            preflight = run_preflight(settings)
+            stage['rows_out'] = sum(1 for r in preflight.values() if r['status'] != 'DOWN')
+        print_preflight(preflight)
+        print()
+
+    with manifest.stage("query") as stage:
+        if source == 'webapp':
+            raw_results = query_webapp_readings()
+        else:
+            raw_results = query_all_databases(settings, output_path.parent / "Company_Stats.json", preflight, manifest)
+        stage['rows_out'] = len(raw_results)
     print(f"\n✓ Retrieved {len(raw_results)} total rows\n")
 
     print("Calculating incremental volumes...")
-    db_data = calculate_incremental_volumes(raw_results)
+    with manifest.stage("calculate_incremental_volumes", rows_in=len(raw_results)) as stage:
+        db_data = calculate_incremental_volumes(raw_results)
+        stage['rows_out'] = sum(len(months) for months in db_data.values())
     print(f"✓ Processed {len(db_data)} unique serials\n")
 
+    # Re-key Xerox-side serials onto BMS serials where they only differ by
+    # leading zeros, case, separators or prefixes
+    print("Matching serials across sources...")
+    with manifest.stage("match_serials", rows_in=len(excel_data) + len(device_meters) + len(billing_lines)) as stage:
+        serial_reports = {"Xerox Volumes": rekey_to_target(excel_data, build_serial_index(db_data.keys()), "Xerox Volumes")}
+        all_bms_index = build_serial_index({row[0] for row in raw_results})
+        if device_meters:
+            serial_reports["Device Meters"] = rekey_to_target(device_meters, all_bms_index, "Device Meters")
+        if billing_lines:
+            billing_matches = match_serials({line['serial'] for line in billing_lines}, all_bms_index)
+            for line in billing_lines:
+                line['serial'] = billing_matches['near'].get(line['serial'], line['serial'])
+            serial_reports["Xerox Billing"] = billing_matches
+        unmatched_path = output_path.parent / "Unmatched_Serials.csv"
+        written = write_unmatched_report(serial_reports, unmatched_path)
+        stage['rows_out'] = written
+    print(f"✓ {written} near/unmatched serials saved: {unmatched_path}\n")
+
     print("Creating Excel report...")
-    create_excel_report(excel_data, db_data, raw_results, device_meters, output_path)
+    with manifest.stage("volume_comparison_report", rows_in=len(raw_results)) as stage:
+        comparison_rows = create_excel_report(excel_data, db_data, raw_results, device_meters, output_path)
+        stage['rows_out'] = len(comparison_rows)
+
+    # Fingerprints of this run's rows - compared with the previous run for the delta report
+    snapshots = {
+        "Volume Comparison": snapshot_rows(
+            comparison_rows, VOLUME_COMPARISON_HEADERS,
+            ["Serial", "Month"], ["BMS Total", "Xerox Total", "Difference", "BMS Balance"],
+            is_volume_variance
+        )
+    }
 
     # Create separate balance report
     if device_meters:
         print("\nCreating balance comparison report...")
-        create_balance_report(device_meters, raw_results, balance_output_path)
-
-    # Export BMS machine info (category, install_date, company) to JSON for performance report
-    print("\nExporting BMS machine info...")
-    bms_machine_info = export_bms_machine_info(raw_results)
-    import json
-    bms_info_path = output_path.parent / "bms_machine_info.json"
-    with open(bms_info_path, 'w') as f:
-        json.dump(bms_machine_info, f)
-    print(f"✓ BMS machine info saved: {bms_info_path} ({len(bms_machine_info)} serials)")
+        with manifest.stage("balance_report", rows_in=len(device_meters)) as stage:
+            recon_rows = create_balance_report(device_meters, raw_results, balance_output_path)
+            stage['rows_out'] = len(recon_rows)
+        snapshots["Balance Recon"] = snapshot_rows(
+            recon_rows, BALANCE_RECON_HEADERS,
+            ["Serial"], ["Xerox Date", "BMS Date", "Xerox Total", "BMS Balance", "Difference", "Status"],
+            lambda r: r["Status"] == "VARIANCE"
+        )
+
+    # BMS movement over each Xerox billing line's actual coverage period
+    if billing_lines:
+        print("\nCreating coverage recon report...")
+        with manifest.stage("coverage_recon_report", rows_in=len(billing_lines)) as stage:
+            coverage_results = reconcile_coverage(billing_lines, build_counter_index(raw_results))
+            create_coverage_recon_report(coverage_results, coverage_output_path)
+            stage['rows_out'] = len(coverage_results)
+        snapshots["Coverage Recon"] = snapshot_rows(
+            coverage_results, None,
+            ["serial", "billing_month", "print_type", "line_index"], ["bms_volume", "xerox_volume", "variance", "status"],
+            lambda r: r["status"] == "VARIANCE"
+        )
+
+    print("\nComparing with previous run...")
+    with manifest.stage("delta_report") as stage:
+        stage['rows_out'] = create_delta_report(
+            snapshots, output_path.parent / "Run_Fingerprints.json", output_path.parent / "Variance_Delta.xlsx")
+
+    # Update the BMS machine info store (model, status, category, install date, company, last reading) for the performance report
+    print("\nUpdating BMS machine info store...")
+    machine_store_path = output_path.parent / "bms_machine_info.db"
+    with manifest.stage("machine_store") as stage:
+        machines = machine_rows(raw_results)
+        stage['rows_in'] = len(machines)
+        with MachineStore(machine_store_path) as store:
+            counts = store.upsert(machines)
+        stage['rows_out'] = counts['inserted'] + counts['updated']
+    print(f"✓ BMS machine info saved: {machine_store_path} "
+          f"({counts['inserted']} new, {counts['updated']} changed, {counts['unchanged']} unchanged)")
+
+    # Publish the readings to the webapp so its sync doesn't read BMS again (see webapp_publish.py)
+    if publish_enabled() and source == 'bms':
+        print("\nPublishing meter readings to the webapp...")
+        try:
+            with manifest.stage("publish_webapp", rows_in=len(raw_results)) as stage:
+                published = publish_readings(raw_results)
+                stage['rows_out'] = published['merged']
+            print(f"✓ {published['merged']} meter readings merged, {published['machines_updated']} machine balances updated")
+            if published['unknown_rows']:
+                print(f"  ⚠ {published['unknown_rows']} readings of {published['unknown_serials']} serials skipped "
+                      f"- no webapp machine (run the webapp machine sync first)")
+        except Exception as e:
+            # The reports are written; a failed publish is recorded in the manifest, not fatal
+            print(f"✗ Publishing to the webapp failed: {e}")
+
+    # Derived webapp tables are only written with WEBAPP_WRITEBACK=true - off by default, so reading
+    # the mirror never writes to it unasked. Re-score the fleet's anomaly flags against the synced
+    # readings - this run's publish or a webapp sync (see meter_anomalies.py)
+    writeback = writeback_enabled() and (publish_enabled() or source == 'webapp')
+    if writeback:
+        print("\nRe-scoring meter reading anomalies...")
+        try:
+            with manifest.stage("rescore_anomalies") as stage:
+                rescored = rescore_anomalies()
+                stage['rows_in'] = rescored['readings']
+                stage['rows_out'] = sum(rescored['by_reason'].values())
+            print(f"✓ {rescored['flagged']} readings newly flagged as anomalies, {rescored['cleared']} flags cleared")
+        except Exception as e:
+            print(f"✗ Re-scoring anomalies failed: {e}")
+
+    # The lift page's utilization snapshot goes stale with every sync - this run's publish or a webapp
+    # sync since it was last built (see utilization_materialize.py)
+    if writeback:
+        print("\nRefreshing the webapp's utilization snapshot...")
+        try:
+            with manifest.stage("materialize_utilization") as stage:
+                materialized = materialize_utilization(only_if_stale=True)
+                stage['rows_out'] = materialized['machines'] if materialized else 0
+            if materialized:
+                print(f"✓ Utilization of {materialized['machines']} machines materialized")
+            else:
+                print("✓ Utilization snapshot is current")
+        except Exception as e:
+            print(f"✗ Materializing utilization failed: {e}")
+
+
+def balance_main():
+    """Balance Recon only - Device Meters vs BMS balances, without the volume comparison"""
+    project_root = Path(__file__).parent.parent
+    device_meters_path = project_root / "Device Current Meters based on last Reading Date.xlsx"
+    balance_output_path = project_root / "Xerox_vs_BMS_Balances.xlsx"
+
+    settings = db_settings()
+    balance_match_settings()
+
+    print("Loading Device Meters data...")
+    device_meters = load_device_meters(device_meters_path)
+    print(f"✓ Loaded {len(device_meters)} serials from Device Meters\n")
+
+    if readings_source() == 'webapp':
+        raw_results = query_webapp_readings()
+    else:
+        raw_results = query_all_databases(settings, project_root / "Company_Stats.json")
+    print(f"\n✓ Retrieved {len(raw_results)} total rows\n")
+
+    rekey_to_target(device_meters, build_serial_index({row[0] for row in raw_results}), "Device Meters")
+
+    print("\nCreating balance comparison report...")
+    create_balance_report(device_meters, raw_results, balance_output_path)
 
 
 if __name__ == "__main__":
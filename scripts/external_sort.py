@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Memory-bounded sorting by spilling sorted runs to disk
+
+external_sorted() sorts an iterable of tuples holding at most max_rows of them
+in memory: each full buffer is sorted and pickled to a temporary file in
+small batches, then the runs are merged back lazily (heapq.merge), so only one
+batch per run is resident during the merge. When there are more runs than
+fit in the budget that way, they are first merged in groups into longer runs.
+Used by the export's volume calculation when VOLUME_SORT_BUDGET_MB is set -
+see export_comparison_excel.calculate_incremental_volumes.
+"""
+
+import heapq
+import os
+import pickle
+import tempfile
+from typing import Iterable, Iterator, Tuple
+
+# Records per pickle batch when writing and reading a run (one batch per run is resident while merging)
+BATCH_ROWS = 1000
+
+# Rough resident size of one buffered record (a tuple of ~14 small values), for turning MB into rows
+RECORD_BYTES = 600
+
+
+def rows_for_budget(budget_mb: float) -> int:
+    """Records one in-memory run may hold within budget_mb"""
+    return max(BATCH_ROWS, int(budget_mb * 1024 * 1024 / RECORD_BYTES))
+
+
+def _write_run(records: Iterable[Tuple], directory: str) -> str:
+    """Write already sorted records as one run file"""
+    fd, path = tempfile.mkstemp(prefix="run_", suffix=".pickle", dir=directory)
+    with os.fdopen(fd, 'wb') as f:
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= BATCH_ROWS:
+                pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+                batch = []
+        if batch:
+            pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def read_run(path: str) -> Iterator[Tuple]:
+    """Records of a file of pickled batches, one batch in memory at a time"""
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                return
+            yield from batch
+
+
+def external_sorted(records: Iterable[Tuple], max_rows: int, tmp_dir: str = None) -> Iterator[Tuple]:
+    """records in sorted order, with at most max_rows buffered at once
+
+    Input that fits in one run is sorted in memory without touching disk.
+    Records must be totally ordered (make the key unique, e.g. end it with a
+    sequence number, so payload fields are never compared). Temporary files
+    live in tmp_dir (default: TMPDIR) and are removed when the iterator is
+    exhausted or closed.
+    """
+    fan_in = max(2, max_rows // BATCH_ROWS)
+    buffer = []
+    runs = []
+    with tempfile.TemporaryDirectory(prefix="jetline_sort_", dir=tmp_dir) as directory:
+        for record in records:
+            buffer.append(record)
+            if len(buffer) >= max_rows:
+                buffer.sort()
+                runs.append(_write_run(buffer, directory))
+                buffer = []
+
+        buffer.sort()
+        if not runs:
+            yield from buffer
+            return
+        if buffer:
+            runs.append(_write_run(buffer, directory))
+            buffer = []
+
+        while len(runs) > fan_in:
+            merged = []
+            for i in range(0, len(runs), fan_in):
+                group = runs[i:i + fan_in]
+                merged.append(_write_run(heapq.merge(*(read_run(path) for path in group)), directory))
+                for path in group:
+                    os.remove(path)
+            runs = merged
+        yield from heapq.merge(*(read_run(path) for path in runs))
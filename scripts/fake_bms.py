@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+In-process fake BMS backed by SQLite
+
+A stand-in for the store MySQL servers so extraction can run end to end with
+no network: one SQLite file per company schema (bms_machines, bms_meterreading,
+vtiger_crmentity filled from a synthetic fleet) plus an information_schema
+file, served through the subset of the mysql.connector interface the scripts
+use - connect(), cursor(), execute() with %s parameters, fetchone/many/all,
+description, switching conn.database, SHOW SESSION STATUS (Bytes_sent),
+DESCRIBE and EXPLAIN. MySQL functions used by the queries (YEAR, MONTH,
+VERSION, MD5, CONCAT_WS) are registered on each connection, and DATE /
+DATETIME values come back as date / datetime objects like the real connector.
+
+The schemas, names and hosts mirror the company registry, so every script
+runs unchanged with:
+    BMS_BACKEND=fake              use the fake instead of mysql.connector
+    FAKE_BMS_DIR=<dir>            where the fake lives (default: <project>/fake_bms)
+    FAKE_BMS_LATENCY_MS=<ms>      sleep per statement, to emulate a remote server
+    FAKE_BMS_DOWN=<schema,...>    schemas that refuse connections
+
+    python3 scripts/fake_bms.py build --serials 5000 --workbooks .   # fleet + matching Xerox workbooks
+    BMS_BACKEND=fake python3 scripts/export_comparison_excel.py
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List
+
+from company_registry import load_companies
+
+SCRIPT_DIR = Path(__file__).parent
+DEFAULT_DIR = SCRIPT_DIR.parent / "fake_bms"
+INFORMATION_SCHEMA = "information_schema.db"
+SERVER_VERSION = "8.0.36-fakebms"
+
+TABLE_DDL = {
+    'bms_machines': """
+        CREATE TABLE bms_machines (
+            machinesid int(19) PRIMARY KEY,
+            serialnumber varchar(100),
+            machine_model_name varchar(100),
+            machinestatus int(1),
+            machines_category varchar(100),
+            original_installation_date date,
+            start_date date
+        )""",
+    'vtiger_crmentity': """
+        CREATE TABLE vtiger_crmentity (
+            crmid int(19) PRIMARY KEY,
+            setype varchar(30),
+            deleted int(1),
+            createdtime datetime
+        )""",
+    'bms_meterreading': """
+        CREATE TABLE bms_meterreading (
+            meterreadingid int(19) PRIMARY KEY,
+            meterreading_no varchar(100),
+            asset int(19),
+            reading_date date,
+            total decimal(25,0),
+            a3 decimal(25,0),
+            black decimal(25,0),
+            large decimal(25,0),
+            colour decimal(25,0),
+            extralarge decimal(25,0)
+        )""",
+}
+
+INDEX_DDL = [
+    "CREATE INDEX asset ON bms_meterreading (asset)",
+    "CREATE INDEX reading_date ON bms_meterreading (reading_date)",
+    "CREATE INDEX serialnumber ON bms_machines (serialnumber)",
+]
+
+DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+DATETIME_RE = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+
+
+class Error(Exception):
+    """Raised like mysql.connector.Error"""
+
+
+def fake_dir() -> Path:
+    return Path(os.getenv("FAKE_BMS_DIR", DEFAULT_DIR))
+
+
+def bms_connector():
+    """The connector module for BMS connections: this fake with BMS_BACKEND=fake, else mysql.connector"""
+    if os.getenv("BMS_BACKEND", "mysql").lower() == "fake":
+        import fake_bms
+        return fake_bms
+    import mysql.connector
+    return mysql.connector
+
+
+# ---------------------------------------------------------------------------
+# Building the fake
+# ---------------------------------------------------------------------------
+
+def build_fake_bms(directory: Path, spec: Dict = None, companies: List[Dict] = None) -> Dict[str, int]:
+    """Generate a synthetic fleet and write it as one SQLite schema per company
+
+    Machines are spread over the registry's companies (all of them, active or
+    not). Returns {schema: meter reading rows}. Existing files are replaced.
+    """
+    from synthetic_fleet import fleet_spec, generate_fleet
+
+    companies = companies if companies is not None else load_companies(include_inactive=True)
+    spec = dict(spec or fleet_spec(), companies=len(companies))
+    fleet = generate_fleet(spec)
+    fleet_to_schema = {c['name']: companies[i]['schema'] for i, c in enumerate(fleet['companies'])}
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    by_schema = {c['schema']: [] for c in companies}
+    for row in fleet['readings']:
+        by_schema[fleet_to_schema[row[15]]].append(row)
+
+    counts = {}
+    next_id = 1
+    for schema, readings in by_schema.items():
+        path = directory / f"{schema}.db"
+        if path.exists():
+            path.unlink()
+        conn = sqlite3.connect(path)
+        for ddl in TABLE_DDL.values():
+            conn.execute(ddl)
+
+        machines, crm, meter = {}, [], []
+        for (serial, model, status, reading_date, category, install, created,
+             total, a3, black, large, colour, xl, _, reading_no, _) in readings:
+            if serial not in machines:
+                machines[serial] = next_id
+                crm.append((next_id, 'Machines', 0, None))
+                conn.execute("INSERT INTO bms_machines VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (next_id, serial, model, status, category, install.isoformat(), install.isoformat()))
+                next_id += 1
+            crm.append((next_id, 'MeterReading', 0, created.strftime("%Y-%m-%d %H:%M:%S")))
+            meter.append((next_id, reading_no, machines[serial], reading_date.isoformat(),
+                          total, a3, black, large, colour, xl))
+            next_id += 1
+
+        conn.executemany("INSERT INTO vtiger_crmentity VALUES (?, ?, ?, ?)", crm)
+        conn.executemany("INSERT INTO bms_meterreading VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", meter)
+        for ddl in INDEX_DDL:
+            conn.execute(ddl)
+        conn.commit()
+        conn.close()
+        counts[schema] = len(meter)
+
+    build_information_schema(directory, [c['schema'] for c in companies])
+    return counts
+
+
+def build_information_schema(directory: Path, schemas: List[str]):
+    """COLUMNS, STATISTICS and TABLES for every schema, as MySQL exposes them"""
+    path = Path(directory) / INFORMATION_SCHEMA
+    if path.exists():
+        path.unlink()
+    info = sqlite3.connect(path)
+    info.execute("CREATE TABLE COLUMNS (TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY)")
+    info.execute("CREATE TABLE STATISTICS (TABLE_SCHEMA, TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME, NON_UNIQUE)")
+    info.execute("CREATE TABLE TABLES (TABLE_SCHEMA, TABLE_NAME, TABLE_ROWS)")
+
+    for schema in sorted(schemas):
+        conn = sqlite3.connect(Path(directory) / f"{schema}.db")
+        for table in sorted(TABLE_DDL):
+            for cid, name, col_type, notnull, _, pk in conn.execute(f"PRAGMA table_info({table})"):
+                info.execute("INSERT INTO COLUMNS VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (schema, table, name, cid + 1, col_type, 'NO' if notnull or pk else 'YES', 'PRI' if pk else ''))
+                if pk:
+                    info.execute("INSERT INTO STATISTICS VALUES (?, ?, 'PRIMARY', 1, ?, 0)", (schema, table, name))
+            for _, index, unique, *_ in conn.execute(f"PRAGMA index_list({table})"):
+                if index.startswith("sqlite_autoindex"):
+                    continue
+                for seq, _, column in conn.execute(f"PRAGMA index_info({index})"):
+                    info.execute("INSERT INTO STATISTICS VALUES (?, ?, ?, ?, ?, ?)",
+                                 (schema, table, index, seq + 1, column, 0 if unique else 1))
+            rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            info.execute("INSERT INTO TABLES VALUES (?, ?, ?)", (schema, table, rows))
+        conn.close()
+    info.commit()
+    info.close()
+
+
+# ---------------------------------------------------------------------------
+# The connector interface
+# ---------------------------------------------------------------------------
+
+def translate(sql: str) -> str:
+    """MySQL query text -> SQLite: %s placeholders, GROUP_CONCAT without ORDER BY"""
+    sql = sql.strip().rstrip(';').replace('%s', '?')
+    # SQLite < 3.44 has no ORDER BY inside aggregates - rows come out in insertion (sorted) order anyway
+    return re.sub(r"(GROUP_CONCAT\((?:[^()]|\([^()]*\))*?)\s+ORDER BY [\w\s,]+\)", r"\1)", sql, flags=re.IGNORECASE)
+
+
+def convert_value(value):
+    """DATE / DATETIME text as date / datetime objects, like mysql.connector returns them"""
+    if isinstance(value, str):
+        if DATE_RE.match(value):
+            return date.fromisoformat(value)
+        if DATETIME_RE.match(value):
+            return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    return value
+
+
+def _year(value):
+    return int(value[:4]) if value else None
+
+
+def _month(value):
+    return int(value[5:7]) if value else None
+
+
+def _md5(value):
+    return hashlib.md5(str(value).encode()).hexdigest() if value is not None else None
+
+
+def _concat_ws(separator, *values):
+    return separator.join(str(v) for v in values if v is not None)
+
+
+class FakeCursor:
+    def __init__(self, connection: "FakeConnection"):
+        self.connection = connection
+        self.description = None
+        self._rows = None
+        self._cursor = None
+
+    def execute(self, operation: str, params=None):
+        self.connection._check()
+        latency = float(os.getenv("FAKE_BMS_LATENCY_MS", "0"))
+        if latency:
+            time.sleep(latency / 1000)
+
+        statement = operation.strip()
+        upper = statement.upper()
+        self._rows, self._cursor = None, None
+        if upper.startswith("SET "):
+            self.description = None
+            self._rows = []
+        elif upper.startswith("SHOW SESSION STATUS"):
+            self._result(["Variable_name", "Value"], [("Bytes_sent", str(self.connection.bytes_sent))])
+        elif upper.startswith("DESCRIBE "):
+            self._describe(statement.split()[1].strip('`;'))
+        elif upper.startswith("EXPLAIN "):
+            self._explain(statement[len("EXPLAIN "):], params)
+        else:
+            try:
+                self._cursor = self.connection._sqlite.execute(translate(statement), tuple(params or ()))
+            except sqlite3.Error as e:
+                raise Error(str(e)) from e
+            self.description = self._cursor.description
+
+    def _result(self, columns: List[str], rows: List[tuple]):
+        self.description = [(c, None, None, None, None, None, None) for c in columns]
+        self._rows = list(rows)
+
+    def _describe(self, table: str):
+        rows = []
+        for _, name, col_type, notnull, default, pk in self.connection._sqlite.execute(f"PRAGMA table_info({table})"):
+            rows.append((name, col_type, 'NO' if notnull or pk else 'YES', 'PRI' if pk else '', default, ''))
+        if not rows:
+            raise Error(f"Table '{self.connection.database}.{table}' doesn't exist")
+        self._result(["Field", "Type", "Null", "Key", "Default", "Extra"], rows)
+
+    def _explain(self, query: str, params):
+        """SQLite's query plan in MySQL EXPLAIN columns (id, table, type, key, rows, Extra)"""
+        sql = translate(query)
+        aliases = {alias: table for table, alias in re.findall(r"(?:FROM|JOIN)\s+(\w+)\s+(\w+)", sql, re.IGNORECASE)}
+        try:
+            plan = self.connection._sqlite.execute("EXPLAIN QUERY PLAN " + sql, tuple(params or ())).fetchall()
+        except sqlite3.Error as e:
+            raise Error(str(e)) from e
+
+        rows = []
+        for _, _, _, detail in plan:
+            match = re.match(r"(SCAN|SEARCH) (\w+)(?: USING (?:COVERING |INTEGER PRIMARY )?(?:INDEX (\w+)|KEY))?", detail)
+            if match:
+                access, alias, index = match.groups()
+                table = aliases.get(alias, alias)
+                key = index or ('PRIMARY' if 'PRIMARY KEY' in detail else None)
+                if key and key.startswith('sqlite_autoindex'):
+                    key = 'PRIMARY'
+                estimate = self.connection._sqlite.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                rows.append([1, 'SIMPLE', alias, 'ALL' if access == 'SCAN' and not key else ('index' if access == 'SCAN' else 'ref'),
+                             key, estimate if access == 'SCAN' else 1, ''])
+            elif 'TEMP B-TREE' in detail and rows:
+                rows[0][6] = "; ".join(filter(None, [rows[0][6], "Using temporary; Using filesort"]))
+        self._result(["id", "select_type", "table", "type", "key", "rows", "Extra"], [tuple(r) for r in rows])
+
+    def _count(self, rows: List[tuple]) -> List[tuple]:
+        self.connection.bytes_sent += sum(len(str(v)) + 1 for row in rows for v in row)
+        return [tuple(convert_value(v) for v in row) for row in rows]
+
+    def fetchall(self) -> List[tuple]:
+        if self._rows is not None:
+            rows, self._rows = self._rows, []
+            return self._count(rows)
+        return self._count(self._cursor.fetchall()) if self._cursor else []
+
+    def fetchmany(self, size: int = 1) -> List[tuple]:
+        if self._rows is not None:
+            rows, self._rows = self._rows[:size], self._rows[size:]
+            return self._count(rows)
+        return self._count(self._cursor.fetchmany(size)) if self._cursor else []
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._rows, self._cursor = None, None
+
+
+class FakeConnection:
+    """One schema at a time, like a MySQL session; safe to hand between threads (not to share)"""
+
+    def __init__(self, directory: Path, database: str):
+        self.directory = directory
+        self.bytes_sent = 0
+        self._sqlite = None
+        self._lock = threading.Lock()
+        self.database = database
+
+    @property
+    def database(self) -> str:
+        return self._database
+
+    @database.setter
+    def database(self, schema: str):
+        """USE <schema> - reopen on that schema's file"""
+        down = {s.strip() for s in os.getenv("FAKE_BMS_DOWN", "").split(",") if s.strip()}
+        path = self.directory / f"{schema}.db"
+        if schema in down:
+            raise Error(f"Can't connect to MySQL server for '{schema}' (FAKE_BMS_DOWN)")
+        if not path.exists():
+            raise Error(f"Unknown database '{schema}'")
+        if self._sqlite is not None:
+            self._sqlite.close()
+        self._sqlite = sqlite3.connect(path, check_same_thread=False)
+        self._sqlite.execute("ATTACH DATABASE ? AS information_schema", (str(self.directory / INFORMATION_SCHEMA),))
+        self._sqlite.create_function("VERSION", 0, lambda: SERVER_VERSION)
+        self._sqlite.create_function("YEAR", 1, _year)
+        self._sqlite.create_function("MONTH", 1, _month)
+        self._sqlite.create_function("MD5", 1, _md5)
+        self._sqlite.create_function("CONCAT_WS", -1, _concat_ws)
+        self._database = schema
+
+    def _check(self):
+        if self._sqlite is None:
+            raise Error("Connection is closed")
+
+    def cursor(self, **kwargs) -> FakeCursor:
+        self._check()
+        return FakeCursor(self)
+
+    def is_connected(self) -> bool:
+        return self._sqlite is not None
+
+    def commit(self):
+        pass
+
+    def close(self):
+        if self._sqlite is not None:
+            self._sqlite.close()
+            self._sqlite = None
+
+
+def connect(host: str = None, port: int = None, user: str = None, password: str = None,
+            database: str = None, **kwargs) -> FakeConnection:
+    """mysql.connector.connect() stand-in - host, port and credentials are accepted and ignored"""
+    directory = fake_dir()
+    if not (directory / INFORMATION_SCHEMA).exists():
+        raise Error(f"No fake BMS in {directory} - run: python3 scripts/fake_bms.py build")
+    latency = float(os.getenv("FAKE_BMS_LATENCY_MS", "0"))
+    if latency:
+        time.sleep(latency / 1000)
+    return FakeConnection(directory, database)
+
+
+def main(argv: List[str] = None):
+    from synthetic_fleet import DEFAULT_SPEC, fleet_spec
+
+    parser = argparse.ArgumentParser(description="Build or inspect the SQLite fake BMS")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Generate a synthetic fleet as one SQLite schema per registry company")
+    for key in ('serials', 'months', 'readings_per_month', 'same_day_rate', 'reset_rate', 'seed'):
+        build.add_argument(f"--{key.replace('_', '-')}", type=type(DEFAULT_SPEC[key]), default=DEFAULT_SPEC[key])
+    build.add_argument("--dir", default=str(fake_dir()), help="Fake BMS directory (default: FAKE_BMS_DIR or <project>/fake_bms)")
+    build.add_argument("--workbooks", help="Also write the matching Xerox workbooks to this directory")
+
+    info = subparsers.add_parser("info", help="Rows per schema")
+    info.add_argument("--dir", default=str(fake_dir()))
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        spec = fleet_spec(**{key: getattr(args, key) for key in
+                             ('serials', 'months', 'readings_per_month', 'same_day_rate', 'reset_rate', 'seed')})
+        start = time.time()
+        counts = build_fake_bms(Path(args.dir), spec)
+        print(f"✓ Fake BMS built in {args.dir}: {len(counts)} schemas, {sum(counts.values()):,} meter readings "
+              f"({time.time() - start:.1f}s)")
+        if args.workbooks:
+            from synthetic_fleet import generate_fleet, write_device_meters_workbook, write_volumes_workbook
+            fleet = generate_fleet(dict(spec, companies=len(counts)))
+            out = Path(args.workbooks)
+            write_volumes_workbook(fleet, out / "Volumes from Xerox.xlsx")
+            write_device_meters_workbook(fleet, out / "Device Current Meters based on last Reading Date.xlsx")
+            print(f"✓ Matching Xerox workbooks written to {out}")
+        print(f"  Use it with: BMS_BACKEND=fake FAKE_BMS_DIR={args.dir}")
+    else:
+        conn = sqlite3.connect(Path(args.dir) / INFORMATION_SCHEMA)
+        for schema, rows in conn.execute(
+                "SELECT TABLE_SCHEMA, TABLE_ROWS FROM TABLES WHERE TABLE_NAME = 'bms_meterreading' ORDER BY TABLE_SCHEMA"):
+            print(f"  {schema:<28} {rows:>10,} readings")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
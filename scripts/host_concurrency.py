@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Adaptive per-host concurrency for BMS extraction
+
+The store BMS servers are production MySQL instances, so each host gets its own
+limit on in-flight company queries, adjusted AIMD-style from what the host is
+doing right now:
+- a query that succeeds within EXTRACT_SLOWDOWN x its expected time (from
+  Company_Stats.json) raises the limit additively (+1 per limit's worth of
+  successes)
+- an error or a slow query halves the limit
+always within EXTRACT_MIN_PER_HOST..EXTRACT_MAX_PER_HOST. Hosts start at the
+minimum and ramp up only while they keep up.
+"""
+
+import os
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+DEFAULT_MIN_PER_HOST = 1
+DEFAULT_MAX_PER_HOST = 4
+DEFAULT_SLOWDOWN = 2.0
+
+# Expected times below this are too noisy to judge a slowdown against
+MIN_EXPECTED_SECONDS = 1.0
+
+
+def concurrency_settings() -> Dict:
+    """Per-host bounds and slowdown threshold from the environment"""
+    settings = {
+        'min_per_host': int(os.getenv("EXTRACT_MIN_PER_HOST", DEFAULT_MIN_PER_HOST)),
+        'max_per_host': int(os.getenv("EXTRACT_MAX_PER_HOST", DEFAULT_MAX_PER_HOST)),
+        'slowdown': float(os.getenv("EXTRACT_SLOWDOWN", DEFAULT_SLOWDOWN)),
+    }
+    if not 1 <= settings['min_per_host'] <= settings['max_per_host']:
+        raise ValueError("Need 1 <= EXTRACT_MIN_PER_HOST <= EXTRACT_MAX_PER_HOST")
+    return settings
+
+
+class HostLimiter:
+    """AIMD limit on concurrent queries against one host"""
+
+    def __init__(self, host: str, min_limit: int, max_limit: int, slowdown: float):
+        self.host = host
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.slowdown = slowdown
+        self.limit = float(min_limit)
+        self.in_flight = 0
+        self.peak = min_limit
+        self.errors = 0
+        self.slow = 0
+        self.completed = 0
+        self.condition = threading.Condition()
+        self.waiting = deque()
+
+    def acquire(self):
+        """Wait for a slot - first come, first served so the scheduled order holds per host"""
+        ticket = object()
+        with self.condition:
+            self.waiting.append(ticket)
+            while self.waiting[0] is not ticket or self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.waiting.popleft()
+            self.in_flight += 1
+            self.condition.notify_all()
+
+    def release(self, seconds: float, expected_seconds: Optional[float], ok: bool):
+        """Finish a query and adjust the limit from its outcome"""
+        with self.condition:
+            self.in_flight -= 1
+            self.completed += 1
+            slow = (ok and expected_seconds is not None and expected_seconds >= MIN_EXPECTED_SECONDS
+                    and seconds > expected_seconds * self.slowdown)
+            if not ok or slow:
+                # Multiplicative decrease
+                self.errors += 0 if ok else 1
+                self.slow += 1 if slow else 0
+                self.limit = max(float(self.min_limit), self.limit / 2)
+            else:
+                # Additive increase: +1 after a full window of successes
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self.peak = max(self.peak, int(self.limit))
+            self.condition.notify_all()
+
+    def summary(self) -> str:
+        return (f"{self.host}: {self.completed} queries, limit now {int(self.limit)} (peak {self.peak}), "
+                f"{self.slow} slow, {self.errors} errors")
+
+
+class ConcurrencyController:
+    """One HostLimiter per host"""
+
+    def __init__(self, settings: Dict = None):
+        self.settings = settings or concurrency_settings()
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def limiter(self, host: str) -> HostLimiter:
+        with self.lock:
+            if host not in self.limiters:
+                self.limiters[host] = HostLimiter(
+                    host, self.settings['min_per_host'], self.settings['max_per_host'], self.settings['slowdown']
+                )
+            return self.limiters[host]
+
+    def max_workers(self, host_count: int, task_count: int) -> int:
+        """Threads needed for every host to reach its maximum"""
+        return max(1, min(task_count, host_count * self.settings['max_per_host']))
+
+    def print_summary(self):
+        """Hosts that shared queries or had trouble (single-schema hosts that went fine are left out)"""
+        for limiter in self.limiters.values():
+            if limiter.completed > 1 or limiter.errors or limiter.slow:
+                print(f"  {limiter.summary()}")
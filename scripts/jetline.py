@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Jetline reporting CLI
+
+One entry point for the reporting scripts. Each subcommand imports its modules
+(and through them mysql.connector, openpyxl, dotenv) only when it runs, so
+`--help` and report-only commands start quickly and don't need DB credentials.
+
+    python3 scripts/jetline.py extract [--remote | --tunnel] [--profile calculate_incremental_volumes]
+    python3 scripts/jetline.py compare [--aligned Volume_Alignment.json --abs-tol 50]
+    python3 scripts/jetline.py balance [--match-mode nearest]
+    python3 scripts/jetline.py performance [--periods ytd,rolling12]
+    python3 scripts/jetline.py preflight [--timeout 5]
+    python3 scripts/jetline.py audit [--query export]
+    python3 scripts/jetline.py fingerprint [--refresh]
+    python3 scripts/jetline.py bench [--sizes small,medium]
+    python3 scripts/jetline.py fake-bms build [--serials 5000]
+    python3 scripts/jetline.py ingest-billing "Xerox Billing.xlsx" [--force]
+    python3 scripts/jetline.py utilization [--if-stale]
+    python3 scripts/jetline.py anomalies [--dry-run]
+    python3 scripts/jetline.py manifest Run_Manifest_export.json [--prometheus]
+    python3 scripts/jetline.py drill-down 3135455511 --schema nscbms2
+    python3 scripts/jetline.py companies [--source webapp]
+    python3 scripts/jetline.py pipeline [--dry-run]
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+
+# Helper modules are imported by plain name, as when the scripts run directly
+sys.path.insert(0, str(SCRIPT_DIR))
+
+
+def set_profile(args):
+    """--profile STAGE: sample that run-manifest stage (or 'all' for the whole run)"""
+    if args.profile:
+        os.environ["JETLINE_PROFILE"] = args.profile
+
+
+def cmd_extract(args):
+    """BMS extract + volume/balance/coverage reports"""
+    set_profile(args)
+    if args.sort_budget_mb:
+        os.environ["VOLUME_SORT_BUDGET_MB"] = str(args.sort_budget_mb)
+    if args.workers:
+        os.environ["VOLUME_WORKERS"] = str(args.workers)
+    if args.source:
+        os.environ["READINGS_SOURCE"] = args.source
+    if args.webapp_writeback:
+        os.environ["WEBAPP_WRITEBACK"] = "true"
+    if args.remote:
+        import run_remote_export
+        run_remote_export.main()
+    elif args.tunnel:
+        import export_with_tunnel
+        export_with_tunnel.main()
+    else:
+        import export_comparison_excel
+        export_comparison_excel.main()
+
+
+def cmd_compare(args):
+    """Incremental volume comparison - or re-evaluate a saved alignment without the databases"""
+    if args.abs_tol is not None:
+        os.environ["COMPARE_ABS_TOL"] = str(args.abs_tol)
+    if args.rel_tol is not None:
+        os.environ["COMPARE_REL_TOL"] = str(args.rel_tol)
+
+    if args.aligned:
+        import volume_comparison
+        argv = [args.aligned]
+        if args.abs_tol is not None:
+            argv += ["--abs-tol", str(args.abs_tol)]
+        if args.rel_tol is not None:
+            argv += ["--rel-tol", str(args.rel_tol)]
+        if args.mismatches:
+            argv += ["--mismatches", args.mismatches]
+        volume_comparison.main(argv)
+    else:
+        import compare_volumes_fixed
+        compare_volumes_fixed.main(args.excel)
+
+
+def cmd_balance(args):
+    """Xerox Device Meters vs BMS balance recon"""
+    if args.match_mode:
+        os.environ["BALANCE_MATCH_MODE"] = args.match_mode
+    if args.interpolate:
+        os.environ["BALANCE_INTERPOLATE"] = "true"
+    if args.source:
+        os.environ["READINGS_SOURCE"] = args.source
+
+    import export_comparison_excel
+    export_comparison_excel.balance_main()
+
+
+def cmd_performance(args):
+    """Xerox performance report(s) from the monthly cube"""
+    if args.periods:
+        os.environ["PERFORMANCE_PERIODS"] = args.periods
+    if args.as_of:
+        os.environ["PERFORMANCE_AS_OF"] = args.as_of
+    set_profile(args)
+
+    import xerox_performance_report
+    xerox_performance_report.main()
+
+
+def cmd_drill_down(args):
+    """Raw readings and LAST vs MAX monthly calculation for one serial"""
+    import company_registry
+    import analyze_3135455511
+
+    company = company_registry.find_company(args.schema)
+    if not company:
+        sys.exit(f"Unknown schema '{args.schema}'")
+    analyze_3135455511.analyze_serial(args.serial, company['schema'], company['host'], args.year)
+
+
+def cmd_preflight(args):
+    """Concurrent connectivity, latency and size probe of every BMS schema"""
+    import preflight
+    argv = ["--timeout", str(args.timeout)] + (["--json", args.json] if args.json else [])
+    preflight.main(argv)
+
+
+def cmd_audit(args):
+    """EXPLAIN plan audit of the extraction queries on every BMS schema"""
+    import plan_audit
+    argv = ["--timeout", str(args.timeout)]
+    for query in args.query or []:
+        argv += ["--query", query]
+    if args.json:
+        argv += ["--json", args.json]
+    plan_audit.main(argv)
+
+
+def cmd_fingerprint(args):
+    """Server version, columns and indexes of every BMS schema (cached, re-read when they change)"""
+    import schema_fingerprint
+    argv = ["--timeout", str(args.timeout)] + (["--refresh"] if args.refresh else [])
+    schema_fingerprint.main(argv)
+
+
+def cmd_bench(args):
+    """Time and memory-profile the reporting stages on synthetic fleets"""
+    import benchmark
+    benchmark.main(args.bench_args)
+
+
+def cmd_fake_bms(args):
+    """Build the SQLite fake BMS for offline runs (BMS_BACKEND=fake)"""
+    import fake_bms
+    fake_bms.main(args.fake_bms_args)
+
+
+def cmd_ingest_billing(args):
+    """Load Xerox billing workbooks into the webapp's xerox_billings (COPY + upsert)"""
+    import xerox_ingest
+    xerox_ingest.main(args.ingest_args)
+
+
+def cmd_utilization(args):
+    """Recompute the webapp's machine_utilization snapshot (lift page metrics)"""
+    import utilization_materialize
+    utilization_materialize.main(["--if-stale"] if args.if_stale else [])
+
+
+def cmd_anomalies(args):
+    """Re-score meter reading anomalies across the fleet and flag them in the webapp"""
+    import meter_anomalies
+    meter_anomalies.main(["--dry-run"] if args.dry_run else [])
+
+
+def cmd_manifest(args):
+    """Stage times, row counts and slowest companies from a run manifest"""
+    import run_manifest
+    run_manifest.main(args.manifest_args)
+
+
+def cmd_companies(args):
+    """Company registry grouped by host, with row counts and query times from previous runs"""
+    import company_registry
+    company_registry.main(args.companies_args)
+
+
+def cmd_pipeline(args):
+    """Run only the stale pipeline stages"""
+    import pipeline
+    pipeline.main(args.pipeline_args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="jetline", description="Jetline Xerox/BMS reporting")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    extract = subparsers.add_parser("extract", help=cmd_extract.__doc__)
+    where = extract.add_mutually_exclusive_group()
+    where.add_argument("--remote", action="store_true", help="Run on the jump server (run_remote_export.py)")
+    where.add_argument("--tunnel", action="store_true", help="Run locally through an SSH tunnel (export_with_tunnel.py)")
+    extract.add_argument("--profile", metavar="STAGE", help="Sample a stage (e.g. query) or 'all'; see stage_profiler.py")
+    extract.add_argument("--sort-budget-mb", type=float,
+                         help="Compute volumes through an external sort within this memory budget (long histories)")
+    extract.add_argument("--workers", type=int, help="Compute volumes in this many processes, sharded by serial")
+    extract.add_argument("--source", choices=["bms", "webapp"],
+                         help="Read readings from the BMS schemas or the webapp's Postgres mirror (see readings_source.py)")
+    extract.add_argument("--webapp-writeback", action="store_true",
+                         help="After a publish or a webapp-sourced run, re-score anomalies and refresh utilization in the webapp")
+    extract.set_defaults(func=cmd_extract)
+
+    compare = subparsers.add_parser("compare", help=cmd_compare.__doc__)
+    compare.add_argument("--excel", help="Volumes from Xerox workbook (default: project root)")
+    compare.add_argument("--aligned", help="Re-evaluate a saved Volume_Alignment.json instead of querying BMS")
+    compare.add_argument("--abs-tol", type=float, help="Absolute difference tolerance")
+    compare.add_argument("--rel-tol", type=float, help="Relative difference tolerance (%%)")
+    compare.add_argument("--mismatches", help="With --aligned: write the mismatch set to this CSV")
+    compare.set_defaults(func=cmd_compare)
+
+    balance = subparsers.add_parser("balance", help=cmd_balance.__doc__)
+    balance.add_argument("--match-mode", choices=["latest", "nearest", "bracket"], help="BMS reading matched to the Xerox date")
+    balance.add_argument("--interpolate", action="store_true", help="Interpolate between bracketing readings (required by --match-mode bracket)")
+    balance.add_argument("--source", choices=["bms", "webapp"],
+                         help="Read readings from the BMS schemas or the webapp's Postgres mirror (see readings_source.py)")
+    balance.set_defaults(func=cmd_balance)
+
+    performance = subparsers.add_parser("performance", help=cmd_performance.__doc__)
+    performance.add_argument("--periods", help="Comma separated: ytd, rolling12, qoq, Mon-YYYY:Mon-YYYY (default: ytd)")
+    performance.add_argument("--as-of", help="Latest month to report, e.g. Nov-2025")
+    performance.add_argument("--profile", metavar="STAGE", help="Sample a stage (e.g. report_ytd) or 'all'")
+    performance.set_defaults(func=cmd_performance)
+
+    probe = subparsers.add_parser("preflight", help=cmd_preflight.__doc__)
+    probe.add_argument("--timeout", type=int, default=5, help="Connect timeout in seconds (default: 5)")
+    probe.add_argument("--json", help="Also write the results to this JSON file")
+    probe.set_defaults(func=cmd_preflight)
+
+    audit = subparsers.add_parser("audit", help=cmd_audit.__doc__)
+    audit.add_argument("--query", choices=["export", "compare"], action="append", help="Query to audit (repeatable, default: all)")
+    audit.add_argument("--timeout", type=int, default=5, help="Connect timeout in seconds (default: 5)")
+    audit.add_argument("--json", help="Also write the plans and flags to this JSON file")
+    audit.set_defaults(func=cmd_audit)
+
+    fingerprint = subparsers.add_parser("fingerprint", help=cmd_fingerprint.__doc__)
+    fingerprint.add_argument("--refresh", action="store_true", help="Re-read every schema, not only changed ones")
+    fingerprint.add_argument("--timeout", type=int, default=5, help="Connect timeout in seconds (default: 5)")
+    fingerprint.set_defaults(func=cmd_fingerprint)
+
+    drill_down = subparsers.add_parser("drill-down", help=cmd_drill_down.__doc__)
+    drill_down.add_argument("serial", help="Serial number")
+    drill_down.add_argument("--schema", default="nscbms2", help="BMS schema holding the machine (default: nscbms2)")
+    drill_down.add_argument("--year", type=int, default=2025, help="Financial year starting in March (default: 2025)")
+    drill_down.set_defaults(func=cmd_drill_down)
+
+    # Everything after "bench" / "fake-bms" / "ingest-billing" / "manifest" / "companies" / "pipeline" (including --help) is handed to that module
+    bench = subparsers.add_parser("bench", help=cmd_bench.__doc__, add_help=False)
+    bench.set_defaults(func=cmd_bench)
+
+    fake_bms = subparsers.add_parser("fake-bms", help=cmd_fake_bms.__doc__, add_help=False)
+    fake_bms.set_defaults(func=cmd_fake_bms)
+
+    ingest = subparsers.add_parser("ingest-billing", help=cmd_ingest_billing.__doc__, add_help=False)
+    ingest.set_defaults(func=cmd_ingest_billing)
+
+    utilization = subparsers.add_parser("utilization", help=cmd_utilization.__doc__)
+    utilization.add_argument("--if-stale", action="store_true",
+                             help="Only recompute when a sync completed since the last snapshot (e.g. cron after the webapp sync)")
+    utilization.set_defaults(func=cmd_utilization)
+
+    anomalies = subparsers.add_parser("anomalies", help=cmd_anomalies.__doc__)
+    anomalies.add_argument("--dry-run", action="store_true", help="Detect and report without writing flags")
+    anomalies.set_defaults(func=cmd_anomalies)
+
+    manifest = subparsers.add_parser("manifest", help=cmd_manifest.__doc__, add_help=False)
+    manifest.set_defaults(func=cmd_manifest)
+
+    companies = subparsers.add_parser("companies", help=cmd_companies.__doc__, add_help=False)
+    companies.set_defaults(func=cmd_companies)
+
+    pipeline = subparsers.add_parser("pipeline", help=cmd_pipeline.__doc__, add_help=False)
+    pipeline.set_defaults(func=cmd_pipeline)
+
+    args, extra = parser.parse_known_args(argv)
+    if args.command == "bench":
+        args.bench_args = extra
+    elif args.command == "fake-bms":
+        args.fake_bms_args = extra
+    elif args.command == "ingest-billing":
+        args.ingest_args = extra
+    elif args.command == "manifest":
+        args.manifest_args = extra
+    elif args.command == "companies":
+        args.companies_args = extra
+    elif args.command == "pipeline":
+        args.pipeline_args = extra
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
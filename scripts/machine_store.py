@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Indexed BMS machine-info store
+
+The export writes one row per serial (model, status, category, install date,
+company, last reading date, last balance) into a small SQLite file keyed by
+serial. Rows are only rewritten when their attributes change; each change bumps
+the row's version and keeps the superseded attributes in machine_history.
+Reports open the store and fetch just the serials they need.
+
+The webapp seed still reads the flat JSON format; write it on demand with:
+    python3 scripts/machine_store.py bms_machine_info.db --json bms_machine_info.json
+"""
+
+import argparse
+import json
+import sqlite3
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+STORE_VERSION = 1
+
+ATTRIBUTES = ('model', 'status', 'category', 'install_date', 'company', 'last_reading_date', 'last_balance')
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS machines (
+    serial TEXT PRIMARY KEY,
+    {', '.join(f'{name} {"REAL" if name == "last_balance" else "TEXT"}' for name in ATTRIBUTES)},
+    version INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS machine_history (
+    serial TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    {', '.join(f'{name} {"REAL" if name == "last_balance" else "TEXT"}' for name in ATTRIBUTES)},
+    superseded_at TEXT NOT NULL,
+    PRIMARY KEY (serial, version)
+);
+"""
+
+# SQLite caps bound parameters per statement (999 on older builds)
+LOOKUP_CHUNK = 500
+
+
+def stored_value(name: str, value):
+    """An attribute as SQLite hands it back (REAL last_balance, TEXT otherwise), so comparisons are like for like"""
+    if value is None:
+        return None
+    return float(value) if name == 'last_balance' else str(value)
+
+
+def date_str(value) -> Optional[str]:
+    """Date/datetime (or string) → 'YYYY-MM-DD'"""
+    if not value:
+        return None
+    return value.strftime("%Y-%m-%d") if hasattr(value, 'strftime') else str(value)[:10]
+
+
+def machine_rows(raw_results: List[Tuple]) -> Dict[str, Dict]:
+    """Latest attributes per serial from the BMS query rows
+
+    raw_results structure:
+    (serial, model, status, date, category, install_date, datetime, total, a3, black, large, colour, xl, meterreadingid, meterreading_no, company)
+    """
+    machines = {}
+    latest = {}
+
+    for row in raw_results:
+        serial = row[0]
+        if not serial:
+            continue
+
+        # Same order as the export query: reading date, then capture time (a later-captured backdated
+        # correction doesn't overtake a newer reading)
+        reading_key = (row[3] or date.min, row[6] or datetime.min)
+        if serial in machines and reading_key <= latest[serial]:
+            continue
+
+        latest[serial] = reading_key
+        machines[serial] = {
+            'model': row[1],
+            'status': row[2],
+            'category': row[4],
+            'install_date': date_str(row[5]),
+            'company': row[15],  # company name is appended at the end
+            'last_reading_date': date_str(row[3]),
+            'last_balance': float(row[7]) if row[7] is not None else None
+        }
+
+    return machines
+
+
+class MachineStore:
+    """SQLite machine-info store keyed by serial"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        version = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if version and int(version['value']) != STORE_VERSION:
+            raise ValueError(f"{self.path} is store version {version['value']}, expected {STORE_VERSION}")
+        self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', ?)", (str(STORE_VERSION),))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def upsert(self, machines: Dict[str, Dict]) -> Dict[str, int]:
+        """Insert new serials and update changed ones; unchanged rows are left alone
+
+        Returns counts: {'inserted', 'updated', 'unchanged'}
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        existing = self.get_many(machines.keys(), include_version=True)
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+
+        columns = ', '.join(ATTRIBUTES)
+        placeholders = ', '.join('?' for _ in ATTRIBUTES)
+        assignments = ', '.join(f"{name} = ?" for name in ATTRIBUTES)
+
+        with self.conn:
+            for serial, attrs in machines.items():
+                values = [stored_value(name, attrs.get(name)) for name in ATTRIBUTES]
+                current = existing.get(serial)
+                if current is None:
+                    self.conn.execute(
+                        f"INSERT INTO machines (serial, {columns}, version, updated_at) VALUES (?, {placeholders}, 1, ?)",
+                        [serial] + values + [now]
+                    )
+                    counts['inserted'] += 1
+                elif [current[name] for name in ATTRIBUTES] != values:
+                    self.conn.execute(
+                        f"INSERT INTO machine_history (serial, version, {columns}, superseded_at) VALUES (?, ?, {placeholders}, ?)",
+                        [serial, current['version']] + [current[name] for name in ATTRIBUTES] + [now]
+                    )
+                    self.conn.execute(
+                        f"UPDATE machines SET {assignments}, version = version + 1, updated_at = ? WHERE serial = ?",
+                        values + [now, serial]
+                    )
+                    counts['updated'] += 1
+                else:
+                    counts['unchanged'] += 1
+
+            # Leave the file untouched when nothing changed so downstream caches stay valid
+            if counts['inserted'] or counts['updated']:
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_export', ?)", (now,))
+
+        return counts
+
+    def serials(self) -> List[str]:
+        """All serials in the store (primary key scan only)"""
+        return [row[0] for row in self.conn.execute("SELECT serial FROM machines")]
+
+    def get(self, serial: str) -> Optional[Dict]:
+        """Attributes of one serial, or None"""
+        return self.get_many([serial]).get(serial)
+
+    def get_many(self, serials: Iterable[str], include_version: bool = False) -> Dict[str, Dict]:
+        """Attributes of the requested serials that exist in the store"""
+        serials = list(serials)
+        fields = ATTRIBUTES + (('version',) if include_version else ())
+        result = {}
+        for i in range(0, len(serials), LOOKUP_CHUNK):
+            chunk = serials[i:i + LOOKUP_CHUNK]
+            rows = self.conn.execute(
+                f"SELECT serial, {', '.join(fields)} FROM machines WHERE serial IN ({', '.join('?' for _ in chunk)})",
+                chunk
+            )
+            for row in rows:
+                result[row['serial']] = {name: row[name] for name in fields}
+        return result
+
+    def history(self, serial: str) -> List[Dict]:
+        """Superseded attribute versions of one serial, oldest first"""
+        rows = self.conn.execute(
+            f"SELECT version, {', '.join(ATTRIBUTES)}, superseded_at FROM machine_history WHERE serial = ? ORDER BY version",
+            (serial,)
+        )
+        return [dict(row) for row in rows]
+
+    def revision(self) -> Optional[str]:
+        """Timestamp of the last export that changed the store"""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'last_export'").fetchone()
+        return row['value'] if row else None
+
+
+    def export_json(self, output_path) -> int:
+        """Write the legacy flat bms_machine_info.json (read by the webapp seed)"""
+        rows = self.conn.execute(f"SELECT serial, {', '.join(ATTRIBUTES)} FROM machines ORDER BY serial")
+        data = {
+            row['serial']: {
+                'category': row['category'],
+                'install_date': row['install_date'],
+                'bms_company': row['company'],
+                'model_name': row['model']
+            }
+            for row in rows
+        }
+        with open(output_path, 'w') as f:
+            json.dump(data, f)
+        return len(data)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Inspect or export the BMS machine info store")
+    parser.add_argument("store", help="Path to bms_machine_info.db")
+    parser.add_argument("--json", help="Write the legacy bms_machine_info.json for the webapp seed")
+    parser.add_argument("--serial", help="Show one serial's current attributes and history")
+    args = parser.parse_args(argv)
+
+    with MachineStore(args.store) as store:
+        if args.json:
+            count = store.export_json(args.json)
+            print(f"✓ Machine info exported: {args.json} ({count} serials)")
+        if args.serial:
+            print(json.dumps({'current': store.get(args.serial), 'history': store.history(args.serial)}, indent=2))
+        if not args.json and not args.serial:
+            print(f"{len(store.serials())} serials, last changed {store.revision() or 'never'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Fleet-wide meter reading anomaly detection with bulk flagging
+
+Readings tagged is_anomaly are left out of the webapp's performance
+aggregation. This job re-scores every active machine's readings in the
+webapp's PostgreSQL (DATABASE_URL, needs psycopg2) in one streaming pass -
+the server sorts them by machine and date, and each machine's history is
+checked as it arrives - and writes the flags back in bulk with a reason code
+in anomaly_reason:
+
+    RESET         total fell to under RESET_RATIO of the last good reading (meter replaced/reset)
+    ROLLBACK      total went backwards without a reset
+    SPIKE         daily movement over SPIKE_FACTOR × the machine's median and over SPIKE_MIN_MOVEMENT
+    SUBMETER      a sub-meter exceeds the total, or went backwards while the total moved forward
+    DUPLICATE_NO  meterreading_no already used by an earlier reading of the machine
+
+Movement is measured from the last good reading, so one bad reading flags
+once rather than twice (the reading after a spike isn't a rollback). A
+rollback or spike that the next reading confirms becomes the new baseline.
+
+Flags the detector set before and no longer finds are cleared; manual tags
+(no reason) are kept, and readings untagged in the webapp (DISMISSED) are
+never flagged again.
+
+With WEBAPP_WRITEBACK=true (or `jetline extract --webapp-writeback`) the
+export re-scores after its publish and on READINGS_SOURCE=webapp runs;
+otherwise, and after a webapp sync, schedule `jetline anomalies`.
+"""
+
+import argparse
+import statistics
+import time
+from collections import Counter
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from readings_source import ITERSIZE, connect_webapp
+from webapp_publish import CsvStream
+
+RESET_RATIO = 0.1
+SPIKE_FACTOR = 10
+# Same floor as the webapp's anomalies page (ABS_THRESHOLD)
+SPIKE_MIN_MOVEMENT = 7500
+# Movements needed before a machine's median is trusted for spikes
+MIN_HISTORY = 3
+
+# Reason codes the detector sets (and may clear again); the webapp writes DISMISSED on untag
+REASONS = ('RESET', 'ROLLBACK', 'SPIKE', 'SUBMETER', 'DUPLICATE_NO')
+
+READINGS_QUERY = """
+SELECT r.id, r.machine_id, r.bms_meterreading_no, r.reading_date,
+       r.total, r.a3, r.black, r.large, r.colour, r.extra_large
+FROM meter_readings r
+JOIN machines m ON m.id = r.machine_id
+WHERE m.status = 'ACTIVE'
+ORDER BY r.machine_id, r.reading_date, r.reading_datetime NULLS FIRST, r.bms_meterreading_id
+"""
+
+CREATE_STAGING = """
+CREATE TEMPORARY TABLE meter_anomaly_staging (
+    id text PRIMARY KEY,
+    reason text NOT NULL
+) ON COMMIT DROP
+"""
+
+# Untagged readings (unless dismissed), and the detector's own flags whose reason changed - never manual tags
+FLAG = """
+UPDATE meter_readings r SET is_anomaly = true, anomaly_reason = s.reason
+FROM meter_anomaly_staging s
+WHERE r.id = s.id
+    AND r.anomaly_reason IS DISTINCT FROM 'DISMISSED'
+    AND (NOT r.is_anomaly OR (r.anomaly_reason = ANY(%s) AND r.anomaly_reason <> s.reason))
+"""
+
+# Only the detector's own flags on the machines just scanned
+CLEAR = """
+UPDATE meter_readings r SET is_anomaly = false, anomaly_reason = NULL
+FROM machines m
+WHERE m.id = r.machine_id AND m.status = 'ACTIVE'
+    AND r.anomaly_reason = ANY(%s)
+    AND NOT EXISTS (SELECT 1 FROM meter_anomaly_staging s WHERE s.id = r.id)
+"""
+
+
+def submeter_inconsistent(reading: Tuple, previous: Tuple) -> bool:
+    """A sub-meter above the total, or moving backwards while the total moved forward"""
+    total, subs = reading[4], reading[5:10]
+    if any(sub is not None and sub > total for sub in subs):
+        return True
+    if previous is not None and total > previous[4]:
+        return any(sub is not None and before is not None and sub < before
+                   for sub, before in zip(subs, previous[5:10]))
+    return False
+
+
+def daily_movement(reading: Tuple, previous: Tuple) -> float:
+    return (reading[4] - previous[4]) / max((reading[3] - previous[3]).days, 1)
+
+
+def machine_anomalies(readings: List[Tuple]) -> Iterator[Tuple[str, str]]:
+    """(reading id, reason) for one machine's readings, oldest first"""
+    seen_numbers = set()
+    candidates = []
+    for reading in readings:
+        number = reading[2]
+        if number and number in seen_numbers:
+            yield reading[0], 'DUPLICATE_NO'
+            continue
+        if number:
+            seen_numbers.add(number)
+        candidates.append(reading)
+
+    # The machine's typical pace, from its forward movements
+    rates = [daily_movement(r, p) for p, r in zip(candidates, candidates[1:]) if r[4] > p[4]]
+    spike_rate = SPIKE_FACTOR * statistics.median(rates) if len(rates) >= MIN_HISTORY else None
+
+    baseline = None
+    for i, reading in enumerate(candidates):
+        if baseline is None:
+            baseline = reading
+            continue
+        following = candidates[i + 1] if i + 1 < len(candidates) else None
+        movement = reading[4] - baseline[4]
+
+        if movement < 0:
+            if reading[4] < baseline[4] * RESET_RATIO:
+                yield reading[0], 'RESET'
+                baseline = reading
+            else:
+                yield reading[0], 'ROLLBACK'
+                if following is not None and following[4] < baseline[4]:
+                    baseline = reading
+            continue
+
+        if (spike_rate is not None and movement > SPIKE_MIN_MOVEMENT
+                and daily_movement(reading, baseline) > spike_rate):
+            yield reading[0], 'SPIKE'
+            if following is not None and following[4] >= reading[4]:
+                baseline = reading
+            continue
+
+        if submeter_inconsistent(reading, baseline):
+            yield reading[0], 'SUBMETER'
+        baseline = reading
+
+
+def detect(rows: Iterable[Tuple]) -> Iterator[Tuple[str, str]]:
+    """(reading id, reason) over READINGS_QUERY rows (sorted by machine)"""
+    for _, readings in groupby(rows, key=lambda row: row[1]):
+        yield from machine_anomalies(list(readings))
+
+
+def rescore(database_url: str = None, dry_run: bool = False) -> Dict:
+    """Detect across the fleet and write the flags back in one transaction
+
+    Returns {'readings', 'flagged', 'cleared', 'by_reason', 'seconds'}.
+    """
+    start = time.time()
+    counts = Counter()
+
+    def tally(rows):
+        for row in rows:
+            counts['readings'] += 1
+            yield row
+
+    conn = connect_webapp(database_url)
+    try:
+        with conn:
+            # A named cursor is a server-side cursor: rows arrive ITERSIZE at a time
+            cursor = conn.cursor(name="jetline_anomalies")
+            cursor.itersize = ITERSIZE
+            cursor.execute(READINGS_QUERY)
+            flags = []
+            for reading_id, reason in detect(tally(cursor)):
+                counts[reason] += 1
+                flags.append((reading_id, reason))
+            cursor.close()
+
+            flagged = cleared = 0
+            if not dry_run:
+                cursor = conn.cursor()
+                cursor.execute(CREATE_STAGING)
+                cursor.copy_expert("COPY meter_anomaly_staging (id, reason) FROM STDIN WITH (FORMAT csv)",
+                                   CsvStream(flags))
+                cursor.execute(FLAG, (list(REASONS),))
+                flagged = cursor.rowcount
+                cursor.execute(CLEAR, (list(REASONS),))
+                cleared = cursor.rowcount
+                cursor.close()
+    finally:
+        conn.close()
+
+    return {'readings': counts['readings'], 'flagged': flagged, 'cleared': cleared,
+            'by_reason': {reason: counts[reason] for reason in REASONS if counts[reason]},
+            'seconds': round(time.time() - start, 1)}
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Re-score meter reading anomalies across the fleet")
+    parser.add_argument("--dry-run", action="store_true", help="Detect and report without writing flags")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    result = rescore(dry_run=args.dry_run)
+    reasons = ", ".join(f"{reason} {result['by_reason'].get(reason, 0):,}" for reason in REASONS)
+    print(f"✓ {result['readings']:,} readings scored in {result['seconds']}s: {reasons}")
+    if not args.dry_run:
+        print(f"  {result['flagged']:,} readings newly flagged, {result['cleared']:,} flags cleared")
+
+
+if __name__ == "__main__":
+    main()
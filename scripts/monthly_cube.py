@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Monthly volume cube for the Xerox performance report
+
+The Xerox volumes export is aggregated once into serial × month × meter type
+cells, rolled up by BMS company, category and model, and persisted to JSON.
+Reports for any period (financial YTD, rolling 12 months, quarter-over-quarter,
+explicit month ranges) are then served from the cube. The cube is only rebuilt
+when the volumes file or the BMS machine info store changes.
+"""
+
+import json
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from serial_keys import canonical_serial, build_serial_index, resolve_serial
+from machine_store import MachineStore
+
+CUBE_VERSION = 1
+
+METER_TYPES = ('a3_mono', 'a4_mono', 'a3_color', 'a4_color', 'total')
+TOTAL = METER_TYPES.index('total')
+
+ROLLUP_DIMENSIONS = ('company', 'category', 'model')
+
+# Jetline financial year starts in March
+FINANCIAL_YEAR_START_MONTH = 3
+
+
+def parse_month(label) -> Optional[datetime]:
+    """'Mar-2025' (or a date cell) → first day of that month"""
+    if hasattr(label, 'strftime'):
+        return datetime(label.year, label.month, 1)
+    try:
+        return datetime.strptime(str(label).strip(), "%b-%Y")
+    except ValueError:
+        return None
+
+
+def month_label(month: datetime) -> str:
+    """First-of-month datetime → 'Mar-2025'"""
+    return month.strftime("%b-%Y")
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    """Shift a first-of-month datetime by count months"""
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def month_range(start: datetime, end: datetime) -> List[str]:
+    """Inclusive list of month labels from start to end"""
+    months = []
+    current = start
+    while current <= end:
+        months.append(month_label(current))
+        current = add_months(current, 1)
+    return months
+
+
+def source_fingerprint(*paths) -> Dict:
+    """Size + mtime of each input file - enough to tell when the cube is stale"""
+    fingerprint = {}
+    for path in paths:
+        path = Path(path)
+        if path.exists():
+            stat = path.stat()
+            fingerprint[path.name] = [stat.st_size, int(stat.st_mtime)]
+        else:
+            fingerprint[path.name] = None
+    return fingerprint
+
+
+def build_cube(volumes_path: str, store: Optional[MachineStore]) -> Dict:
+    """Aggregate the Xerox volumes export into the monthly cube"""
+    import openpyxl
+
+    wb = openpyxl.load_workbook(volumes_path, read_only=True, data_only=True)
+    ws = wb.active
+
+    serials = {}
+    cells = defaultdict(lambda: defaultdict(lambda: [0] * len(METER_TYPES)))
+
+    for row in ws.iter_rows(min_row=2, values_only=True):
+        customer, model, serial, month_year, a3_mono, a4_mono, a3_color, a4_color, total = row[:9]
+        serial = canonical_serial(serial)
+        month = parse_month(month_year) if month_year else None
+        if not serial:
+            continue
+
+        if serial not in serials:
+            serials[serial] = {'customer': customer, 'product': model}
+
+        if month:
+            cell = cells[serial][month_label(month)]
+            for i, value in enumerate((a3_mono, a4_mono, a3_color, a4_color, total)):
+                cell[i] += value or 0
+
+    # Fetch BMS attributes for just the Xerox serials
+    resolved = {}
+    if store:
+        bms_index = build_serial_index(store.serials())
+        resolved = {serial: resolve_serial(bms_index, serial) for serial in serials}
+    machines = store.get_many({s for s in resolved.values() if s}) if store else {}
+    for serial, info in serials.items():
+        machine = machines.get(resolved.get(serial), {})
+        info['company'] = machine.get('company') or ''
+        info['category'] = machine.get('category') or ''
+        info['install_date'] = machine.get('install_date') or ''
+
+    months = sorted({m for by_month in cells.values() for m in by_month}, key=parse_month)
+
+    # Roll up by company, category and model (product)
+    rollups = {dim: defaultdict(lambda: defaultdict(lambda: [0] * len(METER_TYPES))) for dim in ROLLUP_DIMENSIONS}
+    machine_counts = {dim: defaultdict(int) for dim in ROLLUP_DIMENSIONS}
+    for serial, info in serials.items():
+        groups = {'company': info['company'], 'category': info['category'], 'model': info['product']}
+        for dim in ROLLUP_DIMENSIONS:
+            group = groups[dim] or 'Unknown'
+            machine_counts[dim][group] += 1
+            target = rollups[dim][group]
+            by_month = cells.get(serial, {})
+            for month, values in by_month.items():
+                for i, value in enumerate(values):
+                    target[month][i] += value
+
+    return {
+        'version': CUBE_VERSION,
+        'months': months,
+        'serials': serials,
+        'cells': {s: dict(by_month) for s, by_month in cells.items()},
+        'rollups': {dim: {g: dict(m) for g, m in groups.items()} for dim, groups in rollups.items()},
+        'machine_counts': {dim: dict(counts) for dim, counts in machine_counts.items()}
+    }
+
+
+def load_or_build_cube(cube_path: str, volumes_path: str, store_path: str) -> Dict:
+    """Load the persisted cube if its sources are unchanged, otherwise rebuild and persist it"""
+    store = MachineStore(store_path) if Path(store_path).exists() else None
+    fingerprint = source_fingerprint(volumes_path)
+    fingerprint['machine_store'] = store.revision() if store else None
+
+    if Path(cube_path).exists():
+        with open(cube_path, 'r') as f:
+            cube = json.load(f)
+        if cube.get('version') == CUBE_VERSION and cube.get('sources') == fingerprint:
+            print(f"  ✓ Cube up to date: {cube_path}")
+            if store:
+                store.close()
+            return cube
+
+    print("  Building monthly cube...")
+    cube = build_cube(volumes_path, store)
+    if store:
+        store.close()
+    cube['sources'] = fingerprint
+    with open(cube_path, 'w') as f:
+        json.dump(cube, f)
+    print(f"  ✓ Cube saved: {cube_path} ({len(cube['serials'])} serials, {len(cube['months'])} months)")
+    return cube
+
+
+def period_name(spec: str) -> str:
+    """Name a period spec resolves to (the report's file suffix) - no cube needed"""
+    spec = spec.strip()
+    if ':' in spec:
+        start, end = (parse_month(part) for part in spec.split(':', 1))
+        if not start or not end:
+            raise ValueError(f"Invalid month range: {spec}")
+        return f"{month_label(start)}_to_{month_label(end)}"
+    return spec
+
+
+def resolve_period(spec: str, cube: Dict, as_of: str = None) -> Dict:
+    """Turn a period spec into {name, label, months, previous_months}
+
+    Specs:
+      ytd        financial year to date (March → latest month)
+      rolling12  last 12 months
+      qoq        last complete financial quarter vs the one before
+      Mar-2025:Nov-2025  explicit inclusive range
+    """
+    latest = parse_month(as_of) if as_of else (parse_month(cube['months'][-1]) if cube['months'] else None)
+    if not latest:
+        raise ValueError("Cube has no months - cannot resolve a reporting period")
+
+    spec = spec.strip()
+    if ':' in spec:
+        start, end = (parse_month(part) for part in spec.split(':', 1))
+        return {'name': period_name(spec), 'label': 'Period Volume', 'months': month_range(start, end),
+                'previous_months': None}
+
+    if spec == 'ytd':
+        fy_year = latest.year if latest.month >= FINANCIAL_YEAR_START_MONTH else latest.year - 1
+        start = datetime(fy_year, FINANCIAL_YEAR_START_MONTH, 1)
+        return {'name': 'ytd', 'label': 'YTD Volume', 'months': month_range(start, latest), 'previous_months': None}
+
+    if spec == 'rolling12':
+        start = add_months(latest, -11)
+        return {'name': 'rolling12', 'label': 'Rolling 12M Volume', 'months': month_range(start, latest),
+                'previous_months': month_range(add_months(start, -12), add_months(latest, -12))}
+
+    if spec == 'qoq':
+        # Financial quarters start in March, June, September and December
+        offset = (latest.month - FINANCIAL_YEAR_START_MONTH) % 3
+        quarter_end = latest if offset == 2 else add_months(latest, -(offset + 1))
+        start = add_months(quarter_end, -2)
+        return {'name': 'qoq', 'label': 'Quarter Volume', 'months': month_range(start, quarter_end),
+                'previous_months': month_range(add_months(start, -3), add_months(start, -1))}
+
+    raise ValueError(f"Unknown period '{spec}' (use ytd, rolling12, qoq or Mon-YYYY:Mon-YYYY)")
+
+
+def serial_volumes(cube: Dict, serial: str, months: List[str], meter: int = TOTAL) -> List[float]:
+    """Monthly volumes of one serial for the given months"""
+    by_month = cube['cells'].get(serial, {})
+    return [by_month[m][meter] if m in by_month else 0 for m in months]
+
+
+def rollup_totals(cube: Dict, dimension: str, months: List[str]) -> Dict:
+    """Per-group totals by meter type over the given months: {group: [a3_mono, a4_mono, a3_color, a4_color, total]}"""
+    totals = {}
+    for group, by_month in cube['rollups'][dimension].items():
+        sums = [0] * len(METER_TYPES)
+        for month in months:
+            for i, value in enumerate(by_month.get(month, ())):
+                sums[i] += value
+        totals[group] = sums
+    return totals
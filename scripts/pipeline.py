@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Dependency-aware pipeline runner for the reporting scripts
+
+Each stage declares the files it reads and writes. Inputs (including the stage's
+own scripts and the environment settings it reads) are fingerprinted, and a stage
+only re-runs when a fingerprint changed, one of its outputs is missing or was
+modified since the last run, or it is forced. Stages whose inputs are ready run
+in parallel. Each run writes Run_Manifest_pipeline.json with every stage's
+outcome and time (stages that write their own manifest add their peak RSS).
+
+The BMS databases themselves can't be fingerprinted - force a fresh extract with
+--force extract.
+
+Usage:
+    python3 scripts/pipeline.py                  # run whatever is stale
+    python3 scripts/pipeline.py performance      # run one stage (and stale upstream stages)
+    python3 scripts/pipeline.py --force extract  # re-extract even if inputs are unchanged
+    python3 scripts/pipeline.py --dry-run        # show what would run
+    python3 scripts/pipeline.py --force extract --profile query   # sample one stage (or 'all')
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from run_manifest import RunManifest, load_manifest
+
+SCRIPT_DIR = Path(__file__).parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+STATE_PATH = PROJECT_ROOT / "Pipeline_State.json"
+
+STATE_VERSION = 1
+
+VOLUMES = "Volumes from Xerox.xlsx"
+DEVICE_METERS = "Device Current Meters based on last Reading Date.xlsx"
+BILLING = "Xerox Billing.xlsx"
+MACHINE_STORE = "bms_machine_info.db"
+
+
+def performance_outputs() -> List[str]:
+    """Report files written for the configured PERFORMANCE_PERIODS (see xerox_performance_report.py)"""
+    # Named the way the report names them (month ranges in canonical Mon-YYYY form)
+    from monthly_cube import period_name
+
+    outputs = []
+    for spec in os.getenv("PERFORMANCE_PERIODS", "ytd").split(","):
+        if not spec.strip():
+            continue
+        try:
+            name = period_name(spec)
+        except ValueError:
+            # The performance stage reports the bad spec when it runs
+            continue
+        outputs.append("Xerox_Performance_Report.xlsx" if name == 'ytd' else f"Xerox_Performance_Report_{name}.xlsx")
+    return outputs
+
+
+def build_stages() -> Dict[str, Dict]:
+    """Stage definitions: command, input/optional files (relative to the project root), outputs, env settings"""
+    extract_script = "export_comparison_excel.py" if os.getenv("PIPELINE_EXTRACT") == "local" else "run_remote_export.py"
+    export_modules = ["export_comparison_excel.py", "balance_matching.py", "coverage_recon.py", "serial_keys.py",
+                      "run_delta.py", "volume_comparison.py", "machine_store.py", "company_registry.py",
+                      "bms_companies.json", "host_concurrency.py", "preflight.py", "run_manifest.py", "stage_profiler.py",
+                      "fake_bms.py", "external_sort.py", "webapp_publish.py",
+                      "readings_source.py", "xerox_ingest.py", "utilization_materialize.py",
+                      "meter_anomalies.py"]
+
+    return {
+        'extract': {
+            'description': "Extract BMS readings and write the comparison, balance and coverage reports",
+            'command': [sys.executable, str(SCRIPT_DIR / extract_script)],
+            'inputs': [VOLUMES] + [f"scripts/{m}" for m in export_modules + ["run_remote_export.py"]],
+            'optional': [DEVICE_METERS, BILLING],
+            'outputs': ["Volume_Comparison_Report.xlsx", MACHINE_STORE],
+            'env': ["PIPELINE_EXTRACT", "BALANCE_MATCH_MODE", "BALANCE_INTERPOLATE", "COMPANY_REGISTRY", "EXTRACT_PREFLIGHT",
+                    "READINGS_SOURCE", "READINGS_SINCE", "BILLING_SOURCE", "BMS_BACKEND", "FAKE_BMS_DIR",
+                    "WEBAPP_WRITEBACK"],
+            'manifest': "Run_Manifest_export.json",
+        },
+        'performance': {
+            'description': "Build the Xerox performance report(s) from the monthly cube",
+            'command': [sys.executable, str(SCRIPT_DIR / "xerox_performance_report.py")],
+            'inputs': [
+                VOLUMES, DEVICE_METERS, MACHINE_STORE,
+                "Color MTTR by Product and Site.xlsx", "Mono MTTR by Product and Site.xlsx",
+                "Color Utilization by Product and Site.xlsx", "Mono Utilization by Product and Site.xlsx",
+                "scripts/xerox_performance_report.py", "scripts/monthly_cube.py",
+                "scripts/serial_keys.py", "scripts/machine_store.py", "scripts/run_manifest.py",
+                "scripts/stage_profiler.py",
+            ],
+            'optional': [],
+            'outputs': performance_outputs(),
+            'env': ["PERFORMANCE_PERIODS", "PERFORMANCE_AS_OF"],
+            'manifest': "Run_Manifest_performance.json",
+        },
+        'seed-json': {
+            'description': "Export the machine info store as bms_machine_info.json for the webapp seed",
+            'command': [sys.executable, str(SCRIPT_DIR / "machine_store.py"), MACHINE_STORE, "--json", "bms_machine_info.json"],
+            'inputs': [MACHINE_STORE, "scripts/machine_store.py"],
+            'optional': [],
+            'outputs': ["bms_machine_info.json"],
+            'env': [],
+        },
+    }
+
+
+def file_hash(path: Path) -> Optional[str]:
+    """SHA-1 of a file's contents (None if missing)"""
+    if not path.exists():
+        return None
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def upstream_stages(stages: Dict[str, Dict]) -> Dict[str, List[str]]:
+    """Stages each stage depends on (producers of any of its inputs)"""
+    producers = {output: name for name, stage in stages.items() for output in stage['outputs']}
+    return {
+        name: sorted({producers[f] for f in stage['inputs'] + stage['optional'] if f in producers and producers[f] != name})
+        for name, stage in stages.items()
+    }
+
+
+def stage_fingerprint(stage: Dict) -> Dict:
+    """Fingerprint of everything a stage reads"""
+    return {
+        'command': stage['command'][1:],
+        'inputs': {f: file_hash(PROJECT_ROOT / f) for f in stage['inputs'] + stage['optional']},
+        'env': {var: os.getenv(var) for var in stage['env']},
+    }
+
+
+def stale_reason(stage: Dict, previous: Optional[Dict]) -> Optional[str]:
+    """Why a stage needs to run, or None if its outputs are current"""
+    if not previous:
+        return "never run"
+    fingerprint = stage_fingerprint(stage)
+    for f, digest in fingerprint['inputs'].items():
+        if previous['fingerprint']['inputs'].get(f) != digest:
+            return f"input changed: {f}"
+    if fingerprint['env'] != previous['fingerprint']['env']:
+        return "settings changed"
+    if fingerprint['command'] != previous['fingerprint']['command']:
+        return "command changed"
+    for f in stage['outputs']:
+        digest = file_hash(PROJECT_ROOT / f)
+        if digest is None:
+            return f"output missing: {f}"
+        if previous['outputs'].get(f) != digest:
+            return f"output modified: {f}"
+    return None
+
+
+def load_state() -> Dict:
+    if not STATE_PATH.exists():
+        return {}
+    with open(STATE_PATH, 'r') as f:
+        data = json.load(f)
+    return data.get('stages', {}) if data.get('version') == STATE_VERSION else {}
+
+
+def save_state(state: Dict):
+    with open(STATE_PATH, 'w') as f:
+        json.dump({'version': STATE_VERSION, 'stages': state}, f, indent=2)
+
+
+def child_peak_rss(stage: Dict, started: float) -> Optional[float]:
+    """Peak RSS from the manifest the stage's script wrote during this run (if it writes one)"""
+    path = PROJECT_ROOT / stage['manifest'] if stage.get('manifest') else None
+    if not path or not path.exists() or path.stat().st_mtime < started:
+        return None
+    try:
+        return load_manifest(path).get('peak_rss_mb')
+    except (OSError, ValueError):
+        return None
+
+
+def run_stage(name: str, stage: Dict) -> Dict:
+    """Run one stage as a subprocess and fingerprint its inputs/outputs"""
+    missing = [f for f in stage['inputs'] if not (PROJECT_ROOT / f).exists()]
+    if missing:
+        return {'ok': False, 'output': f"Missing inputs: {', '.join(missing)}", 'seconds': 0}
+
+    # Fingerprint inputs before running so edits made during the run trigger the next one
+    fingerprint = stage_fingerprint(stage)
+    start = time.time()
+    result = subprocess.run(stage['command'], cwd=PROJECT_ROOT, capture_output=True, text=True)
+    seconds = time.time() - start
+
+    output = result.stdout + result.stderr
+    peak_rss_mb = child_peak_rss(stage, start)
+    missing = [f for f in stage['outputs'] if not (PROJECT_ROOT / f).exists()]
+    if result.returncode != 0 or missing:
+        if missing:
+            output += f"\nExpected outputs not written: {', '.join(missing)}"
+        return {'ok': False, 'output': output, 'seconds': seconds, 'peak_rss_mb': peak_rss_mb}
+
+    return {
+        'ok': True,
+        'output': output,
+        'seconds': seconds,
+        'peak_rss_mb': peak_rss_mb,
+        'state': {
+            'fingerprint': fingerprint,
+            'outputs': {f: file_hash(PROJECT_ROOT / f) for f in stage['outputs']},
+            'finished_at': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'seconds': round(seconds, 1),
+        },
+    }
+
+
+def select_stages(stages: Dict[str, Dict], upstream: Dict[str, List[str]], targets: List[str]) -> List[str]:
+    """Requested stages plus everything upstream of them, in definition order"""
+    selected = set()
+    pending = list(targets or stages.keys())
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(upstream[name])
+    return [name for name in stages if name in selected]
+
+
+def run_pipeline(targets: List[str], force: List[str], dry_run: bool, jobs: int) -> bool:
+    stages = build_stages()
+    for name in targets + force:
+        if name not in stages:
+            raise SystemExit(f"Unknown stage '{name}' (stages: {', '.join(stages)})")
+
+    upstream = upstream_stages(stages)
+    selected = select_stages(stages, upstream, targets)
+    state = load_state()
+
+    if dry_run:
+        # Without running anything, a stage is also stale when an upstream stage will run
+        will_run = set()
+        for name in selected:
+            reason = "forced" if name in force else stale_reason(stages[name], state.get(name))
+            if not reason and any(u in will_run for u in upstream[name]):
+                reason = "upstream will run"
+            if reason:
+                will_run.add(name)
+            print(f"  {'RUN ' if reason else 'SKIP'} {name:<12} {reason or 'up to date'}")
+        return True
+
+    manifest = RunManifest("pipeline", PROJECT_ROOT)
+    try:
+        return run_selected(stages, upstream, selected, state, force, jobs, manifest)
+    except BaseException as e:
+        manifest.finish(e)
+        raise
+    finally:
+        manifest.write()
+
+
+def run_selected(stages: Dict[str, Dict], upstream: Dict[str, List[str]], selected: List[str], state: Dict,
+                 force: List[str], jobs: int, manifest: RunManifest) -> bool:
+    """Run the selected stages as their upstream stages finish, recording each in the manifest"""
+    done, failed, running = set(), set(), {}
+    ok = True
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while len(done) + len(failed) < len(selected):
+            for name in selected:
+                if name in done or name in failed or name in running.values():
+                    continue
+                if any(u in failed for u in upstream[name] if u in selected):
+                    print(f"✗ {name}: skipped (upstream failed)")
+                    manifest.record_stage(name, 0, error="upstream failed", status="skipped")
+                    failed.add(name)
+                    continue
+                if not all(u in done for u in upstream[name] if u in selected):
+                    continue
+
+                reason = "forced" if name in force else stale_reason(stages[name], state.get(name))
+                if not reason:
+                    print(f"✓ {name}: up to date")
+                    manifest.record_stage(name, 0, status="up to date")
+                    done.add(name)
+                    continue
+
+                print(f"→ {name}: running ({reason})")
+                running[executor.submit(run_stage, name, stages[name])] = name
+
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                result = future.result()
+                print(f"\n--- {name} ({result['seconds']:.1f}s) ---")
+                print(result['output'].rstrip())
+                manifest.record_stage(name, result['seconds'], peak_rss_mb=result.get('peak_rss_mb'),
+                                      error=None if result['ok'] else result['output'].strip()[-200:],
+                                      status="ran" if result['ok'] else "failed")
+                if result['ok']:
+                    state[name] = result['state']
+                    save_state(state)
+                    print(f"✓ {name}: done")
+                    done.add(name)
+                else:
+                    print(f"✗ {name}: failed")
+                    failed.add(name)
+                    ok = False
+
+    return ok
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Run the reporting pipeline, re-running only stale stages")
+    parser.add_argument("stages", nargs="*", help="Stages to bring up to date (default: all)")
+    parser.add_argument("--force", action="append", default=[], metavar="STAGE", help="Re-run a stage even if it is up to date")
+    parser.add_argument("--dry-run", action="store_true", help="Show which stages would run")
+    parser.add_argument("--jobs", type=int, default=2, help="Maximum stages to run in parallel")
+    parser.add_argument("--list", action="store_true", help="List stages and their dependencies")
+    parser.add_argument("--profile", metavar="STAGE",
+                        help="Sample this run-manifest stage in every script that runs (or 'all' for whole runs)")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        # Inherited by the stage subprocesses (see stage_profiler.py)
+        os.environ["JETLINE_PROFILE"] = args.profile
+
+    if args.list:
+        stages = build_stages()
+        upstream = upstream_stages(stages)
+        for name, stage in stages.items():
+            after = f" (after {', '.join(upstream[name])})" if upstream[name] else ""
+            print(f"  {name:<12} {stage['description']}{after}")
+        return
+
+    if not run_pipeline(args.stages, args.force, args.dry_run, args.jobs):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Query plan audit across all BMS schemas
+
+Runs EXPLAIN for the extraction queries on every configured schema in parallel
+and flags what makes a store database slow:
+- FULL SCAN    a table read with type ALL (beyond a small lookup table)
+- FILESORT     ORDER BY not served by an index
+- TEMPORARY    temporary table for the query
+- NO INDEX     a joined table that uses no key
+- MISSING IDX  one of the indexes the joins rely on doesn't exist
+Plans are then grouped by shape, so the odd schemas out show up as a diff
+against the most common plan.
+
+    python3 scripts/plan_audit.py [--query export|compare] [--json Plan_Audit.json]
+"""
+
+import argparse
+import json
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from company_registry import load_companies
+from preflight import DEFAULT_TIMEOUT, connect_company, map_companies
+
+# Indexes the extraction joins and filters rely on: (table, leading column)
+EXPECTED_INDEXES = [
+    ('bms_meterreading', 'asset'),
+    ('bms_meterreading', 'reading_date'),
+    ('vtiger_crmentity', 'crmid'),
+]
+
+# Tables estimated at fewer rows than this are not worth flagging for a full scan
+FULL_SCAN_MIN_ROWS = 1000
+
+INDEX_QUERY = """
+SELECT DISTINCT TABLE_NAME, COLUMN_NAME
+FROM information_schema.STATISTICS
+WHERE TABLE_SCHEMA = %s AND SEQ_IN_INDEX = 1
+"""
+
+
+def extraction_queries() -> Dict[str, str]:
+    """The queries the extraction scripts run, by name"""
+    import compare_volumes_fixed
+    import export_comparison_excel
+
+    return {
+        'export': export_comparison_excel.QUERY,
+        'compare': compare_volumes_fixed.QUERY,
+    }
+
+
+def plan_flags(plan: List[Dict]) -> List[str]:
+    """Problems visible in one EXPLAIN plan"""
+    flags = []
+    for i, step in enumerate(plan):
+        table = step.get('table') or '?'
+        extra = step.get('Extra') or ''
+        rows = step.get('rows') or 0
+        if step.get('type') == 'ALL' and rows >= FULL_SCAN_MIN_ROWS:
+            flags.append(f"FULL SCAN {table} (~{rows:,} rows)")
+        if 'Using filesort' in extra:
+            flags.append(f"FILESORT {table}")
+        if 'Using temporary' in extra:
+            flags.append(f"TEMPORARY {table}")
+        # Every table after the first is joined in - without a key that's a scan per outer row
+        if i > 0 and not step.get('key'):
+            flags.append(f"NO INDEX {table} (join)")
+    return flags
+
+
+def plan_shape(plan: List[Dict]) -> Tuple:
+    """Comparable shape of a plan: access type and key per table (row estimates vary between stores)"""
+    return tuple((step.get('table'), step.get('type'), step.get('key')) for step in plan)
+
+
+def describe_step(step: Optional[Tuple]) -> str:
+    return f"{step[0]} {step[1]} {step[2] or '-'}" if step else "(none)"
+
+
+def audit_company(company: Dict, settings: Dict, queries: Dict[str, str], timeout: int) -> Dict:
+    """EXPLAIN each query on one schema and check the expected indexes"""
+    result = {'schema': company['schema'], 'name': company['name'], 'host': company['host'],
+              'plans': {}, 'flags': {}, 'missing_indexes': [], 'error': None}
+    try:
+        conn = connect_company(company, settings, timeout)
+    except Exception as e:
+        result['error'] = str(e)[:200]
+        return result
+
+    try:
+        cursor = conn.cursor()
+        for name, query in queries.items():
+            cursor.execute("EXPLAIN " + query.strip().rstrip(';'))
+            # Column names differ between MySQL versions (partitions/filtered were added in 5.7)
+            columns = [d[0] for d in cursor.description]
+            plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            for step in plan:
+                step['rows'] = int(step['rows']) if step.get('rows') is not None else None
+            result['plans'][name] = plan
+            result['flags'][name] = plan_flags(plan)
+
+        cursor.execute(INDEX_QUERY, (company['schema'],))
+        indexed = {(table.lower(), column.lower()) for table, column in cursor.fetchall()}
+        result['missing_indexes'] = [f"{t}.{c}" for t, c in EXPECTED_INDEXES if (t, c) not in indexed]
+        cursor.close()
+    except Exception as e:
+        result['error'] = str(e)[:200]
+    finally:
+        conn.close()
+
+    return result
+
+
+def run_audit(settings: Dict, queries: Dict[str, str], companies: List[Dict] = None,
+              timeout: int = DEFAULT_TIMEOUT) -> List[Dict]:
+    """Audit every company concurrently"""
+    companies = companies if companies is not None else load_companies()
+    return map_companies(lambda company: audit_company(company, settings, queries, timeout), companies)
+
+
+def print_audit(results: List[Dict], queries: Dict[str, str]):
+    """Per-schema problems, then each query's plan shapes as a diff against the most common one"""
+    ok = [r for r in results if not r['error']]
+    failed = [r for r in results if r['error']]
+
+    print("=" * 80)
+    print("PROBLEMS BY SCHEMA")
+    print("=" * 80)
+    clean = 0
+    for r in sorted(ok, key=lambda r: -sum(len(f) for f in r['flags'].values()) - len(r['missing_indexes'])):
+        problems = [f"[{name}] {flag}" for name, flags in r['flags'].items() for flag in flags]
+        problems += [f"MISSING IDX {index}" for index in r['missing_indexes']]
+        if not problems:
+            clean += 1
+            continue
+        print(f"\n{r['schema']} ({r['host']})")
+        for problem in problems:
+            print(f"  {problem}")
+    print(f"\n{clean} of {len(ok)} schemas have no flagged problems")
+
+    for name in queries:
+        shapes = defaultdict(list)
+        for r in ok:
+            shapes[plan_shape(r['plans'][name])].append(r['schema'])
+        if not shapes:
+            continue
+        baseline = Counter({shape: len(schemas) for shape, schemas in shapes.items()}).most_common(1)[0][0]
+        baseline_schemas = shapes[baseline]
+
+        print("\n" + "=" * 80)
+        print(f"PLAN SHAPES: {name} ({len(shapes)} distinct)")
+        print("=" * 80)
+        print(f"\nMost common plan ({len(baseline_schemas)} schemas):")
+        for table, access, key in baseline:
+            print(f"  {table or '?':<12} {access or '?':<8} {key or '-'}")
+
+        for shape, schemas in sorted(shapes.items(), key=lambda item: -len(item[1])):
+            if shape == baseline:
+                continue
+            print(f"\nDiffers on {len(schemas)} schemas: {', '.join(sorted(schemas))}")
+            for i in range(max(len(shape), len(baseline))):
+                this = shape[i] if i < len(shape) else None
+                base = baseline[i] if i < len(baseline) else None
+                if this != base:
+                    print(f"  step {i + 1}: {describe_step(base)}  →  {describe_step(this)}")
+
+    if failed:
+        print(f"\n✗ {len(failed)} schemas could not be audited:")
+        for r in failed:
+            print(f"  {r['schema']}: {r['error'][:80]}")
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="EXPLAIN the extraction queries on every BMS schema")
+    parser.add_argument("--query", choices=["export", "compare"], action="append",
+                        help="Query to audit (repeatable, default: all)")
+    parser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT, help="Connect timeout in seconds")
+    parser.add_argument("--json", help="Also write the plans and flags to this JSON file")
+    args = parser.parse_args(argv)
+
+    from export_comparison_excel import db_settings
+
+    queries = extraction_queries()
+    if args.query:
+        queries = {name: queries[name] for name in args.query}
+
+    results = run_audit(db_settings(), queries, timeout=args.timeout)
+    print_audit(results, queries)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1, default=str)
+        print(f"\n✓ Audit saved: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Pre-flight connectivity and latency probe for every configured BMS schema
+
+Opens a connection to each schema concurrently with a short timeout, runs
+SELECT 1 and reads the optimizer's row estimate for bms_meterreading from
+information_schema (no table scan), then prints a latency and size table.
+The export uses the same probe (EXTRACT_PREFLIGHT=true) to skip dead schemas
+and to order never-measured companies by size.
+
+    python3 scripts/preflight.py [--timeout 5] [--json Preflight.json]
+"""
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from company_registry import load_companies
+
+DEFAULT_TIMEOUT = 5
+SLOW_CONNECT_SECONDS = 2.0
+
+# Concurrent probes per host - probes are cheap but the hosts are production servers
+PROBES_PER_HOST = 2
+
+ROW_ESTIMATE_QUERY = """
+SELECT TABLE_ROWS
+FROM information_schema.TABLES
+WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'bms_meterreading'
+"""
+
+
+def connect_company(company: Dict, settings: Dict, timeout: int):
+    """Open a connection to one company schema (through the SSH tunnel if enabled)"""
+    from fake_bms import bms_connector
+    from export_comparison_excel import get_connection
+
+    host, port = get_connection(company['host'], company['port'], settings)
+    return bms_connector().connect(
+        host=host,
+        port=port,
+        user=settings['user'],
+        password=settings['password'],
+        database=company['schema'],
+        connect_timeout=timeout
+    )
+
+
+def map_companies(fn: Callable[[Dict], Dict], companies: List[Dict], per_host: int = PROBES_PER_HOST) -> List[Dict]:
+    """Run fn(company) for every company concurrently, at most per_host at a time on each host"""
+    host_slots = {c['host']: threading.Semaphore(per_host) for c in companies}
+
+    def run(company):
+        with host_slots[company['host']]:
+            return fn(company)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(32, len(companies)))) as executor:
+        return list(executor.map(run, companies))
+
+
+def probe_company(company: Dict, settings: Dict, timeout: int) -> Dict:
+    """Connect, SELECT 1 and estimate bms_meterreading rows for one schema"""
+    result = {'schema': company['schema'], 'name': company['name'], 'host': company['host'],
+              'status': 'DOWN', 'connect_ms': None, 'query_ms': None, 'est_rows': None, 'error': None}
+
+    start = time.time()
+    try:
+        conn = connect_company(company, settings, timeout)
+    except Exception as e:
+        result['error'] = str(e)[:200]
+        return result
+    result['connect_ms'] = round((time.time() - start) * 1000)
+    # Reachable is what the extract needs; a failed probe query only costs the size estimate
+    result['status'] = 'SLOW' if result['connect_ms'] > SLOW_CONNECT_SECONDS * 1000 else 'OK'
+
+    try:
+        cursor = conn.cursor()
+        start = time.time()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        result['query_ms'] = round((time.time() - start) * 1000)
+
+        cursor.execute(ROW_ESTIMATE_QUERY, (company['schema'],))
+        row = cursor.fetchone()
+        result['est_rows'] = int(row[0]) if row and row[0] is not None else None
+        cursor.close()
+    except Exception as e:
+        result['error'] = str(e)[:200]
+    finally:
+        conn.close()
+
+    return result
+
+
+def run_preflight(settings: Dict, companies: List[Dict] = None, timeout: int = DEFAULT_TIMEOUT) -> Dict[str, Dict]:
+    """Probe every company concurrently: {schema: probe result}"""
+    companies = companies if companies is not None else load_companies()
+    results = map_companies(lambda company: probe_company(company, settings, timeout), companies)
+    return {r['schema']: r for r in results}
+
+
+def print_preflight(results: Dict[str, Dict]):
+    """Latency and size table, problems first"""
+    order = {'DOWN': 0, 'SLOW': 1, 'OK': 2}
+    rows = sorted(results.values(), key=lambda r: (order[r['status']], -(r['est_rows'] or 0)))
+
+    print(f"{'Schema':<28} {'Host':<38} {'Status':<6} {'Connect':>9} {'Query':>7} {'Est. rows':>12}")
+    print("-" * 105)
+    for r in rows:
+        connect = f"{r['connect_ms']}ms" if r['connect_ms'] is not None else "-"
+        query = f"{r['query_ms']}ms" if r['query_ms'] is not None else "-"
+        est_rows = f"{r['est_rows']:,}" if r['est_rows'] is not None else "-"
+        print(f"{r['schema']:<28} {r['host']:<38} {r['status']:<6} {connect:>9} {query:>7} {est_rows:>12}")
+        if r['error']:
+            print(f"    {r['error'][:100]}")
+
+    counts = {status: sum(1 for r in rows if r['status'] == status) for status in order}
+    total_rows = sum(r['est_rows'] or 0 for r in rows)
+    print(f"\n{counts['OK']} OK, {counts['SLOW']} slow, {counts['DOWN']} down - ~{total_rows:,} meter readings")
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Probe connectivity, latency and size of every BMS schema")
+    parser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT, help="Connect timeout in seconds")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    from export_comparison_excel import db_settings
+
+    start = time.time()
+    results = run_preflight(db_settings(), timeout=args.timeout)
+    print_preflight(results)
+    print(f"Probed {len(results)} schemas in {time.time() - start:.1f}s")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f"✓ Results saved: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
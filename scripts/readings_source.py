@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Where the reports read meter readings from
+
+READINGS_SOURCE=bms (default) queries every company's BMS schema, as always.
+READINGS_SOURCE=webapp reads the webapp's PostgreSQL mirror (DATABASE_URL,
+needs psycopg2) instead - one local query, no SSH tunnel - returning rows in
+the same shape as export_comparison_excel.query_all_databases:
+(serial, model, status, date, category, install_date, datetime, total, a3, black, large, colour, xl, meterreadingid, meterreading_no, company)
+
+Only the columns the reports use are selected, for the registry's active
+companies, optionally from READINGS_SINCE (YYYY-MM-DD) onwards - a window on
+reading_date served by the (machine_id, reading_date) index - through a
+server-side cursor, so the result is streamed rather than materialised by
+the server at once. The mirror is only used when its last completed sync
+(webapp FULL sync or a publish from the export) is at most
+READINGS_MAX_AGE_HOURS old (default 24).
+"""
+
+import os
+from datetime import date, datetime, timezone
+from typing import List, Tuple
+
+from company_registry import load_companies
+
+DEFAULT_MAX_AGE_HOURS = 24
+
+# Rows fetched per round trip from the server-side cursor
+ITERSIZE = 10000
+
+WEBAPP_QUERY = """
+SELECT
+    m.serial_number,
+    m.model_name,
+    m.bms_status,
+    r.reading_date,
+    cat.name,
+    COALESCE(m.install_date, m.start_date)::date,
+    r.reading_datetime,
+    r.total,
+    r.a3,
+    r.black,
+    r.large,
+    r.colour,
+    r.extra_large,
+    r.bms_meterreading_id,
+    r.bms_meterreading_no,
+    co.bms_schema
+FROM machines m
+JOIN companies co ON co.id = m.company_id
+LEFT JOIN categories cat ON cat.id = m.category_id
+JOIN meter_readings r ON r.machine_id = m.id
+WHERE co.bms_schema = ANY(%s)
+    AND m.bms_status = 1
+    AND r.source = 'BMS'
+    AND r.reading_date >= %s
+ORDER BY m.serial_number, r.reading_date, r.reading_datetime
+"""
+
+SERIAL_QUERY = """
+SELECT r.reading_date, r.reading_datetime, r.total
+FROM machines m
+JOIN meter_readings r ON r.machine_id = m.id
+WHERE m.serial_number = %s
+    AND m.bms_status = 1
+    AND r.source = 'BMS'
+    AND r.reading_date BETWEEN %s AND %s
+ORDER BY r.reading_date, r.reading_datetime
+"""
+
+LAST_SYNC_QUERY = """
+SELECT MAX(completed_at)
+FROM sync_logs
+WHERE status = 'COMPLETED' AND sync_type IN ('FULL', 'EXPORT')
+"""
+
+
+def readings_source() -> str:
+    source = os.getenv("READINGS_SOURCE", "bms").lower()
+    if source not in ('bms', 'webapp'):
+        raise ValueError("READINGS_SOURCE must be 'bms' or 'webapp'")
+    return source
+
+
+def readings_since() -> date:
+    """Start of the reading window (READINGS_SINCE, default: all history)"""
+    since = os.getenv("READINGS_SINCE")
+    return datetime.strptime(since, "%Y-%m-%d").date() if since else date(1900, 1, 1)
+
+
+def connect_webapp(database_url: str = None):
+    import psycopg2
+
+    database_url = database_url or os.getenv("DATABASE_URL")
+    if not database_url:
+        raise ValueError("DATABASE_URL must be set to read from the webapp")
+    return psycopg2.connect(database_url)
+
+
+def check_fresh(conn, max_age_hours: float = None) -> datetime:
+    """Completion time of the mirror's last sync; raises if it is older than max_age_hours"""
+    max_age_hours = max_age_hours if max_age_hours is not None else float(
+        os.getenv("READINGS_MAX_AGE_HOURS", DEFAULT_MAX_AGE_HOURS))
+    cursor = conn.cursor()
+    cursor.execute(LAST_SYNC_QUERY)
+    last_sync = cursor.fetchone()[0]
+    cursor.close()
+    if last_sync is None:
+        raise ValueError("The webapp mirror has never completed a sync - use READINGS_SOURCE=bms")
+    # Prisma stores DateTime as UTC without a time zone
+    now = datetime.now(last_sync.tzinfo) if last_sync.tzinfo else datetime.now(timezone.utc).replace(tzinfo=None)
+    age_hours = (now - last_sync).total_seconds() / 3600
+    if age_hours > max_age_hours:
+        raise ValueError(f"The webapp mirror was last synced {age_hours:.1f}h ago "
+                         f"(READINGS_MAX_AGE_HOURS={max_age_hours:g}) - use READINGS_SOURCE=bms or sync the webapp")
+    return last_sync
+
+
+def query_webapp_readings(database_url: str = None, since: date = None, max_age_hours: float = None) -> List[Tuple]:
+    """Readings of the registry's active companies from the webapp mirror, in query_all_databases shape"""
+    names = {c['schema']: c['name'] for c in load_companies()}
+    since = since or readings_since()
+
+    conn = connect_webapp(database_url)
+    try:
+        last_sync = check_fresh(conn, max_age_hours)
+        print(f"Reading the webapp mirror (last synced {last_sync:%Y-%m-%d %H:%M}, readings from {since})...")
+        # A named cursor is a server-side cursor: rows arrive ITERSIZE at a time
+        cursor = conn.cursor(name="jetline_readings")
+        cursor.itersize = ITERSIZE
+        cursor.execute(WEBAPP_QUERY, (list(names), since))
+        results = [row[:15] + (names[row[15]],) for row in cursor]
+        cursor.close()
+    finally:
+        conn.close()
+    return results
+
+
+def query_webapp_serial(serial: str, start: date, end: date, database_url: str = None,
+                        max_age_hours: float = None) -> List[Tuple]:
+    """(reading_date, reading_datetime, total) of one serial between start and end, from the webapp mirror"""
+    conn = connect_webapp(database_url)
+    try:
+        check_fresh(conn, max_age_hours)
+        cursor = conn.cursor()
+        cursor.execute(SERIAL_QUERY, (serial, start, end))
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+    return rows
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Run-over-run delta reports
+
+Each run fingerprints its output rows (key fields + hashed values) and saves them
+next to the reports. The next run compares against that snapshot and writes a
+small delta workbook with only the variances that are NEW, CHANGED or RESOLVED,
+so reviewers don't have to diff whole-fleet workbooks by eye.
+"""
+
+import hashlib
+import json
+import openpyxl
+from datetime import datetime
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+from pathlib import Path
+from typing import Callable, Dict, List
+
+FINGERPRINT_VERSION = 1
+
+
+def row_hash(values: List) -> str:
+    """Stable short hash of a row's values"""
+    payload = json.dumps(values, default=str, separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def snapshot_rows(rows: List[List], headers: List[str], key_fields: List[str],
+                  value_fields: List[str], is_variance: Callable[[Dict], bool]) -> Dict:
+    """Fingerprint report rows (lists matching headers, or dicts): {key: {hash, variance, values}}
+
+    Values are kept only for variance rows (needed to show previous values in the
+    delta); every other row is stored as its hash alone.
+    """
+    positions = {name: i for i, name in enumerate(headers or [])}
+    snapshot = {}
+    for row in rows:
+        if isinstance(row, dict):
+            record = {name: row[name] for name in key_fields + value_fields}
+        else:
+            record = {name: row[positions[name]] for name in key_fields + value_fields}
+        key = '|'.join(str(record[name]) for name in key_fields)
+        variance = bool(is_variance(record))
+        entry = {'hash': row_hash([record[name] for name in value_fields]), 'variance': variance}
+        if variance:
+            entry['values'] = {name: record[name] for name in key_fields + value_fields}
+        snapshot[key] = entry
+    return snapshot
+
+
+def diff_snapshots(previous: Dict, current: Dict) -> List[Dict]:
+    """Variance changes between two snapshots of the same report
+
+    NEW:      variance now, absent or not a variance last run
+    CHANGED:  variance in both runs but the row values differ
+    RESOLVED: variance last run, now balanced or gone
+    """
+    changes = []
+    for key, entry in current.items():
+        before = previous.get(key)
+        if entry['variance']:
+            if not before or not before['variance']:
+                changes.append({'change': 'NEW', 'key': key, 'current': entry['values'], 'previous': None})
+            elif before['hash'] != entry['hash']:
+                changes.append({'change': 'CHANGED', 'key': key, 'current': entry['values'], 'previous': before.get('values')})
+    for key, before in previous.items():
+        if before['variance'] and not current.get(key, {}).get('variance'):
+            changes.append({'change': 'RESOLVED', 'key': key, 'current': None, 'previous': before.get('values')})
+    return sorted(changes, key=lambda c: (c['key'], c['change']))
+
+
+def load_fingerprints(filepath: Path) -> Dict:
+    """Load the previous run's fingerprints ({} if none or from an older format)"""
+    if not Path(filepath).exists():
+        return {}
+    with open(filepath, 'r') as f:
+        data = json.load(f)
+    if data.get('version') != FINGERPRINT_VERSION:
+        return {}
+    return data.get('reports', {})
+
+
+def save_fingerprints(reports: Dict, filepath: Path):
+    """Save this run's fingerprints for the next run"""
+    with open(filepath, 'w') as f:
+        json.dump({'version': FINGERPRINT_VERSION, 'reports': reports}, f, default=str)
+
+
+def create_delta_report(snapshots: Dict, fingerprint_path: Path, output_path: Path) -> int:
+    """Compare this run's snapshots with the previous run, write the delta workbook and roll fingerprints
+
+    snapshots: {report name: snapshot_rows(...)}
+    Returns the number of changed variance rows. The first run only records fingerprints
+    (and removes a delta workbook left over from older runs); a run without changes
+    writes a workbook that says so, so the delta on disk is always this run's.
+    """
+    previous = load_fingerprints(fingerprint_path)
+    previous_run = (datetime.fromtimestamp(Path(fingerprint_path).stat().st_mtime).strftime("%Y-%m-%d %H:%M")
+                    if previous else None)
+    save_fingerprints(snapshots, fingerprint_path)
+
+    if not previous:
+        Path(output_path).unlink(missing_ok=True)
+        print(f"✓ Baseline fingerprints saved: {fingerprint_path} (delta starts next run)")
+        return 0
+
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF")
+    change_fills = {
+        'NEW': PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid"),
+        'CHANGED': PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid"),
+        'RESOLVED': PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid"),
+    }
+
+    total = 0
+    for report, snapshot in snapshots.items():
+        changes = diff_snapshots(previous.get(report, {}), snapshot)
+        if not changes:
+            continue
+        total += len(changes)
+
+        fields = []
+        for change in changes:
+            for values in (change['current'], change['previous']):
+                for name in (values or {}):
+                    if name not in fields:
+                        fields.append(name)
+
+        ws = wb.create_sheet(report[:31])
+        ws.append(["Change", "Key"] + fields + [""] + [f"Previous {name}" for name in fields])
+        for cell in ws[1]:
+            if cell.value:
+                cell.fill = header_fill
+                cell.font = header_font
+
+        for change in changes:
+            current = change['current'] or {}
+            prev = change['previous'] or {}
+            row = [change['change'], change['key']] + [current.get(name) for name in fields]
+            row += [""] + [prev.get(name) for name in fields]
+            ws.append(row)
+            ws.cell(ws.max_row, 1).fill = change_fills[change['change']]
+
+        for column in ws.columns:
+            max_length = max((len(str(c.value)) for c in column if c.value is not None), default=0)
+            ws.column_dimensions[get_column_letter(column[0].column)].width = min(max_length + 2, 50)
+        ws.freeze_panes = 'C2'
+
+    if not total:
+        ws = wb.create_sheet("No Changes")
+        ws.append([f"No changes since the previous run ({previous_run})"])
+        ws.column_dimensions['A'].width = 50
+        wb.save(output_path)
+        print(f"✓ No variance changes since the previous run ({previous_run}): {output_path}")
+        return 0
+
+    wb.save(output_path)
+    print(f"✓ Delta report saved: {output_path} ({total} changed variance rows)")
+    return total
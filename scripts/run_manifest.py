@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Structured run manifests for the reporting scripts
+
+Each run records per-stage wall time, rows in/out, peak RSS and failures, plus
+per-company query time, rows and bytes received, and writes them as
+Run_Manifest_<run>.json next to its reports. One summary line per run is
+appended to Run_History.jsonl for charting run duration over time.
+
+With PROMETHEUS_TEXTFILE_DIR set, the same numbers are also written as
+jetline_<run>.prom for node_exporter's textfile collector. With JETLINE_PROFILE
+set, the named stage (or the whole run) is sampled - see stage_profiler.py.
+
+    python3 scripts/run_manifest.py Run_Manifest_export.json   # print a manifest's slowest stages/companies
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from stage_profiler import SamplingProfiler, profile_target
+
+MANIFEST_VERSION = 1
+HISTORY_FILE = "Run_History.jsonl"
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far (None where the platform can't tell)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class RunManifest:
+    """Stage and company records for one run of a script"""
+
+    def __init__(self, run: str, output_dir: Path):
+        self.run = run
+        self.output_dir = Path(output_dir)
+        self.started_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.started = time.time()
+        self.stages = []
+        self.companies = []
+        self.error = None
+        self.profiles = []
+
+        self.profile = profile_target()
+        self.run_profiler = None
+        if self.profile == 'all':
+            self.run_profiler = SamplingProfiler()
+            self.run_profiler.start()
+
+    @contextmanager
+    def stage(self, name: str, rows_in: int = None):
+        """Time a stage; set record['rows_out'] (and rows_in) inside the block
+
+        An exception marks the stage failed and propagates.
+        """
+        record = {'name': name, 'rows_in': rows_in, 'rows_out': None, 'seconds': None,
+                  'peak_rss_mb': None, 'error': None}
+        self.stages.append(record)
+        profiler = SamplingProfiler() if self.profile == name else None
+        if profiler:
+            profiler.start()
+        start = time.time()
+        try:
+            yield record
+        except BaseException as e:
+            record['error'] = f"{type(e).__name__}: {e}"[:200]
+            raise
+        finally:
+            record['seconds'] = round(time.time() - start, 3)
+            record['peak_rss_mb'] = peak_rss_mb()
+            if profiler:
+                profiler.stop()
+                self.save_profile(profiler, f"{self.run}_{name}")
+
+    def record_stage(self, name: str, seconds: float, rows_in: int = None, rows_out: int = None,
+                     peak_rss_mb: float = None, error: str = None, **extra):
+        """Add a stage timed elsewhere (e.g. a subprocess)"""
+        self.stages.append(dict({
+            'name': name, 'rows_in': rows_in, 'rows_out': rows_out, 'seconds': round(seconds, 3),
+            'peak_rss_mb': peak_rss_mb, 'error': error[:200] if error else None,
+        }, **extra))
+
+    def company(self, schema: str, name: str, host: str, rows: int, seconds: float,
+                bytes_received: int = None, error: str = None):
+        self.companies.append({
+            'schema': schema, 'name': name, 'host': host, 'rows': rows, 'seconds': round(seconds, 3),
+            'bytes_received': bytes_received, 'error': error[:200] if error else None,
+        })
+
+    def save_profile(self, profiler: SamplingProfiler, name: str):
+        collapsed_path, summary_path = profiler.write(self.output_dir, name)
+        self.profiles.append(collapsed_path.name)
+        print(f"✓ Profile saved: {collapsed_path} (top functions: {summary_path.name})")
+
+    def finish(self, error: BaseException = None):
+        if error is not None and self.error is None:
+            self.error = f"{type(error).__name__}: {error}"[:200]
+
+    def to_dict(self) -> Dict:
+        failed_stages = [s['name'] for s in self.stages if s['error']]
+        return {
+            'version': MANIFEST_VERSION,
+            'run': self.run,
+            'started_at': self.started_at,
+            'seconds': round(time.time() - self.started, 3),
+            'ok': self.error is None and not failed_stages,
+            'error': self.error,
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': self.stages,
+            'companies': self.companies,
+            'failures': failed_stages + [c['schema'] for c in self.companies if c['error']],
+            'profiles': self.profiles,
+        }
+
+    def write(self) -> Path:
+        """Write the manifest and history line (and the Prometheus textfile if configured)"""
+        if self.run_profiler:
+            self.run_profiler.stop()
+            self.save_profile(self.run_profiler, self.run)
+            self.run_profiler = None
+        data = self.to_dict()
+        output_dir = self.output_dir
+        path = output_dir / f"Run_Manifest_{self.run}.json"
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=1, default=str)
+        append_history(data, output_dir / HISTORY_FILE)
+
+        textfile_dir = os.getenv("PROMETHEUS_TEXTFILE_DIR")
+        if textfile_dir:
+            write_prometheus(data, Path(textfile_dir))
+        return path
+
+
+def append_history(data: Dict, path: Path):
+    """One line per run: duration, outcome and stage times"""
+    summary = {
+        'run': data['run'], 'started_at': data['started_at'], 'seconds': data['seconds'], 'ok': data['ok'],
+        'peak_rss_mb': data['peak_rss_mb'],
+        'rows': sum(c['rows'] for c in data['companies']) if data['companies'] else None,
+        'stages': {s['name']: s['seconds'] for s in data['stages']},
+    }
+    with open(path, 'a') as f:
+        f.write(json.dumps(summary) + "\n")
+
+
+def _label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def prometheus_text(data: Dict) -> str:
+    """Manifest as Prometheus text exposition format"""
+    run = _label(data['run'])
+    metrics = [
+        ('jetline_run_duration_seconds', 'gauge', "Wall time of the last run",
+         [(f'run="{run}"', data['seconds'])]),
+        ('jetline_run_success', 'gauge', "1 if the last run had no failed stage",
+         [(f'run="{run}"', 1 if data['ok'] else 0)]),
+        ('jetline_run_last_timestamp_seconds', 'gauge', "Start of the last run (unix time)",
+         [(f'run="{run}"', int(time.mktime(time.strptime(data['started_at'], "%Y-%m-%d %H:%M:%S"))))]),
+        ('jetline_run_peak_rss_megabytes', 'gauge', "Peak RSS of the last run",
+         [(f'run="{run}"', data['peak_rss_mb'])]),
+        ('jetline_stage_duration_seconds', 'gauge', "Wall time per stage",
+         [(f'run="{run}",stage="{_label(s["name"])}"', s['seconds']) for s in data['stages']]),
+        ('jetline_stage_rows_in', 'gauge', "Rows into each stage",
+         [(f'run="{run}",stage="{_label(s["name"])}"', s['rows_in']) for s in data['stages']]),
+        ('jetline_stage_rows_out', 'gauge', "Rows out of each stage",
+         [(f'run="{run}",stage="{_label(s["name"])}"', s['rows_out']) for s in data['stages']]),
+        ('jetline_stage_failed', 'gauge', "1 if the stage failed",
+         [(f'run="{run}",stage="{_label(s["name"])}"', 1 if s['error'] else 0) for s in data['stages']]),
+        ('jetline_company_query_seconds', 'gauge', "Query time per company schema",
+         [(f'run="{run}",schema="{_label(c["schema"])}",host="{_label(c["host"])}"', c['seconds'])
+          for c in data['companies']]),
+        ('jetline_company_rows', 'gauge', "Rows returned per company schema",
+         [(f'run="{run}",schema="{_label(c["schema"])}",host="{_label(c["host"])}"', c['rows'])
+          for c in data['companies']]),
+        ('jetline_company_bytes_received', 'gauge', "Bytes received per company schema",
+         [(f'run="{run}",schema="{_label(c["schema"])}",host="{_label(c["host"])}"', c['bytes_received'])
+          for c in data['companies']]),
+        ('jetline_company_failed', 'gauge', "1 if the company query failed",
+         [(f'run="{run}",schema="{_label(c["schema"])}",host="{_label(c["host"])}"', 1 if c['error'] else 0)
+          for c in data['companies']]),
+    ]
+
+    lines = []
+    for name, kind, help_text, samples in metrics:
+        samples = [(labels, value) for labels, value in samples if value is not None]
+        if not samples:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f"{name}{{{labels}}} {value}" for labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(data: Dict, textfile_dir: Path) -> Path:
+    """Write jetline_<run>.prom atomically (the collector must never read a partial file)"""
+    textfile_dir.mkdir(parents=True, exist_ok=True)
+    path = textfile_dir / f"jetline_{data['run']}.prom"
+    tmp_path = path.with_suffix(f".prom.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        f.write(prometheus_text(data))
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_manifest(path: Path) -> Dict:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def print_manifest(data: Dict, top: int = 10):
+    """Stages in run order and the slowest companies"""
+    status = "ok" if data['ok'] else "FAILED"
+    print(f"{data['run']} run at {data['started_at']}: {data['seconds']:.1f}s, {status}, "
+          f"peak RSS {data['peak_rss_mb'] or '-'} MB")
+    print(f"\n{'Stage':<28} {'Seconds':>9} {'Rows in':>11} {'Rows out':>11} {'Peak MB':>9}")
+    print("-" * 72)
+    for s in data['stages']:
+        rows_in = f"{s['rows_in']:,}" if s['rows_in'] is not None else "-"
+        rows_out = f"{s['rows_out']:,}" if s['rows_out'] is not None else "-"
+        print(f"{s['name']:<28} {s['seconds']:>9.2f} {rows_in:>11} {rows_out:>11} {s['peak_rss_mb'] or '-':>9}"
+              + (f"  ✗ {s['error'][:60]}" if s['error'] else ""))
+
+    if data['companies']:
+        print(f"\nSlowest {min(top, len(data['companies']))} companies:")
+        for c in sorted(data['companies'], key=lambda c: -c['seconds'])[:top]:
+            received = f"{c['bytes_received'] / 1024 / 1024:.1f} MB" if c['bytes_received'] is not None else "-"
+            print(f"  {c['schema']:<28} {c['seconds']:>8.1f}s {c['rows']:>10,} rows {received:>10}"
+                  + (f"  ✗ {c['error'][:50]}" if c['error'] else ""))
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Show a run manifest, optionally as Prometheus text")
+    parser.add_argument("manifest", help="Run_Manifest_<run>.json")
+    parser.add_argument("--top", type=int, default=10, help="Slowest companies to list")
+    parser.add_argument("--prometheus", action="store_true", help="Print the Prometheus textfile instead")
+    args = parser.parse_args(argv)
+
+    data = load_manifest(Path(args.manifest))
+    if args.prometheus:
+        print(prometheus_text(data), end="")
+    else:
+        print_manifest(data, args.top)
+
+
+if __name__ == "__main__":
+    main()
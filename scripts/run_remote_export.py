@@ -4,11 +4,14 @@ Run export script remotely on the jump server
 This avoids complex SSH tunneling by running the script where it has direct database access
 """
 
+import shlex
 import subprocess
 import sys
 import os
 from pathlib import Path
 
+from run_manifest import HISTORY_FILE, append_history, load_manifest, write_prometheus
+
 # SSH configuration
 SSH_HOST = "172.20.246.163"
 SSH_USER = "finalspace"
@@ -19,7 +22,30 @@ SCRIPT_DIR = Path(__file__).parent
 PROJECT_ROOT = SCRIPT_DIR.parent
 EXCEL_SOURCE = PROJECT_ROOT / "Volumes from Xerox.xlsx"
 DEVICE_METERS_SOURCE = PROJECT_ROOT / "Device Current Meters based on last Reading Date.xlsx"
+BILLING_SOURCE = PROJECT_ROOT / "Xerox Billing.xlsx"
 EXPORT_SCRIPT = SCRIPT_DIR / "export_comparison_excel.py"
+# Local modules (and the company registry) used by the export script - copied alongside it
+HELPER_MODULES = [
+    SCRIPT_DIR / "balance_matching.py",
+    SCRIPT_DIR / "coverage_recon.py",
+    SCRIPT_DIR / "serial_keys.py",
+    SCRIPT_DIR / "run_delta.py",
+    SCRIPT_DIR / "volume_comparison.py",
+    SCRIPT_DIR / "machine_store.py",
+    SCRIPT_DIR / "company_registry.py",
+    SCRIPT_DIR / "host_concurrency.py",
+    SCRIPT_DIR / "preflight.py",
+    SCRIPT_DIR / "run_manifest.py",
+    SCRIPT_DIR / "stage_profiler.py",
+    SCRIPT_DIR / "fake_bms.py",
+    SCRIPT_DIR / "external_sort.py",
+    SCRIPT_DIR / "webapp_publish.py",
+    SCRIPT_DIR / "readings_source.py",
+    SCRIPT_DIR / "xerox_ingest.py",
+    SCRIPT_DIR / "utilization_materialize.py",
+    SCRIPT_DIR / "meter_anomalies.py",
+    SCRIPT_DIR / "bms_companies.json",
+]
 ENV_FILE = PROJECT_ROOT / ".env"
 
 # Remote paths
@@ -27,10 +53,17 @@ REMOTE_DIR = "/tmp/jetline_export"
 REMOTE_SCRIPT = f"{REMOTE_DIR}/export_comparison_excel.py"
 REMOTE_EXCEL = f"{REMOTE_DIR}/Volumes from Xerox.xlsx"
 REMOTE_DEVICE_METERS = f"{REMOTE_DIR}/Device Current Meters based on last Reading Date.xlsx"
+REMOTE_BILLING = f"{REMOTE_DIR}/Xerox Billing.xlsx"
 REMOTE_ENV = f"{REMOTE_DIR}/.env"
 REMOTE_OUTPUT = f"{REMOTE_DIR}/Volume_Comparison_Report.xlsx"
 REMOTE_BALANCE_OUTPUT = f"{REMOTE_DIR}/Xerox_vs_BMS_Balances.xlsx"
-REMOTE_BMS_INFO = f"{REMOTE_DIR}/bms_machine_info.json"
+REMOTE_BMS_INFO = f"{REMOTE_DIR}/bms_machine_info.db"
+REMOTE_COVERAGE_OUTPUT = f"{REMOTE_DIR}/Coverage_Recon_Report.xlsx"
+REMOTE_UNMATCHED = f"{REMOTE_DIR}/Unmatched_Serials.csv"
+REMOTE_FINGERPRINTS = f"{REMOTE_DIR}/Run_Fingerprints.json"
+REMOTE_DELTA_OUTPUT = f"{REMOTE_DIR}/Variance_Delta.xlsx"
+REMOTE_COMPANY_STATS = f"{REMOTE_DIR}/Company_Stats.json"
+REMOTE_MANIFEST = f"{REMOTE_DIR}/Run_Manifest_export.json"
 
 def run_ssh_command(cmd, check=True):
     """Run command via SSH"""
@@ -90,6 +123,10 @@ def main():
     copy_to_remote(EXPORT_SCRIPT, REMOTE_SCRIPT)
     print(f"✓ Copied {EXPORT_SCRIPT.name}")
 
+    for module in HELPER_MODULES:
+        copy_to_remote(module, f"{REMOTE_DIR}/{module.name}")
+        print(f"✓ Copied {module.name}")
+
     copy_to_remote(EXCEL_SOURCE, REMOTE_EXCEL)
     print(f"✓ Copied {EXCEL_SOURCE.name}")
 
@@ -97,9 +134,31 @@ def main():
         copy_to_remote(DEVICE_METERS_SOURCE, REMOTE_DEVICE_METERS)
         print(f"✓ Copied {DEVICE_METERS_SOURCE.name}")
 
+    if BILLING_SOURCE.exists():
+        copy_to_remote(BILLING_SOURCE, REMOTE_BILLING)
+        print(f"✓ Copied {BILLING_SOURCE.name}")
+
     copy_to_remote(ENV_FILE, REMOTE_ENV)
     print(f"✓ Copied .env")
 
+    # Previous run's fingerprints - the remote directory is wiped after every run
+    local_fingerprints = PROJECT_ROOT / "Run_Fingerprints.json"
+    if local_fingerprints.exists():
+        copy_to_remote(local_fingerprints, REMOTE_FINGERPRINTS)
+        print(f"✓ Copied {local_fingerprints.name}")
+
+    # Per-company row counts and query times - used to query the largest companies first
+    local_company_stats = PROJECT_ROOT / "Company_Stats.json"
+    if local_company_stats.exists():
+        copy_to_remote(local_company_stats, REMOTE_COMPANY_STATS)
+        print(f"✓ Copied {local_company_stats.name}")
+
+    # Machine info store - updated in place so only changed serials get a new version
+    local_bms_info = PROJECT_ROOT / "bms_machine_info.db"
+    if local_bms_info.exists():
+        copy_to_remote(local_bms_info, REMOTE_BMS_INFO)
+        print(f"✓ Copied {local_bms_info.name}")
+
     # Install Python dependencies on remote if needed
     print("\nInstalling dependencies on jump server...")
     result = run_ssh_command("python3 -m pip list | grep mysql-connector-python", check=False)
@@ -113,7 +172,12 @@ def main():
     print("(This will query all 63 databases directly from the jump server)")
     print()
 
-    result = run_ssh_command(f"cd {REMOTE_DIR} && python3 export_comparison_excel.py")
+    # Profiling, memory and write-back settings travel with the command (see stage_profiler.py, external_sort.py)
+    remote_env = " ".join(f"{var}={shlex.quote(os.environ[var])}"
+                          for var in ("JETLINE_PROFILE", "JETLINE_PROFILE_INTERVAL_MS",
+                                      "VOLUME_SORT_BUDGET_MB", "VOLUME_WORKERS", "WEBAPP_WRITEBACK")
+                          if os.getenv(var))
+    result = run_ssh_command(f"cd {REMOTE_DIR} && {remote_env} python3 export_comparison_excel.py")
 
     # Print output
     if result.stdout:
@@ -135,13 +199,71 @@ def main():
     except subprocess.CalledProcessError:
         print("⚠ Balance report not found (Device Meters file may be missing)")
 
-    # Copy BMS machine info JSON
-    local_bms_info = PROJECT_ROOT / "bms_machine_info.json"
+    # Copy coverage recon report
+    if BILLING_SOURCE.exists():
+        local_coverage_output = PROJECT_ROOT / "Coverage_Recon_Report.xlsx"
+        try:
+            copy_from_remote(REMOTE_COVERAGE_OUTPUT, local_coverage_output)
+            print(f"✓ Coverage recon saved: {local_coverage_output}")
+        except subprocess.CalledProcessError:
+            print("⚠ Coverage recon report not found")
+
+    # Copy serial matching report
+    local_unmatched = PROJECT_ROOT / "Unmatched_Serials.csv"
+    try:
+        copy_from_remote(REMOTE_UNMATCHED, local_unmatched)
+        print(f"✓ Serial matching report saved: {local_unmatched}")
+    except subprocess.CalledProcessError:
+        print("⚠ Serial matching report not found")
+
+    # Copy run fingerprints and delta report
+    try:
+        copy_from_remote(REMOTE_FINGERPRINTS, local_fingerprints)
+        print(f"✓ Run fingerprints saved: {local_fingerprints}")
+    except subprocess.CalledProcessError:
+        print("⚠ Run fingerprints not found")
+
+    local_delta = PROJECT_ROOT / "Variance_Delta.xlsx"
+    try:
+        copy_from_remote(REMOTE_DELTA_OUTPUT, local_delta)
+        print(f"✓ Delta report saved: {local_delta}")
+    except subprocess.CalledProcessError:
+        # First run: don't leave an older delta looking current
+        local_delta.unlink(missing_ok=True)
+        print("⚠ No delta report (first run - delta starts next run)")
+
+    # Copy per-company stats for the next run's schedule
+    try:
+        copy_from_remote(REMOTE_COMPANY_STATS, local_company_stats)
+        print(f"✓ Company stats saved: {local_company_stats}")
+    except subprocess.CalledProcessError:
+        print("⚠ Company stats not found")
+
+    # Copy BMS machine info store
     try:
         copy_from_remote(REMOTE_BMS_INFO, local_bms_info)
         print(f"✓ BMS machine info saved: {local_bms_info}")
     except subprocess.CalledProcessError:
-        print("⚠ BMS machine info not found")
+        print("⚠ BMS machine info store not found")
+
+    # Copy the run manifest - history and Prometheus textfile are kept locally
+    local_manifest = PROJECT_ROOT / "Run_Manifest_export.json"
+    try:
+        copy_from_remote(REMOTE_MANIFEST, local_manifest)
+        manifest = load_manifest(local_manifest)
+        append_history(manifest, PROJECT_ROOT / HISTORY_FILE)
+        if os.getenv("PROMETHEUS_TEXTFILE_DIR"):
+            write_prometheus(manifest, Path(os.getenv("PROMETHEUS_TEXTFILE_DIR")))
+        print(f"✓ Run manifest saved: {local_manifest}")
+    except subprocess.CalledProcessError:
+        print("⚠ Run manifest not found")
+
+    # Copy profiles (only written with JETLINE_PROFILE)
+    listing = run_ssh_command(f"ls {REMOTE_DIR}/Profile_* 2>/dev/null", check=False)
+    for remote_profile in listing.stdout.split():
+        local_profile = PROJECT_ROOT / Path(remote_profile).name
+        copy_from_remote(remote_profile, local_profile)
+        print(f"✓ Profile saved: {local_profile}")
 
     # Cleanup remote files
     print("\nCleaning up...")
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Schema fingerprints for every BMS schema
+
+The store databases run different MySQL/MariaDB versions and have drifted
+apart in columns and indexes, so one extraction query isn't the best (or even
+a valid) choice everywhere. This pass connects to every schema concurrently
+and caches in Schema_Fingerprints.json:
+- server version and whether it has window functions (MySQL 8.0+, MariaDB 10.2+)
+- the column set of the tables the extraction reads
+- the leading column of every index on those tables
+Each run first reads only a checksum of the columns and indexes (computed
+server-side from information_schema) and fetches the details again only for
+schemas whose fingerprint changed.
+
+The extraction scripts pick their query per schema with choose_query(): the
+fastest variant whose columns and indexes the schema has, falling back to the
+plain join.
+
+    python3 scripts/schema_fingerprint.py [--refresh]
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from company_registry import load_companies
+from preflight import DEFAULT_TIMEOUT, connect_company, map_companies
+
+SCRIPT_DIR = Path(__file__).parent
+FINGERPRINT_FILE = SCRIPT_DIR.parent / "Schema_Fingerprints.json"
+FINGERPRINT_VERSION = 1
+
+TABLES = ('bms_machines', 'bms_meterreading', 'vtiger_crmentity')
+
+_TABLE_FILTER = "TABLE_SCHEMA = %s AND TABLE_NAME IN ({})".format(", ".join(f"'{t}'" for t in TABLES))
+
+CHECKSUM_QUERY = f"""
+SELECT
+    VERSION(),
+    (SELECT MD5(GROUP_CONCAT(CONCAT_WS(':', TABLE_NAME, COLUMN_NAME, COLUMN_TYPE)
+                             ORDER BY TABLE_NAME, COLUMN_NAME))
+     FROM information_schema.COLUMNS WHERE {_TABLE_FILTER}),
+    (SELECT MD5(GROUP_CONCAT(CONCAT_WS(':', TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME)
+                             ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX))
+     FROM information_schema.STATISTICS WHERE {_TABLE_FILTER})
+"""
+
+COLUMNS_QUERY = f"SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS WHERE {_TABLE_FILTER}"
+
+INDEXES_QUERY = f"""
+SELECT DISTINCT TABLE_NAME, COLUMN_NAME
+FROM information_schema.STATISTICS
+WHERE {_TABLE_FILTER} AND SEQ_IN_INDEX = 1
+"""
+
+# Volume comparison query variants, fastest first. Each returns
+# (serialnumber, machine_model_name, reading_date, totalamt) rows.
+COMPARE_VARIANTS = [
+    {
+        # Server-side month-end reduction: the comparison keeps only the highest
+        # cumulative total per serial and month, so the store server collapses the
+        # readings before the join and sends one row per machine-month. The
+        # grouped scan walks bms_meterreading by asset, hence the index.
+        'name': 'month_max',
+        'columns': {
+            'bms_machines': ['serialnumber', 'machine_model_name', 'machinesid'],
+            'bms_meterreading': ['asset', 'reading_date', 'total'],
+            'vtiger_crmentity': ['crmid', 'deleted'],
+        },
+        'indexes': ['bms_meterreading.asset'],
+        'query': """
+SELECT
+    ma.serialnumber,
+    ma.machine_model_name,
+    mrd.month_end as reading_date,
+    mrd.max_total as totalamt
+FROM bms_machines ma
+LEFT JOIN vtiger_crmentity crm on crm.crmid = ma.machinesid
+JOIN (
+    SELECT asset, MAX(reading_date) as month_end, MAX(total) as max_total
+    FROM bms_meterreading
+    WHERE total IS NOT NULL AND reading_date IS NOT NULL
+    GROUP BY asset, YEAR(reading_date), MONTH(reading_date)
+) mrd on mrd.asset = ma.machinesid
+WHERE crm.deleted <> 1
+    AND ma.serialnumber IS NOT NULL
+ORDER BY ma.serialnumber, mrd.month_end;
+"""
+    },
+    {
+        'name': 'plain',
+        'columns': {},
+        'indexes': [],
+        'query': None,  # the caller's own QUERY
+    },
+]
+
+
+def supports_window_functions(version: str) -> bool:
+    """MySQL 8.0+ or MariaDB 10.2+"""
+    match = re.match(r"(\d+)\.(\d+)", version or "")
+    if not match:
+        return False
+    major_minor = (int(match.group(1)), int(match.group(2)))
+    if 'mariadb' in version.lower():
+        return major_minor >= (10, 2)
+    return major_minor >= (8, 0)
+
+
+def load_fingerprints(path: Path = FINGERPRINT_FILE) -> Dict[str, Dict]:
+    """{schema: fingerprint} from the cache file (empty if missing or from an older format)"""
+    if not Path(path).exists():
+        return {}
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if data.get('version') != FINGERPRINT_VERSION:
+        return {}
+    return data['schemas']
+
+
+def save_fingerprints(fingerprints: Dict[str, Dict], path: Path = FINGERPRINT_FILE):
+    with open(path, 'w') as f:
+        json.dump({'version': FINGERPRINT_VERSION, 'schemas': fingerprints}, f, indent=1, sort_keys=True)
+
+
+def fingerprint_company(company: Dict, settings: Dict, cached: Optional[Dict], timeout: int,
+                        force: bool = False) -> Tuple[Optional[Dict], str]:
+    """(fingerprint, 'unchanged' | 'changed' | 'new' | error message) for one schema
+
+    The details are fetched only if the checksum differs from the cached one
+    (or with force). On an error the cached fingerprint (if any) is returned.
+    """
+    schema = company['schema']
+    try:
+        conn = connect_company(company, settings, timeout)
+    except Exception as e:
+        return cached, str(e)[:200]
+
+    try:
+        cursor = conn.cursor()
+        # The column checksum concatenates a few hundred entries - beyond the 1024 byte default
+        cursor.execute("SET SESSION group_concat_max_len = 1000000")
+        cursor.execute(CHECKSUM_QUERY, (schema, schema))
+        version, columns_md5, indexes_md5 = cursor.fetchone()
+        checksum = hashlib.sha256(f"{version}|{columns_md5}|{indexes_md5}".encode()).hexdigest()[:16]
+        now = time.strftime("%Y-%m-%d %H:%M:%S")
+
+        unchanged = bool(cached) and cached['fingerprint'] == checksum
+        if unchanged and not force:
+            cursor.close()
+            return dict(cached, checked_at=now), 'unchanged'
+
+        cursor.execute(COLUMNS_QUERY, (schema,))
+        columns = {}
+        for table, column in cursor.fetchall():
+            columns.setdefault(table.lower(), []).append(column.lower())
+        cursor.execute(INDEXES_QUERY, (schema,))
+        indexes = sorted({f"{table.lower()}.{column.lower()}" for table, column in cursor.fetchall()})
+        cursor.close()
+    except Exception as e:
+        return cached, str(e)[:200]
+    finally:
+        conn.close()
+
+    return {
+        'fingerprint': checksum,
+        'server_version': version,
+        'window_functions': supports_window_functions(version),
+        'columns': {table: sorted(names) for table, names in sorted(columns.items())},
+        'indexes': indexes,
+        'checked_at': now,
+        'changed_at': cached['changed_at'] if unchanged else now,
+    }, 'unchanged' if unchanged else 'changed' if cached else 'new'
+
+
+def refresh_fingerprints(settings: Dict, companies: List[Dict] = None, path: Path = FINGERPRINT_FILE,
+                         timeout: int = DEFAULT_TIMEOUT, force: bool = False) -> Tuple[Dict[str, Dict], Dict[str, str]]:
+    """Fingerprint every company concurrently and update the cache
+
+    Returns ({schema: fingerprint}, {schema: outcome}). With force, every
+    schema's details are fetched again even if its checksum matches.
+    """
+    companies = companies if companies is not None else load_companies()
+    cache = load_fingerprints(path)
+
+    def run(company):
+        return company['schema'], fingerprint_company(company, settings, cache.get(company['schema']), timeout, force)
+
+    fingerprints = dict(cache)
+    outcomes = {}
+    for schema, (fingerprint, outcome) in map_companies(run, companies):
+        if fingerprint is not None:
+            fingerprints[schema] = fingerprint
+        outcomes[schema] = outcome
+
+    save_fingerprints(fingerprints, path)
+    return fingerprints, outcomes
+
+
+def variant_supported(variant: Dict, fingerprint: Dict) -> bool:
+    """Whether the schema has every column and index the variant needs"""
+    for table, needed in variant['columns'].items():
+        if not set(needed) <= set(fingerprint['columns'].get(table, [])):
+            return False
+    return set(variant['indexes']) <= set(fingerprint['indexes'])
+
+
+def choose_query(fingerprint: Optional[Dict], plain_query: str) -> Tuple[str, str]:
+    """(variant name, SQL) for the volume comparison on one schema
+
+    Schemas that were never fingerprinted get the plain join.
+    """
+    if fingerprint:
+        for variant in COMPARE_VARIANTS:
+            if variant['query'] and variant_supported(variant, fingerprint):
+                return variant['name'], variant['query']
+    return 'plain', plain_query
+
+
+def print_fingerprints(fingerprints: Dict[str, Dict], outcomes: Dict[str, str], companies: List[Dict]):
+    """Version, window functions, chosen variant and missing expected columns per schema"""
+    print(f"{'Schema':<28} {'Server':<28} {'Window':<7} {'Variant':<10} {'Fingerprint':<17} Outcome")
+    print("-" * 110)
+    for company in companies:
+        schema = company['schema']
+        fingerprint = fingerprints.get(schema)
+        outcome = outcomes.get(schema, '-')
+        if not fingerprint:
+            print(f"{schema:<28} {'-':<28} {'-':<7} {'plain':<10} {'-':<17} {outcome[:40]}")
+            continue
+        variant, _ = choose_query(fingerprint, None)
+        window = "yes" if fingerprint['window_functions'] else "no"
+        print(f"{schema:<28} {fingerprint['server_version'][:27]:<28} {window:<7} {variant:<10} "
+              f"{fingerprint['fingerprint']:<17} {outcome[:40]}")
+
+    counts = {}
+    for outcome in outcomes.values():
+        key = outcome if outcome in ('unchanged', 'changed', 'new') else 'failed'
+        counts[key] = counts.get(key, 0) + 1
+    print(f"\n{counts.get('unchanged', 0)} unchanged, {counts.get('changed', 0)} changed, "
+          f"{counts.get('new', 0)} new, {counts.get('failed', 0)} failed")
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Fingerprint the BMS schemas and cache their capabilities")
+    parser.add_argument("--refresh", action="store_true", help="Fetch every schema's details, not only changed ones")
+    parser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT, help="Connect timeout in seconds")
+    parser.add_argument("--cache", default=str(FINGERPRINT_FILE), help="Fingerprint cache file")
+    args = parser.parse_args(argv)
+
+    from export_comparison_excel import db_settings
+
+    companies = load_companies()
+    start = time.time()
+    fingerprints, outcomes = refresh_fingerprints(db_settings(), companies, Path(args.cache), args.timeout, args.refresh)
+    print_fingerprints(fingerprints, outcomes, companies)
+    print(f"Fingerprinted {len(companies)} schemas in {time.time() - start:.1f}s - cache: {args.cache}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Serial number normalization and cross-source matching
+
+Serials arrive as strings from BMS but as ints/floats/padded strings from the
+Xerox Excel exports. canonical_serial() gives every loader the same exact key;
+loose_serial() is a secondary key used only to find near-matches (case,
+embedded spaces/dashes, leading zeros, known prefixes) when exact keys differ.
+"""
+
+import csv
+import re
+from collections import defaultdict
+from difflib import get_close_matches
+from typing import Dict, Iterable, List, Optional
+
+# Prefixes that sometimes appear in front of the serial in Xerox exports
+KNOWN_PREFIXES = ('S/N', 'SN')
+
+SEPARATORS = re.compile(r'[\s\-_./]+')
+
+
+def canonical_serial(value) -> Optional[str]:
+    """Exact join key: numeric cells rendered without '.0', surrounding whitespace stripped"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    serial = str(value).strip()
+    if serial.endswith('.0') and serial[:-2].isdigit():
+        serial = serial[:-2]
+    return serial or None
+
+
+def loose_serial(value) -> Optional[str]:
+    """Near-match key: uppercase, no separators, known prefixes and leading zeros removed"""
+    serial = canonical_serial(value)
+    if not serial:
+        return None
+    serial = serial.upper()
+    for prefix in KNOWN_PREFIXES:
+        if serial.startswith(prefix) and len(serial) > len(prefix):
+            serial = serial[len(prefix):].lstrip(':# ')
+            break
+    serial = SEPARATORS.sub('', serial)
+    return serial.lstrip('0') or serial
+
+
+def build_serial_index(serials: Iterable[str]) -> Dict:
+    """Index canonical serials by exact and loose key: {'exact': set, 'loose': {loose: [serials]}}"""
+    index = {'exact': set(), 'loose': defaultdict(list)}
+    for serial in serials:
+        serial = canonical_serial(serial)
+        if not serial or serial in index['exact']:
+            continue
+        index['exact'].add(serial)
+        index['loose'][loose_serial(serial)].append(serial)
+    return index
+
+
+def resolve_serial(index: Dict, serial) -> Optional[str]:
+    """Return the indexed serial matching `serial` exactly, else a unique loose match, else None"""
+    serial = canonical_serial(serial)
+    if not serial:
+        return None
+    if serial in index['exact']:
+        return serial
+    candidates = index['loose'].get(loose_serial(serial), [])
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def nearest_candidates(index: Dict, serial, limit: int = 3) -> List[str]:
+    """Closest indexed serials by string similarity of their loose keys"""
+    key = loose_serial(serial)
+    if not key:
+        return []
+    # Only compare against keys of similar length - keeps this cheap on large fleets
+    pool = [k for k in index['loose'] if k and abs(len(k) - len(key)) <= 2]
+    close = get_close_matches(key, pool, n=limit, cutoff=0.8)
+    return [s for loose in close for s in index['loose'][loose]][:limit]
+
+
+def match_serials(source_serials: Iterable[str], target_index: Dict) -> Dict:
+    """Match source serials against a target index
+
+    Returns {'exact': {src: tgt}, 'near': {src: tgt}, 'unmatched': {src: [candidates]}}
+    """
+    result = {'exact': {}, 'near': {}, 'unmatched': {}}
+    for serial in source_serials:
+        serial = canonical_serial(serial)
+        if not serial:
+            continue
+        if serial in target_index['exact']:
+            result['exact'][serial] = serial
+            continue
+        resolved = resolve_serial(target_index, serial)
+        if resolved:
+            result['near'][serial] = resolved
+        else:
+            result['unmatched'][serial] = nearest_candidates(target_index, serial)
+    return result
+
+
+def rekey_to_target(data: Dict, target_index: Dict, label: str) -> Dict:
+    """Re-key a {serial: ...} dict onto target serials via near-matches, printing a short report
+
+    Exact and near-matched serials end up keyed by the target serial; unmatched
+    serials keep their own key. The match result is returned for reporting.
+    """
+    matches = match_serials(list(data.keys()), target_index)
+    for source, target in matches['near'].items():
+        if target not in data:
+            data[target] = data.pop(source)
+
+    print(f"  {label}: {len(matches['exact'])} exact, {len(matches['near'])} near-matched, "
+          f"{len(matches['unmatched'])} unmatched serials")
+    return matches
+
+
+def write_unmatched_report(reports: Dict[str, Dict], output_path: str) -> int:
+    """Write near-matches and unmatched serials with their nearest candidates to CSV"""
+    written = 0
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['source', 'serial', 'match', 'matched_serial', 'nearest_candidates'])
+        for source, matches in reports.items():
+            for serial, target in sorted(matches['near'].items()):
+                writer.writerow([source, serial, 'NEAR', target, ''])
+                written += 1
+            for serial, candidates in sorted(matches['unmatched'].items()):
+                writer.writerow([source, serial, 'UNMATCHED', '', '; '.join(candidates)])
+                written += 1
+    return written
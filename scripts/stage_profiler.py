@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Low-overhead sampling profiler for pipeline stages
+
+A background thread samples every thread's stack (sys._current_frames) every
+JETLINE_PROFILE_INTERVAL_MS (default 5 ms) while a stage runs - nothing is
+traced, so the stage runs at close to full speed on production-sized data.
+Results are written next to the reports:
+- Profile_<run>[_<stage>].collapsed   flamegraph.pl / speedscope collapsed stacks
+- Profile_<run>[_<stage>].txt         top functions by self and inclusive samples
+
+Enable with JETLINE_PROFILE=<stage name> (a run manifest stage, e.g.
+calculate_incremental_volumes) or JETLINE_PROFILE=all for the whole run, or
+with --profile on the jetline extract/performance/pipeline commands.
+
+    python3 scripts/stage_profiler.py Profile_export.collapsed --top 30   # re-summarise a profile
+"""
+
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_INTERVAL_MS = 5
+DEFAULT_TOP = 25
+
+
+def profile_target() -> Optional[str]:
+    """Stage to profile from JETLINE_PROFILE ('all' for the whole run, None when off)"""
+    return os.getenv("JETLINE_PROFILE") or None
+
+
+def frame_label(code) -> str:
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+def thread_group(name: str) -> str:
+    """Pool workers share one root (ThreadPoolExecutor-0_3 -> ThreadPoolExecutor-0)"""
+    return re.sub(r"_\d+$", "", name)
+
+
+class SamplingProfiler:
+    """Samples all thread stacks on an interval into collapsed-stack counts"""
+
+    def __init__(self, interval_ms: float = None):
+        interval_ms = interval_ms or float(os.getenv("JETLINE_PROFILE_INTERVAL_MS", DEFAULT_INTERVAL_MS))
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = None
+        self.seconds = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, name="jetline-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.seconds = time.time() - self.started
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: thread_group(t.name) for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def write(self, output_dir: Path, name: str, top: int = DEFAULT_TOP) -> Tuple[Path, Path]:
+        """Write the collapsed stacks and the top-N summary"""
+        collapsed_path = Path(output_dir) / f"Profile_{name}.collapsed"
+        with open(collapsed_path, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{';'.join(stack)} {count}\n")
+
+        summary_path = Path(output_dir) / f"Profile_{name}.txt"
+        header = f"Profile {name}: {self.samples} samples every {self.interval * 1000:g} ms over {self.seconds:.1f}s"
+        with open(summary_path, 'w') as f:
+            f.write(summary_text(self.stacks, top, header))
+        return collapsed_path, summary_path
+
+
+def summary_text(stacks: Dict[Tuple[str, ...], int], top: int, header: str) -> str:
+    """Top functions by self samples (leaf frame) and inclusive samples (anywhere on the stack)
+
+    Percentages are of all thread-samples, so threads idling in a pool count too.
+    """
+    total = sum(stacks.values()) or 1
+    own = Counter()
+    inclusive = Counter()
+    for stack, count in stacks.items():
+        frames = stack[1:]  # first entry is the thread
+        if frames:
+            own[frames[-1]] += count
+        for label in set(frames):
+            inclusive[label] += count
+
+    lines = [header, ""]
+    for title, counts in (("Self", own), ("Inclusive", inclusive)):
+        lines.append(f"Top {top} by {title.lower()} samples")
+        lines.append(f"{title:>9} {'%':>6}  Function")
+        for label, count in counts.most_common(top):
+            lines.append(f"{count:>9} {count / total * 100:>5.1f}%  {label}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def load_collapsed(path: Path) -> Counter:
+    stacks = Counter()
+    with open(path, 'r') as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack:
+                stacks[tuple(stack.split(";"))] += int(count)
+    return stacks
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Summarise a collapsed-stack profile")
+    parser.add_argument("collapsed", help="Profile_<run>[_<stage>].collapsed")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP, help="Functions to list")
+    parser.add_argument("--thread", help="Only stacks of this thread group (e.g. MainThread)")
+    args = parser.parse_args(argv)
+
+    stacks = load_collapsed(Path(args.collapsed))
+    if args.thread:
+        stacks = Counter({s: c for s, c in stacks.items() if s[0] == args.thread})
+    print(summary_text(stacks, args.top, f"{args.collapsed}: {sum(stacks.values())} thread-samples"), end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic fleets for benchmarking without BMS or Xerox access
+
+generate_fleet() builds companies, machines and meter readings in the shape
+export_comparison_excel.query_all_databases returns:
+(serial, model, status, date, category, install_date, datetime, total, a3, black, large, colour, xl, meterreadingid, meterreading_no, company)
+with the awkward parts of the real data: several readings on one day (later
+corrections), meter resets, BMS-only serials and Xerox-only serials. The
+write_* functions produce matching Xerox workbooks in the formats the
+reporting scripts read. The same seed always gives the same fleet.
+
+    python3 scripts/synthetic_fleet.py --serials 500 --out /tmp/fleet
+"""
+
+import argparse
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+DEFAULT_SPEC = {
+    'companies': 10,
+    'serials': 1000,            # machines across all companies
+    'months': 24,               # history ending at end_month
+    'readings_per_month': 4,
+    'same_day_rate': 0.05,      # share of readings followed by a same-day correction
+    'reset_rate': 0.002,        # share of readings where the meter restarts from zero
+    'bms_only_rate': 0.05,      # machines Xerox doesn't report on
+    'xerox_only_rate': 0.05,    # Xerox serials with no BMS machine
+    'xerox_noise_rate': 0.1,    # Xerox month volumes that disagree with BMS
+    'end_month': '2025-11',
+    'seed': 42,
+}
+
+MODELS = [
+    ('AltaLink C8130', 'Colour'), ('AltaLink C8145', 'Colour'), ('VersaLink C7020', 'Colour'),
+    ('AltaLink B8145', 'Mono'), ('VersaLink B7025', 'Mono'), ('PrimeLink C9065', 'Production'),
+]
+
+METER_FIELDS = ('a3', 'black', 'large', 'colour', 'xl')
+
+
+def fleet_spec(**overrides) -> Dict:
+    """DEFAULT_SPEC with overrides (unknown keys are an error)"""
+    unknown = set(overrides) - set(DEFAULT_SPEC)
+    if unknown:
+        raise ValueError(f"Unknown fleet parameters: {', '.join(sorted(unknown))}")
+    return dict(DEFAULT_SPEC, **overrides)
+
+
+def month_starts(end_month: str, months: int) -> List[date]:
+    """First day of each month, oldest first, ending at end_month (YYYY-MM)"""
+    year, month = (int(part) for part in end_month.split('-'))
+    starts = []
+    for _ in range(months):
+        starts.append(date(year, month, 1))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return starts[::-1]
+
+
+def generate_fleet(spec: Dict = None) -> Dict:
+    """Companies, machines, BMS readings and Xerox-side serials for one spec
+
+    Returns {'spec', 'companies': [{'schema', 'name'}], 'machines': {serial: {...}},
+    'readings': [raw_results tuple], 'xerox_serials': [serial]}.
+    """
+    spec = spec or fleet_spec()
+    rng = random.Random(spec['seed'])
+    months = month_starts(spec['end_month'], spec['months'])
+    history_start = months[0]
+
+    companies = [{'schema': f"store{i:02d}bms2", 'name': f"Store {i:02d}"} for i in range(1, spec['companies'] + 1)]
+
+    machines = {}
+    readings = []
+    reading_id = 100000
+    for i in range(spec['serials']):
+        serial = f"{3100000000 + rng.randrange(1, 99999999):010d}"
+        while serial in machines:
+            serial = f"{3100000000 + rng.randrange(1, 99999999):010d}"
+        model, category = rng.choice(MODELS)
+        company = companies[i % len(companies)]['name']
+        install = history_start - timedelta(days=rng.randrange(0, 1500))
+        machines[serial] = {
+            'model': model, 'category': category, 'company': company, 'install_date': install,
+            'bms_only': rng.random() < spec['bms_only_rate'],
+        }
+
+        # Monthly page volume per meter for this machine
+        colour_share = 0.0 if category == 'Mono' else rng.uniform(0.1, 0.5)
+        base_volume = rng.randrange(500, 20000)
+        counters = {field: rng.randrange(0, 500000) for field in METER_FIELDS}
+
+        for month in months:
+            days = sorted(rng.sample(range(28), min(spec['readings_per_month'], 28)))
+            for day in days:
+                if rng.random() < spec['reset_rate']:
+                    counters = {field: 0 for field in METER_FIELDS}
+                per_reading = base_volume / spec['readings_per_month'] * rng.uniform(0.5, 1.5)
+                counters['black'] += int(per_reading * (1 - colour_share) * 0.8)
+                counters['a3'] += int(per_reading * (1 - colour_share) * 0.15)
+                counters['large'] += int(per_reading * 0.03)
+                counters['xl'] += int(per_reading * 0.02)
+                counters['colour'] += int(per_reading * colour_share)
+
+                reading_date = month + timedelta(days=day)
+                created = datetime.combine(reading_date, datetime.min.time()) + timedelta(hours=rng.randrange(7, 17))
+                copies = 2 if rng.random() < spec['same_day_rate'] else 1
+                for copy in range(copies):
+                    if copy:
+                        # Same-day correction: captured later, slightly higher
+                        created += timedelta(minutes=rng.randrange(5, 120))
+                        counters['black'] += rng.randrange(1, 50)
+                    reading_id += 1
+                    values = [counters[field] for field in METER_FIELDS]
+                    readings.append((
+                        serial, model, 1, reading_date, category, install, created,
+                        sum(values), *values, reading_id, f"MR{reading_id}", company
+                    ))
+
+    xerox_serials = [s for s, m in machines.items() if not m['bms_only']]
+    for _ in range(int(spec['serials'] * spec['xerox_only_rate'])):
+        xerox_serials.append(f"{3900000000 + rng.randrange(1, 99999999):010d}")
+
+    readings.sort(key=lambda r: (r[0], r[3], r[6]))
+    return {'spec': spec, 'companies': companies, 'machines': machines,
+            'readings': readings, 'xerox_serials': xerox_serials}
+
+
+def monthly_volumes(fleet: Dict) -> Dict[str, Dict[str, Dict]]:
+    """{serial: {Mon-YYYY: {a3_mono, a4_mono, a3_color, a4_color, total}}} as Xerox would report it
+
+    The movement between two month-end readings is billed in the following
+    month, as the export reports it (meter resets count from zero); a share
+    of cells is perturbed.
+    """
+    rng = random.Random(fleet['spec']['seed'] + 1)
+    month_end = defaultdict(dict)
+    for row in fleet['readings']:
+        month_end[row[0]][row[3].strftime("%Y-%m")] = row
+
+    volumes = {}
+    for serial in fleet['xerox_serials']:
+        by_month = {}
+        previous = None
+        for key in sorted(month_end.get(serial, {})):
+            row = month_end[serial][key]
+            a3, black, large, colour, xl = row[8:13]
+            if previous is not None and row[7] >= previous[7]:
+                deltas = [a3 - previous[8], black - previous[9] + large - previous[10] + xl - previous[12],
+                          0, colour - previous[11]]
+            else:
+                deltas = [a3, black + large + xl, 0, colour] if previous is not None else None
+            previous = row
+            if deltas is None:
+                continue
+            if rng.random() < fleet['spec']['xerox_noise_rate']:
+                deltas[1] = int(deltas[1] * rng.uniform(0.7, 1.3))
+            billed = (row[3].replace(day=1) + timedelta(days=32)).replace(day=1)
+            by_month[billed.strftime("%b-%Y")] = dict(zip(('a3_mono', 'a4_mono', 'a3_color', 'a4_color'), deltas),
+                                                      total=sum(deltas))
+        if not by_month:
+            # Xerox-only serial: volumes with no BMS counterpart
+            for month in month_starts(fleet['spec']['end_month'], 6):
+                a4 = rng.randrange(100, 5000)
+                by_month[month.strftime("%b-%Y")] = {'a3_mono': 0, 'a4_mono': a4, 'a3_color': 0, 'a4_color': 0, 'total': a4}
+        volumes[serial] = by_month
+    return volumes
+
+
+def customer_for(fleet: Dict, serial: str) -> str:
+    machine = fleet['machines'].get(serial)
+    return machine['company'].upper() if machine else "XEROX DIRECT"
+
+
+def product_for(fleet: Dict, serial: str) -> str:
+    machine = fleet['machines'].get(serial)
+    return machine['model'] if machine else "VersaLink B7025"
+
+
+def write_volumes_workbook(fleet: Dict, path: Path) -> int:
+    """'Volumes from Xerox.xlsx' layout: Customer, Model, Serial, Month, A3/A4 mono/colour, Total"""
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Volumes")
+    ws.append(["Customer", "Model", "Serial Number", "Month", "A3 Mono", "A4 Mono", "A3 Color", "A4 Color", "Total"])
+    rows = 0
+    for serial, by_month in monthly_volumes(fleet).items():
+        for month, v in by_month.items():
+            ws.append([customer_for(fleet, serial), product_for(fleet, serial), serial, month,
+                       v['a3_mono'], v['a4_mono'], v['a3_color'], v['a4_color'], v['total']])
+            rows += 1
+    wb.save(path)
+    return rows
+
+
+def write_device_meters_workbook(fleet: Dict, path: Path) -> int:
+    """'Device Current Meters' layout: Customer, Product, Serial, Meter, Reading, Last Reading Date
+
+    One row per meter type; some devices report only Black/Color (no Total).
+    """
+    import openpyxl
+
+    rng = random.Random(fleet['spec']['seed'] + 2)
+    latest = {}
+    for row in fleet['readings']:
+        latest[row[0]] = row
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Device Meters")
+    ws.append(["Customer", "Product", "Serial Number", "Meter Description", "Reading", "Last Reading Date"])
+    rows = 0
+    for serial in fleet['xerox_serials']:
+        row = latest.get(serial)
+        if row is None:
+            continue
+        a3, black, large, colour, xl = row[8:13]
+        last_date = datetime.combine(row[3], datetime.min.time()) + timedelta(days=rng.randrange(0, 20))
+        meters = [("Black Impressions", a3 + black + large + xl), ("Color Impressions", colour)]
+        if rng.random() < 0.8:
+            meters.append(("Total Impressions", row[7]))
+        for description, reading in meters:
+            ws.append([customer_for(fleet, serial), product_for(fleet, serial), serial, description, reading, last_date])
+            rows += 1
+    wb.save(path)
+    return rows
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic fleet and matching Xerox workbooks")
+    for key, default in DEFAULT_SPEC.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(default), default=default)
+    parser.add_argument("--out", required=True, help="Output directory for the workbooks")
+    args = parser.parse_args(argv)
+
+    spec = fleet_spec(**{key: getattr(args, key) for key in DEFAULT_SPEC})
+    fleet = generate_fleet(spec)
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    volume_rows = write_volumes_workbook(fleet, out / "Volumes from Xerox.xlsx")
+    meter_rows = write_device_meters_workbook(fleet, out / "Device Current Meters based on last Reading Date.xlsx")
+    print(f"✓ {len(fleet['machines'])} machines, {len(fleet['readings'])} readings")
+    print(f"✓ {volume_rows} volume rows, {meter_rows} device meter rows in {out}")
+
+
+if __name__ == "__main__":
+    main()
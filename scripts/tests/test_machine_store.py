@@ -0,0 +1,43 @@
+"""MachineStore only records real changes (python3 -m pytest scripts/tests)"""
+
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from machine_store import MachineStore, machine_rows  # noqa: E402
+
+
+def reading(total, day):
+    # (serial, model, status, date, category, install_date, datetime, total, a3, black, large, colour, xl,
+    #  meterreadingid, meterreading_no, company)
+    return ('3135455511', 'C8030', 1, date(2026, 3, day), 'Colour', date(2020, 1, 6),
+            datetime(2026, 3, day, 9), total, 0, total, 0, 0, 0, day, f"MR{day}", 'Store A')
+
+
+class UpsertTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = MachineStore(Path(self.tmp.name) / "store.db")
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_identical_upsert_is_unchanged(self):
+        machines = machine_rows([reading(1000, 1), reading(1200, 8)])
+        self.assertEqual(self.store.upsert(machines), {'inserted': 1, 'updated': 0, 'unchanged': 0})
+        self.assertEqual(self.store.upsert(machines), {'inserted': 0, 'updated': 0, 'unchanged': 1})
+        self.assertEqual(self.store.upsert(machines), {'inserted': 0, 'updated': 0, 'unchanged': 1})
+
+    def test_new_reading_is_an_update(self):
+        self.store.upsert(machine_rows([reading(1000, 1)]))
+        self.assertEqual(self.store.upsert(machine_rows([reading(1000, 1), reading(1500, 9)])),
+                         {'inserted': 0, 'updated': 1, 'unchanged': 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
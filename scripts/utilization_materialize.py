@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Precompute the lift page's utilization metrics into machine_utilization
+
+webapp/src/app/api/machines/utilization/route.ts used to load 12 months of
+readings for every active machine on each request and fold them in
+JavaScript. This job computes the same per-machine fields once per sync -
+volumes (MTD/3m/6m/12m), duty-cycle utilization, trend, FSMA lease cost and
+liftScore with its insights - and replaces the table's contents in one
+transaction, so the route only reads rows.
+
+Per-reading work happens in one GROUP BY in PostgreSQL (machine × month);
+Python only walks the at most 13 monthly aggregates per machine, with the
+route's rules ported one for one (DATABASE_URL, needs psycopg2).
+
+The route only serves a snapshot that is newer than the last completed sync
+and from the current month. With WEBAPP_WRITEBACK=true (or `jetline extract
+--webapp-writeback`) the export rebuilds it after its own publish and whenever
+it finds it stale; otherwise, and after a webapp sync, run
+`jetline utilization --if-stale` (cheap when nothing changed - suitable for
+cron right after the sync schedule).
+"""
+
+import argparse
+import json
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from readings_source import connect_webapp
+from webapp_publish import CsvStream
+
+# Default duty cycles by category (monthly prints), as in the route
+DUTY_CYCLES = {
+    "Colour": 8000,
+    "Black and White": 15000,
+    "Office Machine": 5000,
+    "Plan": 3000,
+    "default": 10000,
+}
+
+# The route fetches max(months, 12) × 30 days of readings; the snapshot covers its default
+WINDOW_MONTHS = 12
+
+SNAPSHOT_COLUMNS = [
+    'machine_id', 'avg_monthly_volume', 'volume_mtd', 'volume_3m', 'volume_6m', 'volume_12m',
+    'duty_cycle', 'utilization_percent', 'utilization_status', 'volume_trend', 'trend_direction',
+    'days_since_last_reading', 'machine_age_months', 'monthly_cost', 'mono_cost', 'colour_cost',
+    'has_rates', 'lift_score', 'insights', 'computed_at',
+]
+
+MACHINES_QUERY = """
+SELECT
+    m.id,
+    cat.name,
+    COALESCE(pm.is_color, cat.name = 'Colour'),
+    m.rental_months_remaining,
+    m.install_date,
+    m.is_lifted,
+    rate.machine_id IS NOT NULL,
+    rate.a4_mono, rate.a3_mono, rate.a4_colour, rate.a3_colour, rate.colour_extra_large
+FROM machines m
+LEFT JOIN categories cat ON cat.id = m.category_id
+LEFT JOIN printer_models pm ON pm.id = m.model_id
+LEFT JOIN LATERAL (
+    SELECT * FROM machine_rates mr WHERE mr.machine_id = m.id ORDER BY mr.rates_from DESC LIMIT 1
+) rate ON true
+WHERE m.status = 'ACTIVE'
+"""
+
+SNAPSHOT_AGE_QUERY = """
+SELECT
+    (SELECT MAX(computed_at) FROM machine_utilization),
+    (SELECT MAX(completed_at) FROM sync_logs WHERE status = 'COMPLETED')
+"""
+
+# One row per machine and calendar month (month as year * 12 + month - 1), oldest first
+MONTHLY_QUERY = """
+SELECT
+    r.machine_id,
+    EXTRACT(YEAR FROM r.reading_date)::int * 12 + EXTRACT(MONTH FROM r.reading_date)::int - 1,
+    SUM(r.incremental_total) FILTER (WHERE r.incremental_total > 0)::bigint,
+    SUM(COALESCE(r.incremental_black, 0))::bigint,
+    SUM(COALESCE(r.incremental_colour, 0))::bigint,
+    SUM(COALESCE(r.incremental_a3, 0))::bigint,
+    SUM(COALESCE(r.incremental_xl, 0))::bigint,
+    MAX(r.reading_date)
+FROM meter_readings r
+JOIN machines m ON m.id = r.machine_id
+WHERE m.status = 'ACTIVE' AND r.reading_date >= %s
+GROUP BY 1, 2
+ORDER BY 1, 2
+"""
+
+
+def js_round(value: float) -> int:
+    """Math.round: halves go up"""
+    return math.floor(value + 0.5)
+
+
+def month_index(d: datetime) -> int:
+    return d.year * 12 + d.month - 1
+
+
+def lease_cost(months: List[tuple], rate: tuple, is_color: bool) -> Dict[str, float]:
+    """calculateCostFromIncrementals on the average month (webapp/src/lib/cost.ts)"""
+    count = len(months)
+    black, colour, a3, xl = (sum(m[i] for m in months) / count for i in range(2, 6))
+    mono_rate, a3_mono_rate, colour_rate, a3_colour_rate, xl_rate = (float(r or 0) for r in rate)
+
+    mono = black * mono_rate
+    colour_cost = colour * colour_rate
+    a3_mono = a3_colour = 0.0
+    if is_color and a3_colour_rate > 0:
+        a3_colour = a3 * a3_colour_rate
+    else:
+        a3_mono = a3 * a3_mono_rate
+    xl_cost = xl * xl_rate
+    return {'monthly_cost': mono + colour_cost + a3_mono + a3_colour + xl_cost,
+            'mono_cost': mono + a3_mono, 'colour_cost': colour_cost + a3_colour + xl_cost}
+
+
+def machine_metrics(machine: tuple, months: List[tuple], now: datetime) -> Dict:
+    """The route's per-machine fields, from (month, volume, black, colour, a3, xl, last_date) aggregates"""
+    (machine_id, category, is_color, months_remaining, install_date, is_lifted, has_rates, *rate) = machine
+    duty_cycle = DUTY_CYCLES.get(category or "default", DUTY_CYCLES["default"])
+    current = month_index(now)
+
+    # Months with any positive incremental total, oldest first
+    volumes = [(m[0], m[1]) for m in months if m[1]]
+    volume_mtd = sum(v for index, v in volumes if index == current)
+    window = {n: sum(v for index, v in volumes if 0 <= current - index < n) for n in (3, 6, 12)}
+    avg_volume = js_round(sum(v for _, v in volumes) / len(volumes)) if volumes else 0
+
+    cost = {'monthly_cost': 0.0, 'mono_cost': 0.0, 'colour_cost': 0.0}
+    if has_rates and months:
+        cost = lease_cost(months, rate, bool(is_color))
+
+    utilization = js_round(avg_volume / duty_cycle * 100) if duty_cycle > 0 else 0
+    if utilization < 20:
+        status = "critical"
+    elif utilization < 40:
+        status = "low"
+    elif utilization <= 80:
+        status = "optimal"
+    elif utilization <= 100:
+        status = "high"
+    else:
+        status = "overworked"
+
+    # Last 2 volume months against the 2 before them
+    trend, direction = 0, "stable"
+    if len(volumes) >= 4:
+        recent = (volumes[-1][1] + volumes[-2][1]) / 2
+        previous = (volumes[-3][1] + volumes[-4][1]) / 2
+        if previous > 0:
+            trend = js_round((recent - previous) / previous * 100)
+            direction = "up" if trend > 5 else "down" if trend < -5 else "stable"
+
+    last_date = months[-1][6] if months else None
+    days_since = (now - datetime.combine(last_date, datetime.min.time())).days if last_date else None
+    age_months = math.floor((now - install_date).total_seconds() / (86400 * 30)) if install_date else None
+
+    score = 50
+    insights = []
+    if utilization < 20:
+        score += 30
+        insights.append(f"Critical underutilization ({utilization}%) - strong lift candidate")
+    elif utilization < 40:
+        score += 20
+        insights.append(f"Low utilization ({utilization}%) - consider relocating")
+    elif utilization > 100:
+        score -= 20
+        insights.append(f"Overworked ({utilization}%) - needs support or replacement")
+
+    if direction == "down" and trend < -20:
+        score += 15
+        insights.append(f"Volume declining {abs(trend)}% - may need relocation")
+    elif direction == "up" and trend > 20:
+        score -= 10
+        insights.append(f"Volume growing {trend}% - high demand location")
+
+    if months_remaining is not None:
+        if months_remaining <= 3:
+            score -= 25
+            insights.append(f"Contract ends in {months_remaining} months - avoid moving")
+        elif months_remaining <= 6:
+            score -= 10
+            insights.append(f"Contract ends in {months_remaining} months - consider timing")
+
+    if days_since is not None and days_since > 60:
+        score += 10
+        insights.append(f"No readings for {days_since} days - may be inactive")
+
+    if age_months is not None and age_months > 60:
+        score += 5
+        insights.append(f"Machine is {age_months // 12} years old")
+
+    if is_lifted:
+        score = 0
+        insights.insert(0, "Already marked for lift in BMS")
+
+    return {
+        'machine_id': machine_id, 'avg_monthly_volume': avg_volume, 'volume_mtd': volume_mtd,
+        'volume_3m': window[3], 'volume_6m': window[6], 'volume_12m': window[12],
+        'duty_cycle': duty_cycle, 'utilization_percent': utilization, 'utilization_status': status,
+        'volume_trend': trend, 'trend_direction': direction,
+        'days_since_last_reading': days_since, 'machine_age_months': age_months,
+        **cost, 'has_rates': bool(has_rates), 'lift_score': max(0, min(100, score)),
+        'insights': json.dumps(insights), 'computed_at': now,
+    }
+
+
+def snapshot_stale(computed_at: Optional[datetime], last_sync: Optional[datetime], now: datetime) -> bool:
+    """The route's rule: a snapshot older than the last completed sync, or from an earlier month, is not served"""
+    if computed_at is None:
+        return True
+    if last_sync is not None and computed_at < last_sync:
+        return True
+    return (computed_at.year, computed_at.month) != (now.year, now.month)
+
+
+def snapshot_rows(machines: Iterable[tuple], monthly: Iterable[tuple], now: datetime) -> Iterator[List]:
+    """SNAPSHOT_COLUMNS rows for every machine (monthly: MONTHLY_QUERY rows)"""
+    by_machine = {}
+    for row in monthly:
+        by_machine.setdefault(row[0], []).append(row[1:])
+    for machine in machines:
+        metrics = machine_metrics(machine, by_machine.get(machine[0], []), now)
+        yield [metrics[c] for c in SNAPSHOT_COLUMNS]
+
+
+def materialize(database_url: str = None, only_if_stale: bool = False) -> Optional[Dict]:
+    """Recompute machine_utilization for all active machines; returns {'machines', 'seconds'}
+
+    With only_if_stale, returns None without recomputing when the route would still serve the snapshot.
+    """
+    start = time.time()
+    # Prisma stores DateTime as UTC without a time zone
+    now = datetime.utcnow()
+    since = (now - timedelta(days=WINDOW_MONTHS * 30)).date()
+
+    conn = connect_webapp(database_url)
+    try:
+        with conn:
+            cursor = conn.cursor()
+            if only_if_stale:
+                cursor.execute(SNAPSHOT_AGE_QUERY)
+                if not snapshot_stale(*cursor.fetchone(), now):
+                    cursor.close()
+                    return None
+            cursor.execute(MACHINES_QUERY)
+            machines = cursor.fetchall()
+            cursor.execute(MONTHLY_QUERY, (since,))
+            monthly = cursor.fetchall()
+
+            stream = CsvStream(snapshot_rows(machines, monthly, now))
+            # Readers keep seeing the previous snapshot until this commits
+            cursor.execute("DELETE FROM machine_utilization")
+            cursor.copy_expert(
+                f"COPY machine_utilization ({', '.join(SNAPSHOT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", stream)
+            cursor.close()
+    finally:
+        conn.close()
+
+    return {'machines': stream.count, 'seconds': round(time.time() - start, 1)}
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Recompute the webapp's machine_utilization snapshot")
+    parser.add_argument("--if-stale", action="store_true",
+                        help="Only recompute when a sync completed since the last snapshot (or the month changed)")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    result = materialize(only_if_stale=args.if_stale)
+    if result is None:
+        print("✓ Utilization snapshot is current - nothing to do")
+        return
+    print(f"✓ Utilization of {result['machines']:,} machines materialized ({result['seconds']}s)")
+
+
+if __name__ == "__main__":
+    main()
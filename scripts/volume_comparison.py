@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Tolerance-based comparison engine for BMS vs Xerox monthly volumes
+
+align_volumes() flattens both sources once into parallel (serial, month) columns
+with the absolute and percentage differences precomputed. evaluate() then applies
+an absolute/relative tolerance in a single pass over those columns, so rerunning
+with different tolerances does not touch the source data again.
+
+The aligned columns can be saved to JSON and re-evaluated offline:
+    python3 scripts/volume_comparison.py Volume_Alignment.json --abs-tol 250 --rel-tol 2
+"""
+
+import argparse
+import csv
+import json
+from array import array
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+
+# Legacy rule: match if absolute difference < 100 or within 5%
+DEFAULT_ABS_TOLERANCE = 100
+DEFAULT_REL_TOLERANCE = 5.0
+
+
+def month_sort_key(month_year: str):
+    """Sort 'Mon-YYYY' labels chronologically (unknown labels last)"""
+    try:
+        return datetime.strptime(month_year, "%b-%Y")
+    except (TypeError, ValueError):
+        return datetime.max
+
+
+def align_volumes(excel_data: Dict, db_data: Dict) -> Dict:
+    """Flatten Excel and BMS volumes into aligned (serial, month) columns
+
+    excel_data: {serial: {month: volume}} or {serial: {month: {'total': volume, ...}}}
+    db_data:    {serial: {month: {'volume', 'model', 'company', ...}}}
+
+    Only serials present in both sources are aligned; months present in only one
+    source are counted as db_only / excel_only.
+    """
+    aligned = {
+        'serial': [], 'month': [], 'company': [], 'model': [],
+        'db': array('d'), 'excel': array('d'), 'diff': array('d'), 'pct': array('d'),
+        'serials_in_both': 0, 'serials_db_only': 0, 'serials_excel_only': 0,
+        'db_only': 0, 'excel_only': 0
+    }
+
+    for serial in sorted(set(excel_data.keys()) | set(db_data.keys())):
+        excel_months = excel_data.get(serial, {})
+        db_months = db_data.get(serial, {})
+
+        if excel_months and db_months:
+            aligned['serials_in_both'] += 1
+        elif db_months:
+            aligned['serials_db_only'] += 1
+            continue
+        else:
+            aligned['serials_excel_only'] += 1
+            continue
+
+        first = next(iter(db_months.values()))
+        company = first.get('company')
+        model = first.get('model')
+
+        for month in sorted(set(excel_months.keys()) | set(db_months.keys()), key=month_sort_key):
+            db_vol = db_months.get(month, {}).get('volume')
+            excel_vol = excel_months.get(month)
+            if isinstance(excel_vol, dict):
+                excel_vol = excel_vol.get('total')
+
+            if db_vol is None or excel_vol is None:
+                if db_vol is not None:
+                    aligned['db_only'] += 1
+                elif excel_vol is not None:
+                    aligned['excel_only'] += 1
+                continue
+
+            diff = abs(db_vol - excel_vol)
+            aligned['serial'].append(serial)
+            aligned['month'].append(month)
+            aligned['company'].append(company)
+            aligned['model'].append(model)
+            aligned['db'].append(db_vol)
+            aligned['excel'].append(excel_vol)
+            aligned['diff'].append(diff)
+            # Same as the legacy rule: no percentage when Xerox volume is 0
+            aligned['pct'].append(diff / excel_vol * 100 if excel_vol > 0 else 0.0)
+
+    return aligned
+
+
+def save_aligned(aligned: Dict, output_path: str):
+    """Persist aligned columns as JSON for offline re-evaluation"""
+    data = {k: (list(v) if isinstance(v, array) else v) for k, v in aligned.items()}
+    with open(output_path, 'w') as f:
+        json.dump(data, f)
+
+
+def load_aligned(filepath: str) -> Dict:
+    """Load aligned columns saved by save_aligned()"""
+    with open(filepath, 'r') as f:
+        data = json.load(f)
+    for key in ('db', 'excel', 'diff', 'pct'):
+        data[key] = array('d', data[key])
+    return data
+
+
+def evaluate(aligned: Dict, abs_tol: float = DEFAULT_ABS_TOLERANCE, rel_tol: float = DEFAULT_REL_TOLERANCE) -> List[bool]:
+    """Match mask over the aligned pairs: diff < abs_tol or pct < rel_tol"""
+    return [d < abs_tol or p < rel_tol for d, p in zip(aligned['diff'], aligned['pct'])]
+
+
+def rollup(aligned: Dict, matches: List[bool], key: str) -> Dict:
+    """Accuracy by 'company', 'model' or 'month': {value: {matches, mismatches, accuracy}}"""
+    counts = defaultdict(lambda: [0, 0])
+    for value, matched in zip(aligned[key], matches):
+        counts[value][0 if matched else 1] += 1
+
+    result = {}
+    for value, (matched, mismatched) in counts.items():
+        result[value] = {
+            'matches': matched,
+            'mismatches': mismatched,
+            'accuracy': matched / (matched + mismatched) * 100
+        }
+    return result
+
+
+def write_mismatches(aligned: Dict, matches: List[bool], output_path: str) -> int:
+    """Write every mismatching (serial, month) pair to CSV, returns rows written"""
+    written = 0
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['serial', 'month', 'company', 'model', 'db_volume', 'excel_volume', 'diff', 'pct_diff'])
+        for i, matched in enumerate(matches):
+            if matched:
+                continue
+            writer.writerow([
+                aligned['serial'][i], aligned['month'][i], aligned['company'][i], aligned['model'][i],
+                aligned['db'][i], aligned['excel'][i], aligned['diff'][i], round(aligned['pct'][i], 2)
+            ])
+            written += 1
+    return written
+
+
+def print_summary(aligned: Dict, matches: List[bool], abs_tol: float, rel_tol: float):
+    """Print totals plus per-company, per-model and per-month accuracy"""
+    total_matches = sum(matches)
+    total_mismatches = len(matches) - total_matches
+
+    print("\n" + "="*80)
+    print(f"SUMMARY (match if diff < {abs_tol:,.0f} or within {rel_tol:g}%)")
+    print("="*80)
+    print(f"Serials in both:     {aligned['serials_in_both']}")
+    print(f"Serials DB only:     {aligned['serials_db_only']}")
+    print(f"Serials Excel only:  {aligned['serials_excel_only']}")
+    print("\nMonth-by-month comparison (incremental volumes):")
+    print(f"  Matches:           {total_matches}")
+    print(f"  Mismatches:        {total_mismatches}")
+    print(f"  DB only:           {aligned['db_only']}")
+    print(f"  Excel only:        {aligned['excel_only']}")
+
+    if matches:
+        print(f"\nAccuracy: {total_matches / len(matches) * 100:.1f}%")
+
+    for key, label in (('company', 'COMPANY'), ('model', 'MODEL'), ('month', 'MONTH')):
+        stats = rollup(aligned, matches, key)
+        if not stats:
+            continue
+        print(f"\nACCURACY BY {label}")
+        order = sorted(stats, key=month_sort_key) if key == 'month' else sorted(stats, key=lambda v: stats[v]['accuracy'])
+        for value in order:
+            s = stats[value]
+            print(f"  {str(value):40} {s['accuracy']:5.1f}%  ({s['matches']}/{s['matches'] + s['mismatches']})")
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Re-evaluate saved BMS vs Xerox volume alignment with new tolerances")
+    parser.add_argument("aligned", help="Aligned columns JSON written by compare_volumes_fixed.py")
+    parser.add_argument("--abs-tol", type=float, default=DEFAULT_ABS_TOLERANCE, help="Absolute difference tolerance")
+    parser.add_argument("--rel-tol", type=float, default=DEFAULT_REL_TOLERANCE, help="Relative difference tolerance (%%)")
+    parser.add_argument("--mismatches", help="Write the full mismatch set to this CSV")
+    args = parser.parse_args(argv)
+
+    aligned = load_aligned(args.aligned)
+    matches = evaluate(aligned, args.abs_tol, args.rel_tol)
+    print_summary(aligned, matches, args.abs_tol, args.rel_tol)
+
+    if args.mismatches:
+        written = write_mismatches(aligned, matches, args.mismatches)
+        print(f"\n✓ {written} mismatches saved: {args.mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Publish extracted BMS readings into the webapp's meter_readings table
+
+The export already reads every company's meter readings; with
+PUBLISH_TO_WEBAPP=true it also writes them to the webapp's PostgreSQL
+(DATABASE_URL, needs psycopg2), so the webapp sync doesn't have to read BMS a
+second time. All readings are streamed with COPY into a temporary staging
+table and merged in one statement on (machine_id, reading_date,
+bms_meterreading_id), followed by one update of the machines' current balance
+and a sync_logs entry (sync_type EXPORT).
+
+Incrementals are computed as webapp/src/lib/bms/sync.ts computes them: each
+counter's movement since the previous reading, and when a reading goes
+backwards the readings since the last reading it doesn't go backwards from
+(up to 90 back) lose their incrementals. BMS flags (is_reported, for_billing,
+opening/closing) aren't in the export query and are left as they are; readings
+of serials the webapp has no machine for are skipped and counted.
+"""
+
+import csv
+import io
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Same walk-back limit as the webapp sync
+MAX_WALKBACK = 90
+
+COUNTERS = ('total', 'a3', 'black', 'large', 'colour', 'extra_large')
+
+STAGING_COLUMNS = [
+    'serial_number', 'bms_meterreading_id', 'bms_meterreading_no', 'reading_date', 'reading_datetime',
+    'total', 'a3', 'black', 'large', 'colour', 'extra_large',
+    'incremental_total', 'incremental_a3', 'incremental_black', 'incremental_large',
+    'incremental_colour', 'incremental_xl',
+]
+
+CREATE_STAGING = """
+CREATE TEMPORARY TABLE meter_readings_staging (
+    serial_number text NOT NULL,
+    bms_meterreading_id integer,
+    bms_meterreading_no text,
+    reading_date date NOT NULL,
+    reading_datetime timestamp,
+    total integer NOT NULL,
+    a3 integer, black integer, large integer, colour integer, extra_large integer,
+    incremental_total integer, incremental_a3 integer, incremental_black integer,
+    incremental_large integer, incremental_colour integer, incremental_xl integer
+) ON COMMIT DROP
+"""
+
+# One row per key (the last captured wins), for serials the webapp knows
+MERGE_READINGS = """
+INSERT INTO meter_readings (
+    id, machine_id, bms_meterreading_id, bms_meterreading_no,
+    reading_date, reading_datetime, total, a3, black, large, colour, extra_large,
+    incremental_total, incremental_a3, incremental_black, incremental_large,
+    incremental_colour, incremental_xl, source, created_at
+)
+SELECT DISTINCT ON (m.id, s.reading_date, s.bms_meterreading_id)
+    gen_random_uuid()::text, m.id, s.bms_meterreading_id, s.bms_meterreading_no,
+    s.reading_date, s.reading_datetime, s.total, s.a3, s.black, s.large, s.colour, s.extra_large,
+    s.incremental_total, s.incremental_a3, s.incremental_black, s.incremental_large,
+    s.incremental_colour, s.incremental_xl, 'BMS', NOW()
+FROM meter_readings_staging s
+JOIN machines m ON m.serial_number = s.serial_number
+ORDER BY m.id, s.reading_date, s.bms_meterreading_id, s.reading_datetime DESC NULLS LAST
+ON CONFLICT (machine_id, reading_date, bms_meterreading_id) DO UPDATE SET
+    bms_meterreading_no = EXCLUDED.bms_meterreading_no,
+    reading_datetime = EXCLUDED.reading_datetime,
+    total = EXCLUDED.total,
+    a3 = EXCLUDED.a3,
+    black = EXCLUDED.black,
+    large = EXCLUDED.large,
+    colour = EXCLUDED.colour,
+    extra_large = EXCLUDED.extra_large,
+    incremental_total = EXCLUDED.incremental_total,
+    incremental_a3 = EXCLUDED.incremental_a3,
+    incremental_black = EXCLUDED.incremental_black,
+    incremental_large = EXCLUDED.incremental_large,
+    incremental_colour = EXCLUDED.incremental_colour,
+    incremental_xl = EXCLUDED.incremental_xl
+"""
+
+# Latest staged reading per machine becomes its current balance
+UPDATE_BALANCES = """
+UPDATE machines SET
+    current_balance = latest.total,
+    last_reading_date = latest.reading_date,
+    updated_at = NOW()
+FROM (
+    SELECT DISTINCT ON (serial_number) serial_number, total, reading_date
+    FROM meter_readings_staging
+    ORDER BY serial_number, reading_date DESC, reading_datetime DESC NULLS LAST
+) latest
+WHERE machines.serial_number = latest.serial_number
+"""
+
+# Recorded like a webapp sync, so the mirror counts as fresh for READINGS_SOURCE=webapp (see readings_source.py)
+LOG_SYNC = """
+INSERT INTO sync_logs (id, sync_type, started_at, completed_at, readings_processed, status)
+VALUES (gen_random_uuid()::text, 'EXPORT', %s, NOW() AT TIME ZONE 'UTC', %s, 'COMPLETED')
+"""
+
+UNKNOWN_SERIALS = """
+SELECT COUNT(DISTINCT s.serial_number), COUNT(*)
+FROM meter_readings_staging s
+LEFT JOIN machines m ON m.serial_number = s.serial_number
+WHERE m.id IS NULL
+"""
+
+
+def publish_enabled() -> bool:
+    return os.getenv("PUBLISH_TO_WEBAPP", "false").lower() == "true"
+
+
+def writeback_enabled() -> bool:
+    """WEBAPP_WRITEBACK=true: the export also re-scores anomalies and refreshes the utilization snapshot"""
+    return os.getenv("WEBAPP_WRITEBACK", "false").lower() == "true"
+
+
+def has_negative_diff(current: Dict, previous: Optional[Dict]) -> bool:
+    """Any counter lower than in the previous reading"""
+    if previous is None:
+        return False
+    return any(current[c] is not None and previous[c] is not None and current[c] < previous[c] for c in COUNTERS)
+
+
+def incrementals(current: Dict, previous: Optional[Dict]) -> List[Optional[int]]:
+    """Per-counter movement since previous (None for the first reading or a counter that went backwards)"""
+    if previous is None:
+        return [None] * len(COUNTERS)
+    result = []
+    for c in COUNTERS:
+        if current[c] is None or previous[c] is None or current[c] < previous[c]:
+            result.append(None)
+        else:
+            result.append(current[c] - previous[c])
+    return result
+
+
+def reading_rows(raw_results: Iterable[Tuple]) -> Iterator[List]:
+    """Staging rows (STAGING_COLUMNS order) with the webapp sync's incrementals"""
+    # raw_data structure: (serial, model, status, date, category, install_date, date_time, total, a3, black, large, colour, extralarge, meterreading_id, meterreading_no, company)
+    by_serial = defaultdict(list)
+    for row in raw_results:
+        serial, date, total = row[0], row[3], row[7]
+        if serial and date and total is not None:
+            by_serial[serial].append(row)
+
+    for serial, rows in by_serial.items():
+        rows.sort(key=lambda r: r[3])
+        staged = []
+        history = []  # [(reading, index in staged)]
+        for row in rows:
+            reading = dict(zip(COUNTERS, row[7:13]))
+            previous = history[-1][0] if history else None
+            movement = incrementals(reading, previous)
+
+            if history and has_negative_diff(reading, previous):
+                good = next((h for h in range(len(history) - 1, max(0, len(history) - MAX_WALKBACK) - 1, -1)
+                             if not has_negative_diff(reading, history[h][0])), None)
+                if good is not None:
+                    # Readings between the last good one and this one have no trustworthy movement
+                    for _, index in history[good + 1:]:
+                        staged[index][11:17] = [None] * len(COUNTERS)
+                    movement = incrementals(reading, history[good][0])
+                    del history[good + 1:]
+                else:
+                    movement = [None] * len(COUNTERS)
+
+            history.append((reading, len(staged)))
+            staged.append([serial, row[13], row[14], row[3], row[6], *row[7:13], *movement])
+        yield from staged
+
+
+class CsvStream(io.RawIOBase):
+    """Rows as a readable CSV file, generated as COPY reads it (nothing is buffered whole)"""
+
+    def __init__(self, rows: Iterable[List]):
+        self.rows = iter(rows)
+        self.buffer = b""
+        self.count = 0
+        self._text = io.StringIO()
+        self._writer = csv.writer(self._text, lineterminator="\n")
+
+    def readable(self) -> bool:
+        return True
+
+    def _csv_line(self, row: List) -> bytes:
+        self._text.seek(0)
+        self._text.truncate()
+        self._writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+        return self._text.getvalue().encode()
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.buffer += self._csv_line(row)
+            self.count += 1
+        if size < 0:
+            size = len(self.buffer)
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+
+def publish_readings(raw_results: Iterable[Tuple], database_url: str = None) -> Dict[str, int]:
+    """COPY the readings into staging and merge them into meter_readings in one transaction
+
+    Returns {'staged', 'merged', 'machines_updated', 'unknown_serials', 'unknown_rows'}.
+    """
+    import psycopg2
+
+    database_url = database_url or os.getenv("DATABASE_URL")
+    if not database_url:
+        raise ValueError("DATABASE_URL must be set to publish to the webapp")
+
+    started = datetime.now(timezone.utc).replace(tzinfo=None)
+    stream = CsvStream(reading_rows(raw_results))
+    conn = psycopg2.connect(database_url)
+    try:
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute(CREATE_STAGING)
+            # Empty unquoted fields are NULL in CSV COPY
+            cursor.copy_expert(
+                f"COPY meter_readings_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", stream)
+            cursor.execute(UNKNOWN_SERIALS)
+            unknown_serials, unknown_rows = cursor.fetchone()
+            cursor.execute(MERGE_READINGS)
+            merged = cursor.rowcount
+            cursor.execute(UPDATE_BALANCES)
+            machines_updated = cursor.rowcount
+            cursor.execute(LOG_SYNC, (started, merged))
+            cursor.close()
+    finally:
+        conn.close()
+
+    return {'staged': stream.count, 'merged': merged, 'machines_updated': machines_updated,
+            'unknown_serials': unknown_serials, 'unknown_rows': unknown_rows}
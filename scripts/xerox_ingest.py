@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Bulk ingest of Xerox billing exports into the webapp's xerox_billings table
+
+Streams the billing workbook (one sheet per invoice month) row by row,
+normalises each line exactly as the webapp importer does
+(webapp/src/app/api/recon/import/route.ts) - trimmed serial, billing month =
+the sheet's invoice month - 1, line_index per (serial, billing month, print
+type) within a sheet - and loads it with COPY into a staging table followed by
+one upsert on xerox_billing_unique (serial_number, billing_month, print_type,
+line_index), linking machine_id by serial. Files already ingested (same
+content hash, recorded in Xerox_Ingest_Log.json) are skipped unless --force.
+
+Once ingested, the export can read its billing lines back by index instead of
+re-parsing the workbook: BILLING_SOURCE=webapp (see load_billing_lines_from_webapp).
+
+    python3 scripts/xerox_ingest.py "Xerox Billing.xlsx" [--force]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from readings_source import connect_webapp
+from serial_keys import canonical_serial
+from webapp_publish import CsvStream
+
+SCRIPT_DIR = Path(__file__).parent
+LEDGER_FILE = SCRIPT_DIR.parent / "Xerox_Ingest_Log.json"
+
+# Workbook column -> xerox_billings column, with the webapp importer's conversion
+TEXT_COLUMNS = {
+    'Invoice Number': 'invoice_number', 'Contract Number': 'contract_number',
+    'Current Contract Status': 'contract_status', 'Product': 'product', 'Customer': 'customer',
+    'Customer Account': 'customer_account', 'Site Customer': 'site_customer',
+    'Location Address': 'location_address',
+}
+DATE_COLUMNS = {
+    'Invoice Date': 'invoice_date', 'Contract Start Date': 'contract_start_date',
+    'Contract End Date': 'contract_end_date', 'Reading Date': 'reading_date',
+    'Coverage From': 'coverage_from', 'Coverage To': 'coverage_to',
+}
+DECIMAL_COLUMNS = {'Rental': 'rental', 'Fixed Charge': 'fixed_charge', 'Other Charge': 'other_charge',
+                   'Volume Charges': 'volume_charges'}
+INT_COLUMNS = {
+    'Current Reading': 'current_reading', 'Previous Reading': 'previous_reading',
+    'A4 Mono': 'volume_a4_mono', 'A3 Mono': 'volume_a3_mono', 'A4 Color': 'volume_a4_color',
+    'A3 Color': 'volume_a3_color', 'Total Clicks': 'total_clicks',
+}
+
+STAGING_COLUMNS = (
+    ['seq', 'serial_number', 'billing_month', 'print_type', 'line_description', 'line_index', 'invoice_month']
+    + list(TEXT_COLUMNS.values()) + list(DATE_COLUMNS.values()) + list(DECIMAL_COLUMNS.values())
+    + ['total_charges'] + list(INT_COLUMNS.values()) + ['cpc']
+)
+VALUE_COLUMNS = STAGING_COLUMNS[1:]
+KEY_COLUMNS = ['serial_number', 'billing_month', 'print_type', 'line_index']
+UPDATE_COLUMNS = [c for c in VALUE_COLUMNS if c not in KEY_COLUMNS] + ['machine_id', 'updated_at']
+
+CREATE_STAGING = """
+CREATE TEMPORARY TABLE xerox_billings_staging (
+    seq integer NOT NULL,
+    serial_number text NOT NULL, billing_month text NOT NULL, print_type text NOT NULL,
+    line_description text, line_index integer NOT NULL, invoice_month text NOT NULL,
+    invoice_number text, contract_number text, contract_status text, product text, customer text,
+    customer_account text, site_customer text, location_address text,
+    invoice_date timestamp, contract_start_date timestamp, contract_end_date timestamp,
+    reading_date timestamp, coverage_from timestamp, coverage_to timestamp,
+    rental numeric(12, 2), fixed_charge numeric(12, 2), other_charge numeric(12, 2),
+    volume_charges numeric(12, 2), total_charges numeric(12, 2),
+    current_reading integer, previous_reading integer, volume_a4_mono integer, volume_a3_mono integer,
+    volume_a4_color integer, volume_a3_color integer, total_clicks integer,
+    cpc numeric(12, 6)
+) ON COMMIT DROP
+"""
+
+# Later rows win when a key repeats (two sheets for one invoice month), as sequential upserts would
+UPSERT = f"""
+INSERT INTO xerox_billings (id, {', '.join(VALUE_COLUMNS)}, machine_id, updated_at)
+SELECT DISTINCT ON (s.serial_number, s.billing_month, s.print_type, s.line_index)
+    gen_random_uuid()::text, {', '.join(f's.{c}' for c in VALUE_COLUMNS)}, m.id, NOW()
+FROM xerox_billings_staging s
+LEFT JOIN machines m ON m.serial_number = s.serial_number
+ORDER BY s.serial_number, s.billing_month, s.print_type, s.line_index, s.seq DESC
+ON CONFLICT (serial_number, billing_month, print_type, line_index) DO UPDATE SET
+    {', '.join(f'{c} = EXCLUDED.{c}' for c in UPDATE_COLUMNS)}
+"""
+
+UNMATCHED = """
+SELECT COUNT(DISTINCT s.serial_number)
+FROM xerox_billings_staging s
+LEFT JOIN machines m ON m.serial_number = s.serial_number
+WHERE m.id IS NULL
+"""
+
+BILLING_LINES_QUERY = """
+SELECT serial_number, customer, product, invoice_number, invoice_month, billing_month, print_type,
+       line_description, line_index, coverage_from, coverage_to, previous_reading, current_reading, total_clicks
+FROM xerox_billings
+WHERE billing_month >= %s
+ORDER BY serial_number, billing_month, print_type, line_index
+"""
+
+
+def billing_month(invoice_month: str) -> str:
+    """Xerox bills in arrears: usage month = invoice month - 1 (YYYY-MM)"""
+    year, month = (int(p) for p in invoice_month.split('-'))
+    return f"{year - 1}-12" if month == 1 else f"{year}-{month - 1:02d}"
+
+
+def to_text(value) -> Optional[str]:
+    return str(value).strip() if value not in (None, "") else None
+
+
+def to_timestamp(value) -> Optional[datetime]:
+    """Workbook date cell (datetime, Excel serial number or text) as a datetime"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    if isinstance(value, (int, float)):
+        return datetime(1899, 12, 30) + timedelta(days=value)
+    text = str(value).strip()
+    for fmt in ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y", "%Y/%m/%d"):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def to_decimal(value) -> Optional[Decimal]:
+    if value is None or value == "":
+        return None
+    try:
+        return Decimal(str(value).strip())
+    except InvalidOperation:
+        return None
+
+
+def to_int(value) -> Optional[int]:
+    number = to_decimal(value)
+    return int(number.to_integral_value(rounding=ROUND_HALF_UP)) if number is not None else None
+
+
+def billing_rows(filepath: Path) -> Iterator[List]:
+    """Staging rows (STAGING_COLUMNS order), one per billing line, sheet by sheet"""
+    import openpyxl
+
+    wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    seq = 0
+    try:
+        for ws in wb.worksheets:
+            # Skip legend/helper sheets (Sheet1 etc)
+            if ws.title.lower().startswith('sheet'):
+                continue
+            rows = ws.iter_rows(values_only=True)
+            header = next(rows, None)
+            if not header:
+                continue
+            col = {str(name).strip(): i for i, name in enumerate(header) if name}
+            if 'Serial Number' not in col:
+                continue
+
+            def value(row, name):
+                i = col.get(name)
+                return row[i] if i is not None and i < len(row) else None
+
+            # The sheet's invoice month is the first well-formed one; a sheet without one is skipped
+            invoice_month = None
+            line_counters = defaultdict(int)
+            pending = []
+            for row in rows:
+                serial = to_text(value(row, 'Serial Number'))
+                if not serial:
+                    continue
+                if invoice_month is None:
+                    candidate = str(value(row, 'Invoice Month') or '').strip()
+                    if re.fullmatch(r"\d{4}-\d{2}", candidate):
+                        invoice_month = candidate
+                        month = billing_month(invoice_month)
+                    else:
+                        pending.append(row)
+                        continue
+                for line in pending + [row]:
+                    seq += 1
+                    yield sheet_line(line, value, invoice_month, month, line_counters, seq)
+                pending = []
+            if invoice_month is None:
+                print(f"  ⚠ Sheet \"{ws.title}\": could not determine invoice month, skipped")
+    finally:
+        wb.close()
+
+
+def sheet_line(row, value, invoice_month: str, month: str, line_counters: Dict, seq: int) -> List:
+    """One normalised billing line"""
+    serial = to_text(value(row, 'Serial Number'))
+    print_type = to_text(value(row, 'Print Type')) or ""
+    # Distinguish duplicate print types for the same serial (e.g. two A3 Color rows)
+    key = (serial, month, print_type)
+    line_index = line_counters[key]
+    line_counters[key] += 1
+
+    charges = [to_decimal(value(row, name)) for name in DECIMAL_COLUMNS]
+    cpc = to_decimal(value(row, 'C P C'))
+    return ([seq, serial, month, print_type, to_text(value(row, 'Charge Item')), line_index, invoice_month]
+            + [to_text(value(row, name)) for name in TEXT_COLUMNS]
+            + [to_timestamp(value(row, name)) for name in DATE_COLUMNS]
+            + charges + [sum(c or 0 for c in charges)]
+            + [to_int(value(row, name)) for name in INT_COLUMNS]
+            + [cpc if cpc is not None else to_decimal(value(row, 'CPC'))])
+
+
+def file_hash(filepath: Path) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_ledger(path: Path) -> Dict:
+    if not Path(path).exists():
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def ingest_billing(filepath: Path, database_url: str = None, ledger_path: Path = LEDGER_FILE,
+                   force: bool = False) -> Optional[Dict]:
+    """COPY one billing workbook into xerox_billings; None when it was already ingested"""
+    digest = file_hash(filepath)
+    ledger = load_ledger(ledger_path)
+    if digest in ledger and not force:
+        return None
+
+    start = time.time()
+    stream = CsvStream(billing_rows(filepath))
+    conn = connect_webapp(database_url)
+    try:
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute(CREATE_STAGING)
+            # FORCE_NOT_NULL: an empty print type is '' (part of the key), not NULL
+            cursor.copy_expert(
+                f"COPY xerox_billings_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN "
+                f"WITH (FORMAT csv, FORCE_NOT_NULL (print_type))", stream)
+            cursor.execute(UNMATCHED)
+            unmatched = cursor.fetchone()[0]
+            cursor.execute(UPSERT)
+            upserted = cursor.rowcount
+            cursor.close()
+    finally:
+        conn.close()
+
+    result = {'file': Path(filepath).name, 'at': time.strftime("%Y-%m-%d %H:%M:%S"), 'lines': stream.count,
+              'upserted': upserted, 'unmatched_serials': unmatched, 'seconds': round(time.time() - start, 1)}
+    ledger[digest] = result
+    with open(ledger_path, 'w') as f:
+        json.dump(ledger, f, indent=1)
+    return result
+
+
+def billing_source() -> str:
+    """Where the export reads billing lines: the workbook (BILLING_SOURCE=file, default) or xerox_billings"""
+    source = os.getenv("BILLING_SOURCE", "file").lower()
+    if source not in ('file', 'webapp'):
+        raise ValueError("BILLING_SOURCE must be 'file' or 'webapp'")
+    return source
+
+
+def load_billing_lines_from_webapp(since_month: str = "2000-01", database_url: str = None) -> List[Dict]:
+    """Billing lines from xerox_billings in coverage_recon.load_billing_lines' shape"""
+    conn = connect_webapp(database_url)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(BILLING_LINES_QUERY, (since_month,))
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+
+    keys = ('serial', 'customer', 'product', 'invoice_number', 'invoice_month', 'billing_month', 'print_type',
+            'line_description', 'line_index', 'coverage_from', 'coverage_to', 'previous_reading',
+            'current_reading', 'total_clicks')
+    lines = []
+    for row in rows:
+        line = dict(zip(keys, row))
+        line['serial'] = canonical_serial(line['serial'])
+        lines.append(line)
+    return lines
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Ingest Xerox billing workbooks into the webapp's xerox_billings")
+    parser.add_argument("files", nargs="+", help="Billing workbooks (one sheet per invoice month)")
+    parser.add_argument("--force", action="store_true", help="Ingest even if the file was ingested before")
+    parser.add_argument("--ledger", default=str(LEDGER_FILE), help="Ingested-file log")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    for filepath in args.files:
+        result = ingest_billing(Path(filepath), ledger_path=Path(args.ledger), force=args.force)
+        if result is None:
+            print(f"- {filepath}: already ingested (use --force to reload)")
+        else:
+            print(f"✓ {filepath}: {result['lines']:,} lines, {result['upserted']:,} upserted, "
+                  f"{result['unmatched_serials']} serials without a machine ({result['seconds']}s)")
+
+
+if __name__ == "__main__":
+    main()
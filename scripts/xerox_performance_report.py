@@ -2,6 +2,10 @@
 """
 Xerox Performance Report - Combines volumes, balance, utilization, and service calls
 Xerox data + BMS machine info (category, install_date, company)
+
+Volumes are served from the persisted monthly cube (monthly_cube.py), so several
+period variants can be generated per run:
+    PERFORMANCE_PERIODS=ytd,rolling12,qoq python3 scripts/xerox_performance_report.py
 """
 
 import openpyxl
@@ -9,34 +13,10 @@ from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 from pathlib import Path
 from collections import defaultdict
-import json
-
-
-def load_volumes(filepath: str) -> dict:
-    """Load monthly volumes by serial number"""
-    wb = openpyxl.load_workbook(filepath)
-    ws = wb.active
-
-    # Structure: {serial: {customer, product, months: {month: total}}}
-    data = {}
-
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        customer, model, serial, month_year, a3_mono, a4_mono, a3_color, a4_color, total = row
-        if not serial:
-            continue
-        serial = str(serial).strip()
-
-        if serial not in data:
-            data[serial] = {
-                'customer': customer,
-                'product': model,
-                'months': {}
-            }
-
-        if month_year:
-            data[serial]['months'][month_year] = total or 0
-
-    return data
+import os
+from serial_keys import canonical_serial, build_serial_index, rekey_to_target
+from run_manifest import RunManifest
+from monthly_cube import METER_TYPES, ROLLUP_DIMENSIONS, load_or_build_cube, resolve_period, rollup_totals, serial_volumes
 
 
 def load_device_meters(filepath: str) -> dict:
@@ -55,7 +35,7 @@ def load_device_meters(filepath: str) -> dict:
     for row_num in range(2, ws.max_row + 1):
         company = ws.cell(row_num, 1).value
         product = ws.cell(row_num, 2).value
-        serial = str(ws.cell(row_num, 3).value).strip() if ws.cell(row_num, 3).value else None
+        serial = canonical_serial(ws.cell(row_num, 3).value)
         meter_desc = ws.cell(row_num, 4).value
         reading = ws.cell(row_num, 5).value
         last_date = ws.cell(row_num, 6).value
@@ -151,16 +131,8 @@ def load_utilization(color_path: str, mono_path: str) -> dict:
     return data
 
 
-def load_bms_machine_info(filepath: str) -> dict:
-    """Load BMS machine info (category, install_date, company) from JSON"""
-    if not Path(filepath).exists():
-        return {}
-    with open(filepath, 'r') as f:
-        return json.load(f)
-
-
-def create_performance_report(volumes: dict, balances: dict, mttr: dict, utilization: dict, bms_info: dict, output_path: str):
-    """Create the Xerox Performance Report"""
+def create_performance_report(cube: dict, balances: dict, mttr: dict, utilization: dict, period: dict, output_path: str):
+    """Create the Xerox Performance Report for one period (see monthly_cube.resolve_period)"""
     wb = openpyxl.Workbook()
     ws = wb.active
     ws.title = "Performance Report"
@@ -171,15 +143,16 @@ def create_performance_report(volumes: dict, balances: dict, mttr: dict, utiliza
     number_format = '#,##0'
     pct_format = '0.0%'
 
-    # All months (financial YTD: Mar-Nov 2025)
-    target_months = ['Mar-2025', 'Apr-2025', 'May-2025', 'Jun-2025', 'Jul-2025', 'Aug-2025', 'Sep-2025', 'Oct-2025', 'Nov-2025']
+    target_months = period['months']
+    previous_months = period['previous_months']
 
     # Headers - with BMS columns between Customer Name and Product
-    headers = [
-        'Customer Name (Xerox)', 'BMS Company', 'Category', 'Install Date', 'Product', 'Serial',
-        'Mar-2025', 'Apr-2025', 'May-2025', 'Jun-2025', 'Jul-2025', 'Aug-2025', 'Sep-2025', 'Oct-2025', 'Nov-2025',
-        'YTD Volume', 'Balance', 'Utilization %', 'Service Calls', 'Volume/Call'
-    ]
+    headers = ['Customer Name (Xerox)', 'BMS Company', 'Category', 'Install Date', 'Product', 'Serial']
+    headers += target_months
+    headers += [period['label']]
+    if previous_months:
+        headers += ['Previous Period', 'Change %']
+    headers += ['Balance', 'Utilization %', 'Service Calls', 'Volume/Call']
     ws.append(headers)
 
     for idx, cell in enumerate(ws[1], 1):
@@ -187,22 +160,22 @@ def create_performance_report(volumes: dict, balances: dict, mttr: dict, utiliza
         cell.font = header_font
         cell.alignment = Alignment(horizontal='center', wrap_text=True)
 
+    # Column positions (1-based)
+    first_month_col = 7
+    period_col = first_month_col + len(target_months)
+    change_col = period_col + 2 if previous_months else None
+    balance_col = period_col + (3 if previous_months else 1)
+    util_col = balance_col + 1
+
     # Process each serial
-    for serial in sorted(volumes.keys()):
-        vol_data = volumes[serial]
-        customer = vol_data['customer']
-        product = vol_data['product']
-        months = vol_data['months']
-
-        # Get BMS machine info
-        machine = bms_info.get(serial, {})
-        bms_company = machine.get('bms_company', '')
-        category = machine.get('category', '')
-        install_date = machine.get('install_date', '')
+    for serial in sorted(cube['serials'].keys()):
+        machine = cube['serials'][serial]
+        customer = machine['customer']
+        product = machine['product']
 
         # Get monthly volumes
-        month_volumes = [months.get(m, 0) or 0 for m in target_months]
-        ytd_volume = sum(month_volumes)
+        month_volumes = serial_volumes(cube, serial, target_months)
+        period_volume = sum(month_volumes)
 
         # Get balance from device meters
         balance = 0
@@ -215,50 +188,75 @@ def create_performance_report(volumes: dict, balances: dict, mttr: dict, utiliza
         calls = mttr.get(key, {}).get('calls', 0) or 0
 
         # Calculate volume per call
-        vol_per_call = ytd_volume / calls if calls > 0 else 0
-
-        row = [
-            customer, bms_company, category, install_date, product, serial,
-            month_volumes[0], month_volumes[1], month_volumes[2],
-            month_volumes[3], month_volumes[4], month_volumes[5],
-            month_volumes[6], month_volumes[7], month_volumes[8],
-            ytd_volume, balance, util_pct, calls, vol_per_call
-        ]
+        vol_per_call = period_volume / calls if calls > 0 else 0
+
+        row = [customer, machine['company'], machine['category'], machine['install_date'], product, serial]
+        row += month_volumes
+        row += [period_volume]
+        if previous_months:
+            previous_volume = sum(serial_volumes(cube, serial, previous_months))
+            row += [previous_volume, (period_volume - previous_volume) / previous_volume if previous_volume else None]
+        row += [balance, util_pct, calls, vol_per_call]
         ws.append(row)
 
         row_num = ws.max_row
 
-        # Format numbers (columns 7-17: all month volumes, YTD, balance)
-        for col in range(7, 18):
+        # Format numbers (month volumes, period totals, balance, calls, volume/call)
+        for col in range(first_month_col, len(row) + 1):
             ws.cell(row_num, col).number_format = number_format
 
-        # Format utilization as percentage (column 18)
-        ws.cell(row_num, 18).number_format = pct_format
-
-        # Format calls (column 19)
-        ws.cell(row_num, 19).number_format = number_format
-
-        # Format volume/call (column 20)
-        ws.cell(row_num, 20).number_format = number_format
+        # Format percentages
+        ws.cell(row_num, util_col).number_format = pct_format
+        if change_col:
+            ws.cell(row_num, change_col).number_format = pct_format
+
+    # Rollup sheets straight from the cube
+    for dimension in ROLLUP_DIMENSIONS:
+        ws_rollup = wb.create_sheet(f"By {dimension.title()}")
+        rollup_headers = [dimension.title(), 'Machines'] + [f"{m.replace('_', ' ').title()}" for m in METER_TYPES[:-1]]
+        rollup_headers += [period['label']]
+        if previous_months:
+            rollup_headers += ['Previous Period', 'Change %']
+        ws_rollup.append(rollup_headers)
+
+        for cell in ws_rollup[1]:
+            cell.fill = header_fill
+            cell.font = header_font
+            cell.alignment = Alignment(horizontal='center', wrap_text=True)
+
+        totals = rollup_totals(cube, dimension, target_months)
+        previous_totals = rollup_totals(cube, dimension, previous_months) if previous_months else {}
+        for group in sorted(totals, key=lambda g: -totals[g][-1]):
+            values = totals[group]
+            row = [group, cube['machine_counts'][dimension].get(group, 0)] + values
+            if previous_months:
+                previous_volume = previous_totals.get(group, [0])[-1]
+                row += [previous_volume, (values[-1] - previous_volume) / previous_volume if previous_volume else None]
+            ws_rollup.append(row)
+            for col in range(2, len(row) + 1):
+                ws_rollup.cell(ws_rollup.max_row, col).number_format = number_format
+            if previous_months:
+                ws_rollup.cell(ws_rollup.max_row, len(row)).number_format = pct_format
 
     # Auto-size columns
-    for column in ws.columns:
-        max_length = 0
-        column_letter = get_column_letter(column[0].column)
-        for cell in column:
-            try:
-                if cell.value:
-                    max_length = max(max_length, len(str(cell.value)))
-            except:
-                pass
-        ws.column_dimensions[column_letter].width = min(max_length + 2, 40)
-
-    # Freeze header row
-    ws.freeze_panes = 'A2'
+    for sheet in wb:
+        for column in sheet.columns:
+            max_length = 0
+            column_letter = get_column_letter(column[0].column)
+            for cell in column:
+                try:
+                    if cell.value:
+                        max_length = max(max_length, len(str(cell.value)))
+                except:
+                    pass
+            sheet.column_dimensions[column_letter].width = min(max_length + 2, 40)
+
+        # Freeze header row
+        sheet.freeze_panes = 'A2'
 
     wb.save(output_path)
     print(f"✓ Performance report saved: {output_path}")
-    print(f"  Machines: {ws.max_row - 1}")
+    print(f"  Machines: {ws.max_row - 1} ({target_months[0]} → {target_months[-1]})")
 
 
 def main():
@@ -272,36 +270,70 @@ def main():
     mono_mttr_path = project_root / "Mono MTTR by Product and Site.xlsx"
     color_util_path = project_root / "Color Utilization by Product and Site.xlsx"
     mono_util_path = project_root / "Mono Utilization by Product and Site.xlsx"
-    bms_info_path = project_root / "bms_machine_info.json"
-
-    # Output file
-    output_path = project_root / "Xerox_Performance_Report.xlsx"
-
+    machine_store_path = project_root / "bms_machine_info.db"
+
+    cube_path = project_root / "Monthly_Volume_Cube.json"
+
+    # Periods to report: ytd, rolling12, qoq or Mon-YYYY:Mon-YYYY (comma separated)
+    periods = [p for p in os.getenv("PERFORMANCE_PERIODS", "ytd").split(",") if p.strip()]
+    as_of = os.getenv("PERFORMANCE_AS_OF")  # latest month to report, e.g. Nov-2025
+
+    manifest = RunManifest("performance", project_root)
+    try:
+        run_reports(manifest, project_root, periods, as_of, cube_path, volumes_path, machine_store_path,
+                    device_meters_path, (color_mttr_path, mono_mttr_path), (color_util_path, mono_util_path))
+    except BaseException as e:
+        manifest.finish(e)
+        raise
+    finally:
+        manifest_path = manifest.write()
+        print(f"\n✓ Run manifest saved: {manifest_path}")
+
+
+def run_reports(manifest: RunManifest, project_root: Path, periods: list, as_of: str, cube_path: Path,
+                volumes_path: Path, machine_store_path: Path, device_meters_path: Path, mttr_paths: tuple,
+                utilization_paths: tuple):
+    """Load the inputs and write one report per period, one manifest stage each"""
     print("Loading Xerox data...")
 
-    print("  Loading volumes...")
-    volumes = load_volumes(volumes_path)
-    print(f"  ✓ {len(volumes)} serials")
+    print("  Loading volumes (monthly cube)...")
+    with manifest.stage("load_cube") as stage:
+        cube = load_or_build_cube(cube_path, volumes_path, machine_store_path)
+        stage['rows_out'] = len(cube['serials'])
+    print(f"  ✓ {len(cube['serials'])} serials")
 
     print("  Loading device meters (balances)...")
-    balances = load_device_meters(device_meters_path)
+    with manifest.stage("load_device_meters") as stage:
+        balances = load_device_meters(device_meters_path)
+        stage['rows_out'] = len(balances)
     print(f"  ✓ {len(balances)} serials")
 
     print("  Loading MTTR (service calls)...")
-    mttr = load_mttr(color_mttr_path, mono_mttr_path)
+    with manifest.stage("load_mttr") as stage:
+        mttr = load_mttr(*mttr_paths)
+        stage['rows_out'] = len(mttr)
     print(f"  ✓ {len(mttr)} product/customer combinations")
 
     print("  Loading utilization...")
-    utilization = load_utilization(color_util_path, mono_util_path)
+    with manifest.stage("load_utilization") as stage:
+        utilization = load_utilization(*utilization_paths)
+        stage['rows_out'] = len(utilization)
     print(f"  ✓ {len(utilization)} product/customer combinations")
 
-    print("  Loading BMS machine info...")
-    bms_info = load_bms_machine_info(bms_info_path)
-    print(f"  ✓ {len(bms_info)} serials")
+    # Align balance serials onto the Xerox volume serials (leading zeros, case, prefixes)
+    print("  Matching serials...")
+    with manifest.stage("match_serials", rows_in=len(balances)):
+        rekey_to_target(balances, build_serial_index(cube['serials'].keys()), "Device Meters")
 
-    print("\nCreating performance report...")
-    create_performance_report(volumes, balances, mttr, utilization, bms_info, output_path)
+    for spec in periods:
+        period = resolve_period(spec, cube, as_of)
+        # Financial YTD keeps the original report name
+        suffix = "" if period['name'] == 'ytd' else f"_{period['name']}"
+        output_path = project_root / f"Xerox_Performance_Report{suffix}.xlsx"
 
+        print(f"\nCreating performance report ({spec.strip()})...")
+        with manifest.stage(f"report_{period['name']}", rows_in=len(cube['serials'])):
+            create_performance_report(cube, balances, mttr, utilization, period, output_path)
 
 if __name__ == "__main__":
     main()
@@ -13,7 +13,7 @@ function isAnomalousMovement(increment: number, balance: number): boolean {
 
 // Shared detection logic — works on any set of readings per machine
 function detectForMachine(
-  allReadings: { id: string; bmsMeterReadingId: number | null; readingDate: Date; total: number; incrementalTotal: number | null; isAnomaly: boolean }[],
+  allReadings: { id: string; bmsMeterReadingId: number | null; readingDate: Date; total: number; incrementalTotal: number | null; isAnomaly: boolean; anomalyReason: string | null }[],
   filterStart?: Date,
 ) {
   interface AnomalyReading {
@@ -25,6 +25,7 @@ function detectForMachine(
     incrementalTotal: number | null;
     isDetected: boolean;
     isTagged: boolean;
+    tagReason: string | null; // reason code from scripts/meter_anomalies.py, null for a manual tag
     reason: "backwards" | "spike" | null;
     pctOfBalance: number | null;
   }
@@ -64,6 +65,7 @@ function detectForMachine(
         incrementalTotal: r.incrementalTotal,
         isDetected,
         isTagged: r.isAnomaly,
+        tagReason: r.isAnomaly ? r.anomalyReason : null,
         reason,
         pctOfBalance,
       });
@@ -128,6 +130,7 @@ export async function GET(request: NextRequest) {
         total: true,
         incrementalTotal: true,
         isAnomaly: true,
+        anomalyReason: true,
       },
       orderBy: [{ machineId: "asc" }, { readingDate: "asc" }, { bmsMeterReadingId: "asc" }],
     });
@@ -224,6 +227,7 @@ export async function POST(request: NextRequest) {
           total: true,
           incrementalTotal: true,
           isAnomaly: true,
+          anomalyReason: true,
         },
         orderBy: [{ machineId: "asc" }, { readingDate: "asc" }, { bmsMeterReadingId: "asc" }],
       });
@@ -255,7 +259,8 @@ export async function POST(request: NextRequest) {
         const chunk = idsToTag.slice(i, i + 1000);
         const result = await prisma.meterReading.updateMany({
           where: { id: { in: chunk } },
-          data: { isAnomaly: true },
+          // A manual tag, like "tag" below: no reason, so the fleet re-score never clears it
+          data: { isAnomaly: true, anomalyReason: null },
         });
         totalUpdated += result.count;
       }
@@ -280,7 +285,10 @@ export async function POST(request: NextRequest) {
       const chunk = ids.slice(i, i + 1000);
       const result = await prisma.meterReading.updateMany({
         where: { id: { in: chunk } },
-        data: { isAnomaly: action === "tag" },
+        // DISMISSED keeps the fleet re-score (scripts/meter_anomalies.py) from flagging it again
+        data: action === "tag"
+          ? { isAnomaly: true, anomalyReason: null }
+          : { isAnomaly: false, anomalyReason: "DISMISSED" },
       });
       totalUpdated += result.count;
     }